@@ -0,0 +1,148 @@
+#! /usr/bin/python
+
+###################################################################################################
+#
+# Batch Runner for Sapphire-Sim
+#
+# Inputs:  Manifest (Programs x Defines x Operating Conditions x Iterations)
+# Outputs: One JSON / CSV row per iteration with Cycle Count, Total Time, Average Power,
+#          Total Energy and Per-Unit Cycle / Energy Breakdown
+#
+###################################################################################################
+
+import math, sys, os, json, csv
+import sim
+
+# Example manifest (run by scripts/regress.py):
+# {
+#     "programs"   : [ "programs/prog_kyber_v1_512_cpapke",
+#                      { "prog" : "programs/prog_remblem_512_cpapke", "cdt" : "cdt_files/cdt_file_3p0_10_10" } ],
+#     "defines"    : [ ["KEYGEN"], ["ENCRYPT"], ["DECRYPT"] ],
+#     "op_points"  : [ { "vdd" : 1.1, "fmhz" : 72 }, { "vdd" : 0.8, "fmhz" : 29 } ],
+#     "iterations" : 1,
+#     "free_rw"    : false,
+#     "interface"  : "word",
+#     "calibration" : "calibration/sapphire.json",
+#     "temp_c"     : 25,
+#     "stream_power" : false,
+#     "seed"       : 1
+# }
+# Define sets are run in the listed order for every program and operating condition,
+# so that outputs saved by one variant (e.g. KEYGEN) can be loaded by the next one
+
+# Read and check batch manifest
+def read_manifest(manifest_file):
+    if not os.path.exists(manifest_file):
+        print("\nERROR: Manifest file %s does not exist" % manifest_file)
+        exit()
+    manifest_f = open(manifest_file)
+    manifest = json.load(manifest_f)
+    manifest_f.close()
+
+    for key in ["programs", "op_points"]:
+        if key not in manifest or len(manifest[key]) == 0:
+            print("\nERROR: Manifest must list at least one entry in \"%s\"" % key)
+            exit()
+    manifest.setdefault("defines", [[]])
+    manifest.setdefault("iterations", 1)
+    manifest.setdefault("free_rw", False)
+    manifest.setdefault("interface", None)
+    manifest.setdefault("calibration", None)
+    manifest.setdefault("temp_c", None)
+    manifest.setdefault("stream_power", False)
+    manifest.setdefault("seed", None)
+
+    # Programs can be listed as paths or as { "prog" : <path>, "cdt" : <path> }
+    programs = []
+    for prog in manifest["programs"]:
+        if isinstance(prog, str):
+            prog = { "prog" : prog }
+        prog.setdefault("cdt", None)
+        programs.append(prog)
+    manifest["programs"] = programs
+
+    for op_point in manifest["op_points"]:
+        sim.check_operating_point(op_point["vdd"], op_point["fmhz"])
+
+    return manifest
+
+# Run all combinations in the manifest, returns one row per iteration
+def run_batch(manifest):
+    rows = []
+    num_runs = len(manifest["programs"]) * len(manifest["op_points"]) * len(manifest["defines"])
+    run = 0
+    sim.free_rw = manifest["free_rw"]
+    if manifest["calibration"] is not None:
+        sim.load_calibration(manifest["calibration"])
+    sim.set_temperature(manifest["temp_c"])
+    # Interface statistics are reported (in JSON) if an interface model is provided
+    if manifest["interface"] is not None:
+        sim.set_interface(manifest["interface"])
+        sim.interface_report = True
+    sim.stream_power = manifest["stream_power"]
+    for prog in manifest["programs"]:
+        if prog["cdt"] is not None:
+            sim.cdt_mem = sim.load_cdt(prog["cdt"])
+        else:
+            sim.cdt_mem = None
+        for op_point in manifest["op_points"]:
+            vdd = op_point["vdd"]
+            fmhz = op_point["fmhz"]
+            for prog_defines in manifest["defines"]:
+                run = run + 1
+                sim.load_program(prog["prog"], prog_defines)
+                # Every run starts from the same seed, if provided
+                if manifest["seed"] is not None:
+                    sim.seed_rng(manifest["seed"])
+                summaries = sim.simulate(vdd, fmhz, manifest["iterations"], report=False)
+                for (i, summary) in enumerate(summaries):
+                    row = {
+                        "program"   : prog["prog"],
+                        "defines"   : " ".join(prog_defines),
+                        "vdd"       : vdd,
+                        "fmhz"      : fmhz,
+                        "iteration" : i+1,
+                    }
+                    row.update(summary)
+                    rows.append(row)
+                avg_ticks = math.ceil(sum([s["cycles"] for s in summaries])/len(summaries))
+                print("[%d/%d] %s [%s] at %0.2f V and %d MHz: %s cycles" % (run, num_runs, prog["prog"], " ".join(prog_defines), vdd, fmhz, format(avg_ticks, ',d')))
+    return rows
+
+# CSV cell of a row field, lists (e.g. "op_points") are written as JSON
+def csv_value(value):
+    return json.dumps(value) if isinstance(value, list) else value
+
+# Write rows as JSON, or as CSV with one "cycles.<unit>" and "energy_pj.<unit>" column per hardware unit
+# (per-section breakdown and power statistics are only written in JSON, list fields such as "op_points" are
+# written as JSON strings and fields missing from a row are left empty)
+def write_rows(rows, out_file):
+    out_f = open(out_file, "w", newline="")
+    if out_file.endswith(".csv"):
+        units = sorted(set([unit for row in rows for unit in row["units"]]))
+        fields = []
+        for row in rows:
+            fields = fields + [field for field in row if field not in fields and not isinstance(row[field], dict)]
+        writer = csv.writer(out_f)
+        writer.writerow(fields + ["cycles.%s" % unit for unit in units] + ["energy_pj.%s" % unit for unit in units])
+        for row in rows:
+            writer.writerow([csv_value(row.get(field, "")) for field in fields] +
+                            [row["units"][unit]["cycles"] if unit in row["units"] else 0 for unit in units] +
+                            [row["units"][unit]["energy_pj"] if unit in row["units"] else 0 for unit in units])
+    else:
+        json.dump(rows, out_f, indent=2)
+    out_f.close()
+
+if __name__ == "__main__":
+    # Check arguments
+    if ("--manifest" not in sys.argv) or ("--out" not in sys.argv):
+        print("\nERROR: Incorrect arguments provided for batch script")
+        print("Usage: python batch.py --manifest <manifest_file_path>")
+        print("                       --out <results_file_path (.json / .csv)>")
+        print("                       [ --verbose ]")
+        exit()
+
+    sim.verbose = "--verbose" in sys.argv
+    manifest = read_manifest(sys.argv[sys.argv.index("--manifest") + 1])
+    rows = run_batch(manifest)
+    write_rows(rows, sys.argv[sys.argv.index("--out") + 1])
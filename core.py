@@ -18,7 +18,7 @@ from sha3 import *
 q = 7681
 
 nlist = []
-for i in range(6,13):
+for i in range(6,14):
     n = 2**i
     if (q-1) % n == 0:
         nlist.append(n)
@@ -46,16 +46,16 @@ roots_of_unity = {
 3329:    { 64: 56,     128: 33,     256: 17 },
 7681:    { 64: 330,    128: 202,    256: 198,    512: 62 },
 12289:   { 64: 563,    128: 81,     256: 9,      512: 3,     1024: 49,    2048: 7,     4096: 41 },
-40961:   { 64: 1554,   128: 223,    256: 82,     512: 248,   1024: 40,    2048: 32,    4096: 28 },
-65537:   { 64: 255,    128: 2469,   256: 141,    512: 157,   1024: 431,   2048: 33,    4096: 21 },
+40961:   { 64: 1554,   128: 223,    256: 82,     512: 248,   1024: 40,    2048: 32,    4096: 28,    8192: 12 },
+65537:   { 64: 255,    128: 2469,   256: 141,    512: 157,   1024: 431,   2048: 33,    4096: 21,    8192: 13 },
 120833:  { 64: 4454,   128: 158,    256: 204,    512: 133,   1024: 206,   2048: 171 },
 133121:  { 64: 2340,   128: 6409,   256: 1143,   512: 348,   1024: 454,   2048: 39 },
 184321:  { 64: 7114,   128: 3388,   256: 946,    512: 445,   1024: 71,    2048: 391,   4096: 145 },
 4205569: { 64: 4429,   128: 3244,   256: 2818,   512: 30909, 1024: 742 },
 4206593: { 64: 435133, 128: 79570,  256: 10298,  512: 27945, 1024: 990,   2048: 1332,  4096: 629 },
 8058881: { 64: 414515, 128: 44206,  256: 5168,   512: 70867, 1024: 20460, 2048: 11507 },
-8380417: { 64: 434125, 128: 394148, 256: 169688, 512: 1753,  1024: 10730, 2048: 1306,  4096: 2741 },
-8404993: { 64: 90438,  128: 287322, 256: 56156,  512: 35544, 1024: 2893,  2048: 16204, 4096: 2687 },
+8380417: { 64: 434125, 128: 394148, 256: 169688, 512: 1753,  1024: 10730, 2048: 1306,  4096: 2741,  8192: 687 },
+8404993: { 64: 90438,  128: 287322, 256: 56156,  512: 35544, 1024: 2893,  2048: 16204, 4096: 2687,  8192: 175 },
 }
 
 rej_fast_factors = {
@@ -74,29 +74,134 @@ rej_fast_factors = {
 8404993: 7,
 }
 
+# Other NTT-friendly primes are supported by computing their roots of unity and rejection sampling
+# factor at first use (see "supported_modulus" in sim.py)
+def is_prime(q):
+    if q < 2:
+        return False
+    for d in range(2, math.isqrt(q)+1):
+        if q % d == 0:
+            return False
+    return True
+
+# Smallest primitive n-th root of unity for each n = 2^6 to 2^13 dividing q-1, as in the Sage script above
+def ntt_roots(q):
+    # x^((q-1)/n) is a primitive n-th root of unity for any quadratic non-residue x, the others are its odd powers
+    x = 2
+    while pow(x, (q-1) >> 1, q) == 1:
+        x = x + 1
+    roots = {}
+    for n in [2**i for i in range(6,14)]:
+        if (q-1) % n == 0:
+            omega = pow(x, (q-1)//n, q)
+            roots[n] = min([pow(omega, k, q) for k in range(1, n, 2)])
+    return roots
+
+# Smallest factor such that at least 7/8 of the samples drawn below the next power of two are accepted
+# This reproduces the tabulated hardware factors except for 3329 (19, this rule gives 9) and 184321 (11, this rule
+# gives 5), whose factors were chosen for a higher acceptance rate, so it is only used for primes missing from the table
+def rej_fast_factor(q):
+    factor = 1
+    while 8*factor*q < 7*2**math.ceil(math.log(factor*q,2)):
+        factor = factor + 1
+    return factor
+
+# Twiddle factors and bit-reversal permutations are cached per (n, q) and
+# shared by all instructions, iterations and programs simulated in a process
+twiddle_cache = {}
+
+def bitrev_pairs(n):
+    key = ("bitrev", n)
+    if key not in twiddle_cache:
+        pairs = []
+        j = 0
+        for i in range(1,n):
+            b = n >> 1
+            while j >= b:
+                j -= b
+                b >>= 1
+            j += b
+            if j > i:
+                pairs.append((i, j))
+        twiddle_cache[key] = pairs
+    return twiddle_cache[key]
+
+def ntt_twiddles(n, q, omega):
+    key = ("ntt", n, q, omega)
+    if key not in twiddle_cache:
+        stages = []
+        for trans_size in [2**i for i in range(1,int(math.log(n,2))+1)]:
+            wb = 1
+            wb_step = pow(omega, int(n/trans_size), q)
+            wbs = []
+            for t in range(trans_size >> 1):
+                wbs.append(wb)
+                wb = (wb * wb_step) % q
+            stages.append((trans_size, wbs))
+        twiddle_cache[key] = stages
+    return twiddle_cache[key]
+
+def psi_powers(n, q, psi, scale=1):
+    key = ("psi", n, q, psi, scale)
+    if key not in twiddle_cache:
+        factors = []
+        factor = scale % q
+        for i in range(n):
+            factors.append(factor)
+            factor = (factor * psi) % q
+        twiddle_cache[key] = factors
+    return twiddle_cache[key]
+
+# Cycle counts of the transforms and samplers below, shared with the simulator and its static estimator (see
+# "instr_costs" and "static_charges" in sim.py)
+def ntt_cycles(n):
+    return 2 + 1 + (1+int(n/2))*int(math.log(n,2))
+
+def mult_psi_cycles(n):
+    return 2 + 1 + (n+1)
+
+# SHAKE-based sampler squeezing "words" 32-bit words and spending "work" cycles on sampling
+def shake_sampler_cycles(mode, words, work):
+    if mode == 128:
+        return 2 + 1 + (25+25+math.ceil(words*29/42)+work)
+    if mode == 256:
+        return 2 + 1 + (25+25+math.ceil(words*33/34)+work)
+
+# Sampler (opcode without "_pseudo") drawing "words" 32-bit words, "cdt_len" entries of the CDT for "cdt_sample"
+def sampler_cycles(sampler, n, mode, words, cdt_len=0):
+    if sampler in ["rej_sample", "uni_sample"]:
+        return shake_sampler_cycles(mode, words, words)
+    if sampler in ["tri_sample_1", "tri_sample_2"]:
+        return shake_sampler_cycles(mode, words, (2*words)+n)
+    if sampler == "cdt_sample":
+        return shake_sampler_cycles(mode, words, (cdt_len+3)*n)
+    return shake_sampler_cycles(mode, words, n)
+
+# Words drawn by binomial sampling, one word per coefficient for k <= 16 and two words otherwise
+def binomial_words(n, k):
+    return n if k <= 16 else 2*n
+
 def mult_psi(n, q, poly, line, instr):
     if 2*n not in roots_of_unity[q]:
         print("\n[Line %d] %s\nERROR: 2n-th root of unity modulo q does not exist for \"n = %d\" and \"q = %d\"\n" % (line, instr, n, q))
         exit()        
     psi = roots_of_unity[q][2*n]
-    factor = 1
+    factors = psi_powers(n, q, psi)
     for i in range(n):
-        poly[i] = (int(poly[i]) * factor) % q
-        factor = (factor * psi) % q
-    return 2 + 1 + (n+1)
+        poly[i] = (int(poly[i]) * factors[i]) % q
+    return mult_psi_cycles(n)
 
 def mult_psi_inv(n, q, poly, line, instr):
     if 2*n not in roots_of_unity[q]:
         print("\n[Line %d] %s\nERROR: 2n-th root of unity modulo q does not exist for \"n = %d\" and \"q = %d\"\n" % (line, instr, n, q))
         exit()        
     psi = roots_of_unity[q][2*n]
-    psi_inv = (psi**(q-2)) % q
-    n_inv = (n**(q-2)) % q
-    factor = 1
+    psi_inv = pow(psi, q-2, q)
+    n_inv = pow(n, q-2, q)
+    factors = psi_powers(n, q, psi_inv, n_inv)
     for i in range(n):
-        poly[i] = (((int(poly[i]) * n_inv) % q) * factor) % q
-        factor = (factor * psi_inv) % q
-    return 2 + 1 + (n+1)
+        poly[i] = (int(poly[i]) * factors[i]) % q
+    return mult_psi_cycles(n)
 
 def dif_ntt(n, q, poly, line, instr):
     if 2*n not in roots_of_unity[q]:
@@ -104,21 +209,12 @@ def dif_ntt(n, q, poly, line, instr):
         exit()        
     omega = roots_of_unity[q][n]
     # bitrev_shuffle
-    j = 0
-    for i in range(1,n):
-        b = n >> 1
-        while j >= b:
-            j -= b
-            b >>= 1
-        j += b
-        if j > i:
-            poly[i], poly[j] = poly[j], poly[i]
+    for (i, j) in bitrev_pairs(n):
+        poly[i], poly[j] = poly[j], poly[i]
     # ntt
-    trans_size = 2
-    for trans_size in [2**i for i in range(1,int(math.log(n,2))+1)]:
-        wb = 1
-        wb_step = (omega**(int(n/trans_size))) % q
+    for (trans_size, wbs) in ntt_twiddles(n, q, omega):
         for t in range(trans_size >> 1):
+            wb = wbs[t]
             for trans in range(int(n/trans_size)):
                 i = trans * trans_size + t
                 j = i + (trans_size >> 1)
@@ -126,18 +222,10 @@ def dif_ntt(n, q, poly, line, instr):
                 b = (int(poly[j]) * wb) % q
                 poly[i] = (a + b) % q
                 poly[j] = (a - b) % q
-            wb = (wb * wb_step) % q
     # bitrev_shuffle
-    j = 0
-    for i in range(1,n):
-        b = n >> 1
-        while j >= b:
-            j -= b
-            b >>= 1
-        j += b
-        if j > i:
-            poly[i], poly[j] = poly[j], poly[i]
-    return 2 + 1 + (1+int(n/2))*int(math.log(n,2))
+    for (i, j) in bitrev_pairs(n):
+        poly[i], poly[j] = poly[j], poly[i]
+    return ntt_cycles(n)
 
 def dit_ntt(n, q, poly, line, instr):
     if 2*n not in roots_of_unity[q]:
@@ -145,11 +233,9 @@ def dit_ntt(n, q, poly, line, instr):
         exit()        
     omega = roots_of_unity[q][n]
     # ntt
-    trans_size = 2
-    for trans_size in [2**i for i in range(1,int(math.log(n,2))+1)]:
-        wb = 1
-        wb_step = (omega**(int(n/trans_size))) % q
+    for (trans_size, wbs) in ntt_twiddles(n, q, omega):
         for t in range(trans_size >> 1):
+            wb = wbs[t]
             for trans in range(int(n/trans_size)):
                 i = trans * trans_size + t
                 j = i + (trans_size >> 1)
@@ -157,31 +243,21 @@ def dit_ntt(n, q, poly, line, instr):
                 b = (int(poly[j]) * wb) % q
                 poly[i] = (a + b) % q
                 poly[j] = (a - b) % q
-            wb = (wb * wb_step) % q
-    return 2 + 1 + (1+int(n/2))*int(math.log(n,2))
+    return ntt_cycles(n)
 
 def dif_intt(n, q, poly, line, instr):
     if 2*n not in roots_of_unity[q]:
         print("\n[Line %d] %s\nERROR: 2n-th root of unity modulo q does not exist for \"n = %d\" and \"q = %d\"\n" % (line, instr, n, q))
         exit()        
     omega = roots_of_unity[q][n]
-    omega_inv = (omega**(q-2)) % q
+    omega_inv = pow(omega, q-2, q)
     # bitrev_shuffle
-    j = 0
-    for i in range(1,n):
-        b = n >> 1
-        while j >= b:
-            j -= b
-            b >>= 1
-        j += b
-        if j > i:
-            poly[i], poly[j] = poly[j], poly[i]
+    for (i, j) in bitrev_pairs(n):
+        poly[i], poly[j] = poly[j], poly[i]
     # intt
-    trans_size = 2
-    for trans_size in [2**i for i in range(1,int(math.log(n,2))+1)]:
-        wb = 1
-        wb_step = (omega_inv**(int(n/trans_size))) % q
+    for (trans_size, wbs) in ntt_twiddles(n, q, omega_inv):
         for t in range(trans_size >> 1):
+            wb = wbs[t]
             for trans in range(int(n/trans_size)):
                 i = trans * trans_size + t
                 j = i + (trans_size >> 1)
@@ -189,31 +265,21 @@ def dif_intt(n, q, poly, line, instr):
                 b = (int(poly[j]) * wb) % q
                 poly[i] = (a + b) % q
                 poly[j] = (a - b) % q
-            wb = (wb * wb_step) % q
     # bitrev_shuffle
-    j = 0
-    for i in range(1,n):
-        b = n >> 1
-        while j >= b:
-            j -= b
-            b >>= 1
-        j += b
-        if j > i:
-            poly[i], poly[j] = poly[j], poly[i]
-    return 2 + 1 + (1+int(n/2))*int(math.log(n,2))
+    for (i, j) in bitrev_pairs(n):
+        poly[i], poly[j] = poly[j], poly[i]
+    return ntt_cycles(n)
 
 def dit_intt(n, q, poly, line, instr):
     if 2*n not in roots_of_unity[q]:
         print("\n[Line %d] %s\nERROR: 2n-th root of unity modulo q does not exist for \"n = %d\" and \"q = %d\"\n" % (line, instr, n, q))
         exit()        
     omega = roots_of_unity[q][n]
-    omega_inv = (omega**(q-2)) % q
+    omega_inv = pow(omega, q-2, q)
     # intt
-    trans_size = 2
-    for trans_size in [2**i for i in range(1,int(math.log(n,2))+1)]:
-        wb = 1
-        wb_step = (omega_inv**(int(n/trans_size))) % q
+    for (trans_size, wbs) in ntt_twiddles(n, q, omega_inv):
         for t in range(trans_size >> 1):
+            wb = wbs[t]
             for trans in range(int(n/trans_size)):
                 i = trans * trans_size + t
                 j = i + (trans_size >> 1)
@@ -221,8 +287,7 @@ def dit_intt(n, q, poly, line, instr):
                 b = (int(poly[j]) * wb) % q
                 poly[i] = (a + b) % q
                 poly[j] = (a - b) % q
-            wb = (wb * wb_step) % q
-    return 2 + 1 + (1+int(n/2))*int(math.log(n,2))
+    return ntt_cycles(n)
 
 def poly_shift(n, q, ring, poly):
     coeff = poly[n-1]
@@ -234,30 +299,42 @@ def poly_shift(n, q, ring, poly):
         poly[0] = coeff
     return 2 + 1 + 1 + (3*n)
 
+# SHAKE output for samplers with a data-dependent number of 32-bit draws, the expected number of draws
+# (with a margin) is generated first and the full 100*n bits only if it runs out (shorter SHAKE outputs are
+# prefixes of longer ones, so the samples do not depend on the length generated)
+def shake_draws(mode, seed, n, draws):
+    bits = min(32*math.ceil(1.25*draws + 16), 100*n)
+    if mode == 128:
+        return shake_128(seed, bits)
+    if mode == 256:
+        return shake_256(seed, bits)
+
+def shake_draw(mode, seed, n, buf, count):
+    if 8*(count+1) > len(buf) and len(buf) < 25*n:
+        if mode == 128:
+            buf = shake_128(seed, 100*n)
+        if mode == 256:
+            buf = shake_256(seed, 100*n)
+    return buf
+
 def rejection_sample(n, q, mode, seed, poly):
     # Minimum probability of successful rejection sampling of a coefficient in the range [0, q)
     # for currently supported primes q is 88%, so it may be enough to generate n*32/0.88 = 37n bits
     # However, we generate 100*n bits to be safe (note that this is for the simulator only, the
     # actual hardware squeezes out bits from SHAKE only when needed)
-    if mode == 128:
-        buf = shake_128(seed, 100*n)
-    if mode == 256:
-        buf = shake_256(seed, 100*n)
     bound = rej_fast_factors[q] * q
     bits = math.ceil(math.log(bound,2))
+    buf = shake_draws(mode, seed, n, n*2**bits/bound)
     count = 0
     i = 0
     while (i < n):
-        sample = int(buf[:8], 16) % 2**bits
+        buf = shake_draw(mode, seed, n, buf, count)
+        sample = int(buf[8*count:8*count+8], 16) % 2**bits
         if sample < bound:
             poly[i] = sample % q
             i = i + 1
-        buf = buf[8:]
         count = count + 1
-    if mode == 128:
-        return 2 + 1 + (25+25+math.ceil(count*29/42)+count)
-    if mode == 256:
-        return 2 + 1 + (25+25+math.ceil(count*33/34)+count)
+    return sampler_cycles("rej_sample", n, mode, count)
 
 def binomial_sample(n, q, k, mode, seed, poly):
     if mode == 128:
@@ -272,28 +349,15 @@ def binomial_sample(n, q, k, mode, seed, poly):
             buf = shake_256(seed, 64*n)
     for i in range(n):
         if k <= 16:
-            a = int(buf[:4], 16) % 2**k
-            buf = buf[4:]
-            b = int(buf[:4], 16) % 2**k
-            buf = buf[4:]
+            a = int(buf[8*i:8*i+4], 16) % 2**k
+            b = int(buf[8*i+4:8*i+8], 16) % 2**k
         else:
-            a = int(buf[:8], 16) % 2**k
-            buf = buf[8:]
-            b = int(buf[:8], 16) % 2**k
-            buf = buf[8:]
-        hw_a = sum( [a & (1<<j) > 0 for j in range(k)] )
-        hw_b = sum( [b & (1<<j) > 0 for j in range(k)] )
+            a = int(buf[16*i:16*i+8], 16) % 2**k
+            b = int(buf[16*i+8:16*i+16], 16) % 2**k
+        hw_a = bin(a).count("1")
+        hw_b = bin(b).count("1")
         poly[i] = (hw_a - hw_b + q) % q
-    if mode == 128:
-        if k <= 16:
-            return 2 + 1 + (25+25+math.ceil(n*29/42)+n)
-        else:
-            return 2 + 1 + (25+25+math.ceil(n*29/21)+n)
-    if mode == 256:
-        if k <= 16:
-            return 2 + 1 + (25+25+math.ceil(n*33/34)+n)
-        else:
-            return 2 + 1 + (25+25+math.ceil(n*33/17)+n)
+    return sampler_cycles("bin_sample", n, mode, binomial_words(n, k))
 
 def cdt_sample(n, q, r, mode, seed, cdt, poly):
     if mode == 128:
@@ -301,93 +365,71 @@ def cdt_sample(n, q, r, mode, seed, cdt, poly):
     if mode == 256:
         buf = shake_256(seed, 32*n)
     for i in range(n):
-        val = int(buf[:8], 16) % 2**(r-1)
-        sign = (-1)**(int(int(buf[:8], 16) / 2**(r-1)))
-        buf = buf[8:]
+        val = int(buf[8*i:8*i+8], 16) % 2**(r-1)
+        sign = (-1)**(int(int(buf[8*i:8*i+8], 16) / 2**(r-1)))
         sample = 0
         for j in range(len(cdt)):
             sample = sample + int(cdt[j] < val)
         poly[i] = (sign*sample + q) % q
-    if mode == 128:
-        return 2 + 1 + (25+25+math.ceil(n*29/42)+((len(cdt)+3)*n))
-    if mode == 256:
-        return 2 + 1 + (25+25+math.ceil(n*33/34)+((len(cdt)+3)*n))
+    return sampler_cycles("cdt_sample", n, mode, n, len(cdt))
 
 def uniform_sample(n, q, eta, mode, seed, poly):
-    # Again, we generate 100*n bits to be safe (note that this is for the simulator only, the
+    # Again, we generate up to 100*n bits to be safe (note that this is for the simulator only, the
     # actual hardware squeezes out bits from SHAKE only when needed)
-    if mode == 128:
-        buf = shake_128(seed, 100*n)
-    if mode == 256:
-        buf = shake_256(seed, 100*n)
     bound = 2*eta + 1
     bits = math.ceil(math.log(bound,2))
+    buf = shake_draws(mode, seed, n, n*2**bits/bound)
     count = 0
     i = 0
     while (i < n):
-        sample = int(buf[:8], 16) % 2**bits
+        buf = shake_draw(mode, seed, n, buf, count)
+        sample = int(buf[8*count:8*count+8], 16) % 2**bits
         if sample < bound:
             poly[i] = (sample - eta + q) % q
             i = i + 1
-        buf = buf[8:]
         count = count + 1
-    if mode == 128:
-        return 2 + 1 + (25+25+math.ceil(count*29/42)+count)
-    if mode == 256:
-        return 2 + 1 + (25+25+math.ceil(count*33/34)+count)
+    return sampler_cycles("uni_sample", n, mode, count)
 
 def trinary_sample_1(n, q, m, mode, seed, poly):
-    # Again, we generate 100*n bits to be safe (note that this is for the simulator only, the
+    # Again, we generate up to 100*n bits to be safe (note that this is for the simulator only, the
     # actual hardware squeezes out bits from SHAKE only when needed)
-    if mode == 128:
-        buf = shake_128(seed, 100*n)
-    if mode == 256:
-        buf = shake_256(seed, 100*n)
-    poly = [0] * n
+    buf = shake_draws(mode, seed, n, distinct_draws(n, m)[1])
+    poly[:] = [0] * n
     count = 0
     i = 0
     while (i < m):
-        sample = int(buf[:8], 16) % param_n
-        sign = (-1)**(int(int(buf[:8], 16) / 2**31))
+        buf = shake_draw(mode, seed, n, buf, count)
+        sample = int(buf[8*count:8*count+8], 16) % n
+        sign = (-1)**(int(int(buf[8*count:8*count+8], 16) / 2**31))
         if poly[sample] == 0:
             poly[sample] = (sign + q) % q
             i = i + 1
-        buf = buf[8:]
         count = count + 1
-    if mode == 128:
-        return 2 + 1 + (25+25+math.ceil(count*29/42)+(2*count)+n)
-    if mode == 256:
-        return 2 + 1 + (25+25+math.ceil(count*33/34)+(2*count)+n)
+    return sampler_cycles("tri_sample_1", n, mode, count)
 
 def trinary_sample_2(n, q, m0, m1, mode, seed, poly):
-    # Again, we generate 100*n bits to be safe (note that this is for the simulator only, the
+    # Again, we generate up to 100*n bits to be safe (note that this is for the simulator only, the
     # actual hardware squeezes out bits from SHAKE only when needed)
-    if mode == 128:
-        buf = shake_128(seed, 100*n)
-    if mode == 256:
-        buf = shake_256(seed, 100*n)
-    poly = [0] * n
+    buf = shake_draws(mode, seed, n, distinct_draws(n, m0+m1)[1])
+    poly[:] = [0] * n
     count = 0
     i = 0
     while (i < m0):
-        sample = int(buf[:8], 16) % param_n
+        buf = shake_draw(mode, seed, n, buf, count)
+        sample = int(buf[8*count:8*count+8], 16) % n
         if poly[sample] == 0:
             poly[sample] = 1
             i = i + 1
-        buf = buf[8:]
         count = count + 1
     i = 0
     while (i < m1):
-        sample = int(buf[:8], 16) % param_n
+        buf = shake_draw(mode, seed, n, buf, count)
+        sample = int(buf[8*count:8*count+8], 16) % n
         if poly[sample] == 0:
             poly[sample] = q-1
             i = i + 1
-        buf = buf[8:]
         count = count + 1
-    if mode == 128:
-        return 2 + 1 + (25+25+math.ceil(count*29/42)+(2*count)+n)
-    if mode == 256:
-        return 2 + 1 + (25+25+math.ceil(count*33/34)+(2*count)+n)
+    return sampler_cycles("tri_sample_2", n, mode, count)
 
 def trinary_sample_3(n, q, rho, mode, seed, poly):
     if mode == 128:
@@ -396,22 +438,52 @@ def trinary_sample_3(n, q, rho, mode, seed, poly):
         buf = shake_256(seed, 32*n)
     bits = int(math.log(rho,2))+1
     for i in range(n):
-        sample = int(buf[:8], 16) % 2**bits
+        sample = int(buf[8*i:8*i+8], 16) % 2**bits
         if sample == 0:
             poly[i] = 1
         elif sample == 1:
             poly[i] = q-1
         else:
             poly[i] = 0
-        buf = buf[8:]
-    if mode == 128:
-            return 2 + 1 + (25+25+math.ceil(n*29/42)+n)
-    if mode == 256:
-            return 2 + 1 + (25+25+math.ceil(n*33/34)+n)
+    return sampler_cycles("tri_sample_3", n, mode, n)
 
         
         
 
+# Statistical models of the number of 32-bit words drawn by the data-dependent samplers (used by the
+# static estimator, see "--estimate" in sim.py), return (minimum, mean, variance, maximum, minimum
+# acceptance probability of a draw)
+# The maximum is set by the length of the SHAKE output generated by the simulator (100*n bits)
+def rejection_draws(n, bound):
+    bits = math.ceil(math.log(bound,2))
+    accept = bound / 2**bits
+    return (n, n/accept, n*(1-accept)/accept**2, int(100*n/32), accept)
 
+# Drawing "m" distinct positions out of "n" (trinary samplers), i-th position accepted with probability (n-i)/n
+def distinct_draws(n, m):
+    mean = 0
+    var = 0
+    for i in range(m):
+        accept = (n-i) / n
+        mean = mean + 1/accept
+        var = var + (1-accept)/accept**2
+    return (m, mean, var, int(100*n/32), (n-m+1)/n)
 
-
+# Number of draws exceeded with probability at most "epsilon", for draws modeled as a sum of independent
+# geometric variables with the given mean and minimum acceptance probability, using the tail bound
+# P(X >= l*mean) <= exp(-accept*mean*(l-1-ln(l))) (S. Janson, Statistics & Probability Letters, 2018)
+def draws_tail_bound(draws, epsilon):
+    (draws_min, draws_mean, draws_var, draws_max, accept) = draws
+    if accept >= 1:
+        return draws_min
+    target = math.log(1/epsilon) / (accept*draws_mean)
+    (lo, hi) = (1, 2)
+    while hi - 1 - math.log(hi) < target:
+        hi = 2*hi
+    for i in range(64):
+        mid = (lo + hi) / 2
+        if mid - 1 - math.log(mid) < target:
+            lo = mid
+        else:
+            hi = mid
+    return min(draws_max, math.ceil(hi*draws_mean))
@@ -106,23 +106,24 @@ def encode_to_bytearray(n, q, poly, encoding, line, instr):
         print("\n[Line %d] %s\nERROR: Unsupported encoding \"%s\", allowed encodings are %s\n" % (line, instr, encoding, supported_encodings))
         exit()
 
-def random_poly_encode(n, q, poly, encoding, line, instr):
+# "rng" is the random number generator (module "random" or a "random.Random" instance)
+def random_poly_encode(n, q, poly, encoding, line, instr, rng=random):
     if encoding == "BINARY_0RED":
         for i in range(n):
-            poly[i] = int(round((q/2)*random.getrandbits(1)))
+            poly[i] = int(round((q/2)*rng.getrandbits(1)))
     elif encoding == "BINARY_2RED":
         for i in range(int(n/2)):
-            poly[i         ] = int(round((q/2)*random.getrandbits(1)))
+            poly[i         ] = int(round((q/2)*rng.getrandbits(1)))
             poly[i+int(n/2)] = poly[i]
     elif encoding == "BINARY_4RED":
         for i in range(int(n/4)):
-            poly[i           ] = int(round((q/2)*random.getrandbits(1)))
+            poly[i           ] = int(round((q/2)*rng.getrandbits(1)))
             poly[i+  int(n/4)] = poly[i]
             poly[i+2*int(n/4)] = poly[i]
             poly[i+3*int(n/4)] = poly[i]
     elif encoding == "BINARY_8RED":
         for i in range(int(n/8)):
-            poly[i           ] = int(round((q/2)*random.getrandbits(1)))
+            poly[i           ] = int(round((q/2)*rng.getrandbits(1)))
             poly[i+  int(n/8)] = poly[i]
             poly[i+2*int(n/8)] = poly[i]
             poly[i+3*int(n/8)] = poly[i]
@@ -132,13 +133,13 @@ def random_poly_encode(n, q, poly, encoding, line, instr):
             poly[i+7*int(n/8)] = poly[i]
     elif encoding == "TRUNC_256":
         for i in range(256):
-            poly[i] = int(round((q/2)*random.getrandbits(1)))
+            poly[i] = int(round((q/2)*rng.getrandbits(1)))
         for i in range(256,n):
             poly[i] = 0
     elif encoding == "TRUNC_256_MSB":
         lsbits = int(math.floor(math.log(q,2))) - 2
         for i in range(256):
-            poly[i] = (random.getrandbits(1) << (lsbits+1)) + (1 << lsbits)
+            poly[i] = (rng.getrandbits(1) << (lsbits+1)) + (1 << lsbits)
         for i in range(256,n):
             poly[i] = 0
     else:
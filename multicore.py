@@ -0,0 +1,238 @@
+#! /usr/bin/python
+
+###################################################################################################
+#
+# Multi-Core Runner for Sapphire-Sim
+#
+# Inputs:  Manifest (Number of Cores, Per-Core Programs or a Workload Partitioned across Cores,
+#          Operating Condition)
+# Outputs: Per-Core Busy / Stall Cycles, Utilization and Energy, Aggregate Throughput, Shared
+#          Interface Utilization and Total Power
+#
+###################################################################################################
+
+import math, sys, os, io, json, shutil, tempfile, contextlib, multiprocessing
+import sim
+
+# Example manifest:
+# {
+#     "cores"      : 4,
+#     "workload"   : [ { "prog" : "programs/prog_kyber_v1_512_cpapke", "defines" : [ ["KEYGEN"], ["ENCRYPT"], ["DECRYPT"] ], "repeat" : 8 },
+#                      { "prog" : "programs/prog_remblem_512_cpapke", "cdt" : "cdt_files/cdt_file_3p0_10_10", "defines" : [ ["KEYGEN"] ] } ],
+#     "op_point"   : { "vdd" : 1.1, "fmhz" : 72 },
+#     "free_rw"    : false,
+#     "interface"  : "word",
+#     "calibration" : "calibration/sapphire.json",
+#     "temp_c"     : 25,
+#     "seed"       : 1
+# }
+# Jobs in "workload" are partitioned across the cores (longest statically estimated job first, onto the least
+# loaded core), alternatively "cores" can list the jobs of each core, e.g. "cores" : [ [ <job>, ... ], [ <job>, ... ] ]
+# The define sets of a job are run in the listed order on the same core, as in batch.py
+
+# Read and check multi-core manifest, jobs are expanded ("repeat") with absolute paths
+def read_manifest(manifest_file):
+    if not os.path.exists(manifest_file):
+        print("\nERROR: Manifest file %s does not exist" % manifest_file)
+        exit()
+    manifest_f = open(manifest_file)
+    manifest = json.load(manifest_f)
+    manifest_f.close()
+
+    if "cores" not in manifest or "op_point" not in manifest:
+        print("\nERROR: Manifest must provide \"cores\" and \"op_point\"")
+        exit()
+    if isinstance(manifest["cores"], int) and len(manifest.get("workload", [])) == 0:
+        print("\nERROR: Manifest must list at least one job in \"workload\" when \"cores\" is a number")
+        exit()
+    manifest.setdefault("free_rw", False)
+    manifest.setdefault("interface", "word")
+    manifest.setdefault("calibration", sim.CALIBRATION_FILE)
+    manifest.setdefault("temp_c", None)
+    manifest.setdefault("seed", None)
+    sim.check_operating_point(manifest["op_point"]["vdd"], manifest["op_point"]["fmhz"])
+    sim.set_interface(manifest["interface"])
+    sim.load_calibration(manifest["calibration"])
+    sim.set_temperature(manifest["temp_c"])
+
+    def expand(jobs):
+        expanded = []
+        for job in jobs:
+            if isinstance(job, str):
+                job = { "prog" : job }
+            job.setdefault("cdt", None)
+            job.setdefault("defines", [[]])
+            job["prog"] = os.path.abspath(job["prog"])
+            if job["cdt"] is not None:
+                job["cdt"] = os.path.abspath(job["cdt"])
+            expanded = expanded + [job]*job.get("repeat", 1)
+        return expanded
+    if isinstance(manifest["cores"], int):
+        manifest["workload"] = expand(manifest["workload"])
+    else:
+        manifest["cores"] = [expand(jobs) for jobs in manifest["cores"]]
+    return manifest
+
+# Greedy partitioning (longest processing time first) using the static estimate of each job
+def partition(jobs, num_cores, vdd, fmhz):
+    estimates = []
+    for job in jobs:
+        sim.cdt_mem = sim.load_cdt(job["cdt"]) if job["cdt"] is not None else None
+        cycles = 0
+        for prog_defines in job["defines"]:
+            sim.load_program(job["prog"], prog_defines)
+            cycles = cycles + sim.estimate_program(vdd, fmhz)["cycles"][1]
+        estimates.append(cycles)
+    cores = [[] for i in range(num_cores)]
+    loads = [0]*num_cores
+    for i in sorted(range(len(jobs)), key=lambda i: -estimates[i]):
+        core = loads.index(min(loads))
+        cores[core].append(jobs[i])
+        loads[core] = loads[core] + estimates[i]
+    return cores
+
+# Simulate the jobs of one core back to back (in its own process, if run in parallel), in a private copy of data/
+# so that cores do not overwrite each other's vectors, returns its runs and host interface transfers (local cycles)
+def run_core(core_args):
+    (core, jobs, manifest, data_dir) = core_args
+    vdd = manifest["op_point"]["vdd"]
+    fmhz = manifest["op_point"]["fmhz"]
+    result = { "core" : core, "runs" : [], "transfers" : [], "cycles" : 0, "energy_pj" : 0, "output" : "", "error" : None }
+    cwd = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="sapphire_core%d_" % core)
+    if os.path.isdir(data_dir):
+        shutil.copytree(data_dir, os.path.join(work_dir, "data"))
+    os.chdir(work_dir)
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out):
+            sim.free_rw = manifest["free_rw"]
+            sim.set_interface(manifest["interface"])
+            if manifest["seed"] is not None:
+                sim.seed_rng(manifest["seed"] + core)
+            for job in jobs:
+                sim.cdt_mem = sim.load_cdt(job["cdt"]) if job["cdt"] is not None else None
+                for prog_defines in job["defines"]:
+                    sim.load_program(job["prog"], prog_defines)
+                    sim.interface_log = []
+                    summary = sim.simulate(vdd, fmhz, 1, report=False)[0]
+                    result["transfers"] = result["transfers"] + [(result["cycles"] + start, cycles) for (start, cycles) in sim.interface_log]
+                    result["runs"].append({ "program" : job["prog"], "defines" : " ".join(prog_defines), "cycles" : summary["cycles"], "energy_pj" : summary["energy_pj"] })
+                    result["cycles"] = result["cycles"] + summary["cycles"]
+                    result["energy_pj"] = result["energy_pj"] + summary["energy_pj"]
+    except SystemExit:
+        result["error"] = out.getvalue().strip()
+    finally:
+        sim.interface_log = None
+        os.chdir(cwd)
+        shutil.rmtree(work_dir)
+    result["output"] = out.getvalue()
+    return result
+
+# Shared host interface, transfers are served one at a time in order of request (in simulated time)
+# A core waiting for the interface is stalled and only draws leakage current, as does a core that has finished
+def contend(results, vdd, fmhz):
+    delays = [0]*len(results)
+    next_transfer = [0]*len(results)
+    interface_free = 0
+    interface_busy = 0
+    while True:
+        pending = [(results[c]["transfers"][next_transfer[c]][0] + delays[c], c) for c in range(len(results)) if next_transfer[c] < len(results[c]["transfers"])]
+        if len(pending) == 0:
+            break
+        (request, c) = min(pending)
+        cycles = results[c]["transfers"][next_transfer[c]][1]
+        start = max(request, interface_free)
+        delays[c] = delays[c] + (start - request)
+        interface_free = start + cycles
+        interface_busy = interface_busy + cycles
+        next_transfer[c] = next_transfer[c] + 1
+
+    makespan = max([results[c]["cycles"] + delays[c] for c in range(len(results))])
+    # Energy of a leakage-only cycle, as in sim.convert_power
+    leak_pj = vdd*sim.leakage_current(vdd)/fmhz
+    cores = []
+    for (c, result) in enumerate(results):
+        idle = makespan - result["cycles"]
+        cores.append({
+            "core"          : c,
+            "runs"          : len(result["runs"]),
+            "busy_cycles"   : result["cycles"],
+            "stall_cycles"  : delays[c],
+            "utilization"   : result["cycles"]/makespan if makespan > 0 else 0,
+            "energy_pj"     : result["energy_pj"] + idle*leak_pj,
+        })
+    total_runs = sum([core["runs"] for core in cores])
+    total_energy_pj = sum([core["energy_pj"] for core in cores])
+    return {
+        "cores"                 : cores,
+        "makespan_cycles"       : makespan,
+        "makespan_us"           : makespan/fmhz,
+        "runs"                  : total_runs,
+        "throughput_runs_per_s" : total_runs/(makespan/fmhz)*1e6 if makespan > 0 else 0,
+        "single_core_cycles"    : sum([result["cycles"] for result in results]),
+        "speedup"               : sum([result["cycles"] for result in results])/makespan if makespan > 0 else 0,
+        "interface_utilization" : interface_busy/makespan if makespan > 0 else 0,
+        "energy_pj"             : total_energy_pj,
+        "avg_power_uw"          : total_energy_pj/(makespan/fmhz) if makespan > 0 else 0,
+    }
+
+def print_report(report, vdd, fmhz):
+    print("------------------------------------------------------------------------------")
+    print("Multi-Core Summary (%d cores at %0.2f V and %d MHz)" % (len(report["cores"]), vdd, fmhz))
+    print("------------------------------------------------------------------------------")
+    print("%-6s %6s %14s %14s %12s %14s" % ("Core", "Runs", "Busy Cycles", "Stall Cycles", "Utilization", "Energy (nJ)"))
+    for core in report["cores"]:
+        print("%-6d %6d %14s %14s %11.1f%% %14.3f" % (core["core"], core["runs"], format(core["busy_cycles"], ',d'), format(core["stall_cycles"], ',d'), 100*core["utilization"], core["energy_pj"]/1e3))
+    print("------------------------------------------------------------------------------")
+    print("* Makespan:       %s cycles (%0.2f us)" % (format(report["makespan_cycles"], ',d'), report["makespan_us"]))
+    print("* Throughput:     %0.2f runs/s (%d runs)" % (report["throughput_runs_per_s"], report["runs"]))
+    print("* Speedup:        %0.3fx over one core (%s cycles)" % (report["speedup"], format(report["single_core_cycles"], ',d')))
+    print("* Interface:      %0.1f%% utilized" % (100*report["interface_utilization"]))
+    print("* Total Energy:   %0.3f uJ" % (report["energy_pj"]/1e6))
+    print("* Total Power:    %0.3f mW" % (report["avg_power_uw"]/1e3))
+    print("------------------------------------------------------------------------------")
+
+if __name__ == "__main__":
+    # Check arguments
+    if "--manifest" not in sys.argv:
+        print("\nERROR: Incorrect arguments provided for multi-core script")
+        print("Usage: python multicore.py --manifest <manifest_file_path>")
+        print("                           [ --out <json_file_path> ]")
+        print("                           [ --jobs <num_processes> ]")
+        print("                           [ --verbose ]")
+        exit()
+
+    manifest = read_manifest(sys.argv[sys.argv.index("--manifest") + 1])
+    vdd = manifest["op_point"]["vdd"]
+    fmhz = manifest["op_point"]["fmhz"]
+    if isinstance(manifest["cores"], int):
+        cores = partition(manifest["workload"], manifest["cores"], vdd, fmhz)
+    else:
+        cores = manifest["cores"]
+    jobs = os.cpu_count()
+    if "--jobs" in sys.argv:
+        jobs = int(sys.argv[sys.argv.index("--jobs") + 1])
+
+    # Cores are independent until their host interface transfers are merged, so they are simulated in parallel
+    core_args = [(core, core_jobs, manifest, os.path.abspath("data")) for (core, core_jobs) in enumerate(cores)]
+    if jobs > 1 and len(cores) > 1:
+        pool = multiprocessing.get_context("fork").Pool(min(jobs, len(cores)))
+        results = pool.map(run_core, core_args)
+        pool.close()
+        pool.join()
+    else:
+        results = [run_core(args) for args in core_args]
+    for result in results:
+        if "--verbose" in sys.argv:
+            print(result["output"])
+        if result["error"] is not None:
+            print("\n[Core %d] %s" % (result["core"], result["error"]))
+            exit()
+
+    report = contend(results, vdd, fmhz)
+    print_report(report, vdd, fmhz)
+    if "--out" in sys.argv:
+        out_f = open(sys.argv[sys.argv.index("--out") + 1], "w")
+        json.dump(dict(report, runs_per_core=[result["runs"] for result in results]), out_f, indent=2)
+        out_f.close()
@@ -0,0 +1,218 @@
+#! /usr/bin/python
+
+###################################################################################################
+#
+# Throughput Benchmark for Sapphire-Sim
+#
+# Inputs:  Bundled programs (all define variants) and micro-benchmarks of core.py / encoding.py /
+#          sha3.py functions over all (n, q) in roots_of_unity
+# Outputs: Simulated instructions per second and cycles per second (programs), calls per second
+#          and cycles per second (micro-benchmarks), optional JSON results and baseline comparison
+#
+###################################################################################################
+
+import sys, os, io, time, json, random, shutil, tempfile, platform, contextlib
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import sim, core, encoding, sha3
+
+# The bundled CDT-based programs use r = 10
+CDT_FILE = "cdt_files/cdt_file_3p0_10_10"
+DEFINES = ["KEYGEN", "ENCRYPT", "DECRYPT"]
+SEED = "0123456789abcdef" * 4 + "00000001"
+
+# Digests are memoized across calls, clear them so that every repetition hashes from scratch
+def clear_hash_caches():
+    for func in [sha3.sha3_224, sha3.sha3_256, sha3.sha3_384, sha3.sha3_512, sha3.shake_128, sha3.shake_256]:
+        func.cache_clear()
+
+# Time "func" over "reps" repetitions after "warmup" untimed runs, "func" returns (instructions, cycles)
+def measure(func, warmup, reps):
+    for i in range(warmup):
+        clear_hash_caches()
+        func()
+    times = []
+    for i in range(reps):
+        clear_hash_caches()
+        t_start = time.perf_counter()
+        (instrs, cycles) = func()
+        times.append(time.perf_counter() - t_start)
+    best = min(times)
+    return {
+        "instructions"  : instrs,
+        "cycles"        : cycles,
+        "best_s"        : best,
+        "mean_s"        : sum(times)/len(times),
+        "instr_per_s"   : instrs/best,
+        "cycles_per_s"  : cycles/best,
+    }
+
+####################################
+# Program Benchmarks
+####################################
+
+# Programs are simulated in a scratch copy of the tree since they save vectors to data/
+def program_benchmarks(name_filter, warmup, reps):
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix="sapphire_bench_")
+    for sub_dir in ["programs", "data", "cdt_files"]:
+        shutil.copytree(os.path.join(ROOT_DIR, sub_dir), os.path.join(work_dir, sub_dir))
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        for prog_file in sorted(os.listdir("programs")):
+            prog_path = os.path.join("programs", prog_file)
+            prog_f = open(prog_path)
+            sim.cdt_mem = sim.load_cdt(CDT_FILE) if "cdt_sample" in prog_f.read() else None
+            prog_f.close()
+            # Variants are run in order so that each one loads the vectors saved by the previous one
+            for define in DEFINES:
+                name = "prog/%s/%s" % (prog_file, define)
+                sim.load_program(prog_path, [define])
+                def run():
+                    sim.seed_rng(1)
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        summary = sim.simulate(1.1, 72, 1, report=False)[0]
+                    return (summary["instructions"], summary["cycles"])
+                if name_filter not in name:
+                    run()
+                    continue
+                results[name] = measure(run, warmup, reps)
+                print_result(name, results[name])
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir)
+    return results
+
+####################################
+# Micro-Benchmarks
+####################################
+
+def random_poly(n, q):
+    return [random.randrange(q) for i in range(n)]
+
+# Returns a list of (name, func, args), core.py functions return cycle counts and modify "poly" in place
+def micro_benchmarks():
+    benches = []
+    cdt = sim.load_cdt(os.path.join(ROOT_DIR, CDT_FILE))
+    for q in sorted(core.roots_of_unity):
+        for n in sorted(core.roots_of_unity[q]):
+            # Transforms and samplers need the 2n-th root of unity
+            if 2*n not in core.roots_of_unity[q]:
+                continue
+            random.seed(n*q)
+            poly = random_poly(n, q)
+            for func in [core.dif_ntt, core.dit_ntt, core.dif_intt, core.dit_intt, core.mult_psi, core.mult_psi_inv]:
+                benches.append(("core/%s/n=%d/q=%d" % (func.__name__, n, q), func, (n, q, poly, 0, "")))
+            benches.append(("core/rejection_sample/n=%d/q=%d" % (n, q), core.rejection_sample, (n, q, 128, SEED, [0]*n)))
+            benches.append(("core/binomial_sample/n=%d/q=%d" % (n, q), core.binomial_sample, (n, q, 8, 128, SEED, [0]*n)))
+            benches.append(("core/cdt_sample/n=%d/q=%d" % (n, q), core.cdt_sample, (n, q, 10, 256, SEED, cdt, [0]*n)))
+            benches.append(("core/uniform_sample/n=%d/q=%d" % (n, q), core.uniform_sample, (n, q, 2, 256, SEED, [0]*n)))
+            benches.append(("core/trinary_sample_3/n=%d/q=%d" % (n, q), core.trinary_sample_3, (n, q, 4, 256, SEED, [0]*n)))
+            # TRUNC_* encodings read the first 256 coefficients
+            for enc in encoding.supported_encodings:
+                if enc.startswith("TRUNC_256") and n < 256:
+                    continue
+                benches.append(("encoding/%s/n=%d/q=%d" % (enc, n, q), encoding.encode_to_bytearray, (n, q, poly, enc, 0, "")))
+    # Message is a 256-bit seed, extendable output is sized as for the binomial / CDT samplers
+    for func in [sha3.sha3_224, sha3.sha3_256, sha3.sha3_384, sha3.sha3_512]:
+        benches.append(("sha3/%s" % func.__name__, func, (SEED,)))
+    for n in [256, 512, 1024, 2048, 4096]:
+        for func in [sha3.shake_128, sha3.shake_256]:
+            benches.append(("sha3/%s/d=%d" % (func.__name__, 32*n), func, (SEED, 32*n)))
+    return benches
+
+def micro_call(func, args):
+    ret = func(*args)
+    return (1, ret if isinstance(ret, int) else 0)
+
+####################################
+# Reporting
+####################################
+
+# Micro-benchmarks count calls instead of simulated instructions
+def print_result(name, result):
+    unit = "instr/s" if name.startswith("prog/") else "calls/s"
+    print("%-48s %10.2f ms %14s %s %16s cycles/s" % (name, 1e3*result["best_s"], format(int(result["instr_per_s"]), ',d'), unit, format(int(result["cycles_per_s"]), ',d')))
+
+# Compare against a previous results file, speedup > 1 means the current run is faster
+def compare_baseline(results, baseline_file, tolerance):
+    baseline_f = open(baseline_file)
+    baseline = json.load(baseline_f)["results"]
+    baseline_f.close()
+    print("------------------------------------------------------------------------------------------------")
+    print("Comparison against baseline %s" % baseline_file)
+    print("------------------------------------------------------------------------------------------------")
+    speedups = []
+    regressions = 0
+    for name in results:
+        if name not in baseline:
+            continue
+        speedup = baseline[name]["best_s"] / results[name]["best_s"]
+        speedups.append(speedup)
+        flag = ""
+        if speedup < 1 - tolerance:
+            flag = "  <-- REGRESSION"
+            regressions = regressions + 1
+        print("%-48s %10.2f ms -> %10.2f ms  %6.2fx%s" % (name, 1e3*baseline[name]["best_s"], 1e3*results[name]["best_s"], speedup, flag))
+    if len(speedups) > 0:
+        geomean = 1
+        for speedup in speedups:
+            geomean = geomean * speedup
+        geomean = geomean ** (1/len(speedups))
+        print("------------------------------------------------------------------------------------------------")
+        print("Geometric mean speedup over %d benchmarks: %0.2fx (%d regressions beyond %d%%)" % (len(speedups), geomean, regressions, int(100*tolerance)))
+    return regressions
+
+if __name__ == "__main__":
+    if "--help" in sys.argv:
+        print("Usage: python scripts/benchmark.py [ --programs | --micro ]")
+        print("                                   [ --filter <name_substring> ]")
+        print("                                   [ --warmup <num_runs> ] [ --reps <num_runs> ]")
+        print("                                   [ --out <results_json_path> ]")
+        print("                                   [ --baseline <results_json_path> ] [ --tolerance <fraction> ]")
+        exit()
+
+    name_filter = ""
+    warmup = 1
+    reps = 3
+    tolerance = 0.1
+    if "--filter" in sys.argv:
+        name_filter = sys.argv[sys.argv.index("--filter") + 1]
+    if "--warmup" in sys.argv:
+        warmup = int(sys.argv[sys.argv.index("--warmup") + 1])
+    if "--reps" in sys.argv:
+        reps = int(sys.argv[sys.argv.index("--reps") + 1])
+    if "--tolerance" in sys.argv:
+        tolerance = float(sys.argv[sys.argv.index("--tolerance") + 1])
+    if reps < 1:
+        print("\nERROR: Number of repetitions must be at least 1")
+        exit()
+
+    results = {}
+    if "--micro" not in sys.argv:
+        results.update(program_benchmarks(name_filter, warmup, reps))
+    if "--programs" not in sys.argv:
+        for (name, func, args) in micro_benchmarks():
+            if name_filter not in name:
+                continue
+            results[name] = measure(lambda: micro_call(func, args), warmup, reps)
+            print_result(name, results[name])
+
+    if "--out" in sys.argv:
+        out_f = open(sys.argv[sys.argv.index("--out") + 1], "w")
+        json.dump({
+            "python"    : platform.python_version(),
+            "platform"  : platform.platform(),
+            "warmup"    : warmup,
+            "reps"      : reps,
+            "results"   : results,
+        }, out_f, indent=2)
+        out_f.close()
+
+    if "--baseline" in sys.argv:
+        regressions = compare_baseline(results, sys.argv[sys.argv.index("--baseline") + 1], tolerance)
+        if regressions > 0:
+            sys.exit(1)
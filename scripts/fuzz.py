@@ -0,0 +1,255 @@
+#! /usr/bin/python
+
+###################################################################################################
+#
+# Differential Fuzzer for Sapphire-Sim
+#
+# Inputs:  Time budget, fuzzer seed
+# Outputs: Mismatches between the reference engine (scripts/reference_engine.py) and the current
+#          implementations in core.py / encoding.py, with minimal reproducer programs
+#
+# Each case picks (n, q) from valid_n x valid_q, random input polynomials and seeds, and a random
+# instruction sequence (respecting the poly_dst / poly_src memory bank pairing rule), which is
+# simulated once with each engine. Final polynomial memory, registers, cycle counts and per-unit
+# cycle counts must be identical. Encodings are also compared directly on random polynomials.
+#
+###################################################################################################
+
+import sys, os, io, time, random, shutil, tempfile, contextlib
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import sim
+import reference_engine
+
+# Functions of core.py / encoding.py which are rebound in sim.py when switching engines
+ENGINE_FUNCS = ["mult_psi", "mult_psi_inv", "dif_ntt", "dit_ntt", "dif_intt", "dit_intt",
+                "rejection_sample", "binomial_sample", "cdt_sample", "uniform_sample",
+                "trinary_sample_1", "trinary_sample_2", "trinary_sample_3",
+                "encode_to_bytearray", "random_poly_encode"]
+engines = {
+    "fast"      : dict([(name, getattr(sim, name)) for name in ENGINE_FUNCS]),
+    "reference" : dict([(name, getattr(reference_engine, name)) for name in ENGINE_FUNCS]),
+}
+
+# Same as the operations allowed by "poly_op" in sim.py
+POLY_OPS = ["ADD", "SUB", "MUL", "BITREV", "CONST_ADD", "CONST_SUB", "CONST_MUL", "CONST_AND", "CONST_OR", "CONST_XOR", "CONST_RSHIFT", "CONST_LSHIFT"]
+
+# CDT files in cdt_files/ are named cdt_file_<sigma>_<length>_<r>
+CDT_DIR = os.path.join(ROOT_DIR, "cdt_files")
+
+def use_engine(engine):
+    for (name, func) in engines[engine].items():
+        setattr(sim, name, func)
+
+####################################
+# Case Generation
+####################################
+
+# Returns (n, q, cdt_file, inputs, instrs) where "inputs" maps file names to saved values
+def gen_case(rng, max_instrs):
+    n = rng.choice(sim.valid_n)
+    q = rng.choice(sim.valid_q)
+    num_polys = int(sim.mem_size/n)
+    half = int(sim.mem_size/sim.mem_banks/n)
+    has_ntt = 2*n in sim.roots_of_unity[q]
+    cdt_file = rng.choice(sorted(os.listdir(CDT_DIR)))
+    cdt_r = int(cdt_file.split("_")[-1])
+
+    inputs = {}
+    instrs = []
+    # Random seeds and a few random input polynomials
+    for reg in [0, 1]:
+        inputs["r%d.npy" % reg] = [rng.getrandbits(256)]
+        instrs.append("load ( r%d , \"r%d.npy\" )" % (reg, reg))
+    for poly in rng.sample(range(num_polys), min(num_polys, 4)):
+        inputs["poly_%d.npy" % poly] = [rng.randrange(q) for i in range(n)]
+        instrs.append("load ( poly = %d , \"poly_%d.npy\" )" % (poly, poly))
+
+    def poly_pair():
+        (poly_a, poly_b) = (rng.randrange(half), rng.randrange(half, num_polys))
+        return (poly_a, poly_b) if rng.getrandbits(1) else (poly_b, poly_a)
+
+    def prng():
+        return "SHAKE-%d , seed = r%d" % (rng.choice([128, 256]), rng.randrange(2))
+
+    def pseudo():
+        return " c0 = %d , c1 = %d ," % (rng.randrange(16), rng.randrange(16)) if rng.getrandbits(1) else ""
+
+    for i in range(rng.randint(1, max_instrs)):
+        kind = rng.choice(["transform", "mult_psi", "poly_op", "shift_poly", "rej_sample", "bin_sample",
+                           "cdt_sample", "uni_sample", "tri_sample_1", "tri_sample_2", "tri_sample_3", "poly_reduce", "random"])
+        poly = rng.randrange(num_polys)
+        if kind == "transform" and has_ntt:
+            (poly_dst, poly_src) = poly_pair()
+            instrs.append("transform ( mode = %s , poly_dst = %d , poly_src = %d )" % (rng.choice(["DIF_NTT", "DIT_NTT", "DIF_INTT", "DIT_INTT"]), poly_dst, poly_src))
+        elif kind == "mult_psi" and has_ntt:
+            instrs.append("%s ( poly = %d )" % (rng.choice(["mult_psi", "mult_psi_inv"]), poly))
+        elif kind == "poly_op":
+            op = rng.choice(POLY_OPS)
+            if op.startswith("CONST_"):
+                instrs.append("reg = %d" % (rng.randrange(24) if op.endswith("SHIFT") else rng.randrange(q)))
+            (poly_dst, poly_src) = poly_pair()
+            instrs.append("poly_op ( op = %s , poly_dst = %d , poly_src = %d )" % (op, poly_dst, poly_src))
+        elif kind == "shift_poly":
+            (poly_dst, poly_src) = poly_pair()
+            instrs.append("shift_poly ( ring = x^N%s1 , poly_dst = %d , poly_src = %d )" % (rng.choice(["+", "-"]), poly_dst, poly_src))
+        elif kind == "rej_sample":
+            instrs.append("rej_sample ( prng = %s ,%s poly = %d )" % (prng(), pseudo(), poly))
+        elif kind == "bin_sample":
+            instrs.append("bin_sample ( prng = %s ,%s k = %d , poly = %d )" % (prng(), pseudo(), rng.randint(1, 32), poly))
+        elif kind == "cdt_sample":
+            instrs.append("cdt_sample ( prng = %s ,%s r = %d , poly = %d )" % (prng(), pseudo(), cdt_r, poly))
+        elif kind == "uni_sample":
+            instrs.append("uni_sample ( prng = %s ,%s eta = %d , poly = %d )" % (prng(), pseudo(), rng.randint(1, 16), poly))
+        elif kind == "tri_sample_1":
+            # At most n/2 distinct positions, so that the SHAKE output (100*n bits) does not run out
+            instrs.append("tri_sample_1 ( prng = %s ,%s m = %d , poly = %d )" % (prng(), pseudo(), rng.randint(1, int(n/2)), poly))
+        elif kind == "tri_sample_2":
+            m0 = rng.randint(0, int(n/2))
+            instrs.append("tri_sample_2 ( prng = %s ,%s m0 = %d , m1 = %d , poly = %d )" % (prng(), pseudo(), m0, rng.randint(0, int(n/2) - m0), poly))
+        elif kind == "tri_sample_3":
+            instrs.append("tri_sample_3 ( prng = %s ,%s rho = 1/%d , poly = %d )" % (prng(), pseudo(), 2**rng.randint(1, 7), poly))
+        elif kind == "poly_reduce":
+            instrs.append("reg = %s ( poly = %d )" % (rng.choice(["max", "sum"]), poly))
+        elif kind == "random":
+            # TRUNC_* encodings need at least 256 coefficients
+            enc = rng.choice([enc for enc in sim.supported_encodings if n >= 256 or not enc.startswith("TRUNC_256")])
+            instrs.append("random ( poly = %d , encoding = %s , \"rand_%d.npy\" )" % (poly, enc, i))
+
+    return (n, q, cdt_file, inputs, instrs)
+
+####################################
+# Case Execution
+####################################
+
+def write_case(case_dir, case):
+    (n, q, cdt_file, inputs, instrs) = case
+    for (f, values) in inputs.items():
+        np.save(os.path.join(case_dir, f), np.array(values, dtype=object) if f.startswith("r") else np.asarray(values))
+    prog_f = open(os.path.join(case_dir, "prog"), "w")
+    prog_f.write("config ( n = %d , q = %d )\n" % (n, q))
+    for instr in instrs:
+        prog_f.write(instr + "\n")
+    prog_f.write("end\n")
+    prog_f.close()
+
+# Simulate a case with one engine, returns its final state
+def run_case(case_dir, case, engine, case_seed):
+    use_engine(engine)
+    sim.cdt_mem = sim.load_cdt(os.path.join(CDT_DIR, case[2]))
+    cwd = os.getcwd()
+    os.chdir(case_dir)
+    for f in os.listdir("."):
+        if f.startswith("rand_"):
+            os.remove(f)
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out):
+            sim.seed_rng(case_seed)
+            sim.load_program("prog")
+            sim.run_iteration(0)
+        state = {
+            "poly_mem"      : [[int(x) for x in poly] for poly in sim.poly_mem],
+            "proc_regs"     : dict([(reg, int(val)) for (reg, val) in sim.proc_regs.items()]),
+            "cycles"        : sim.ticks,
+            "unit_cycles"   : dict([(unit, stats[0]) for (unit, stats) in sim.unit_stats.items()]),
+        }
+    except SystemExit:
+        state = { "error" : out.getvalue().strip().splitlines()[-1:] }
+    except Exception as e:
+        state = { "error" : repr(e) }
+    finally:
+        os.chdir(cwd)
+        use_engine("fast")
+    return state
+
+# Returns the name of the first differing state field, or None
+def diff_case(case_dir, case, case_seed):
+    write_case(case_dir, case)
+    state_ref = run_case(case_dir, case, "reference", case_seed)
+    state_fast = run_case(case_dir, case, "fast", case_seed)
+    for key in ["error", "cycles", "unit_cycles", "proc_regs", "poly_mem"]:
+        if state_ref.get(key) != state_fast.get(key):
+            return key
+    return None
+
+# Remove instructions (one at a time, except loads) as long as the mismatch persists
+def minimize_case(case_dir, case, case_seed):
+    (n, q, cdt_file, inputs, instrs) = case
+    i = len(instrs) - 1
+    while i >= 0:
+        if not instrs[i].startswith("load"):
+            trial = (n, q, cdt_file, inputs, instrs[:i] + instrs[i+1:])
+            if diff_case(case_dir, trial, case_seed) is not None:
+                instrs = trial[4]
+        i = i - 1
+    return (n, q, cdt_file, inputs, instrs)
+
+# Compare encodings directly on a random polynomial, returns the first mismatching encoding or None
+def diff_encodings(rng, n, q):
+    poly = [rng.randrange(q) for i in range(n)]
+    for enc in sim.supported_encodings:
+        if enc.startswith("TRUNC_256") and n < 256:
+            continue
+        if engines["reference"]["encode_to_bytearray"](n, q, poly, enc, 0, "") != engines["fast"]["encode_to_bytearray"](n, q, poly, enc, 0, ""):
+            return enc
+    return None
+
+if __name__ == "__main__":
+    if "--help" in sys.argv:
+        print("Usage: python scripts/fuzz.py [ --time <seconds> ] [ --seed <fuzzer_seed> ]")
+        print("                              [ --max_instrs <num_instrs> ] [ --repro_dir <dir_path> ]")
+        exit()
+
+    time_budget = 60
+    fuzz_seed = int(time.time())
+    max_instrs = 12
+    repro_dir = "fuzz_repro"
+    if "--time" in sys.argv:
+        time_budget = float(sys.argv[sys.argv.index("--time") + 1])
+    if "--seed" in sys.argv:
+        fuzz_seed = int(sys.argv[sys.argv.index("--seed") + 1])
+    if "--max_instrs" in sys.argv:
+        max_instrs = int(sys.argv[sys.argv.index("--max_instrs") + 1])
+    if "--repro_dir" in sys.argv:
+        repro_dir = sys.argv[sys.argv.index("--repro_dir") + 1]
+
+    print("Fuzzer seed = %d, time budget = %0.1f s" % (fuzz_seed, time_budget))
+    rng = random.Random(fuzz_seed)
+    sim.use_cache = False
+    case_dir = tempfile.mkdtemp(prefix="sapphire_fuzz_")
+    t_start = time.perf_counter()
+    num_cases = 0
+    num_mismatches = 0
+    try:
+        while time.perf_counter() - t_start < time_budget:
+            case = gen_case(rng, max_instrs)
+            case_seed = rng.getrandbits(32)
+            num_cases = num_cases + 1
+            enc = diff_encodings(rng, case[0], case[1])
+            if enc is not None:
+                num_mismatches = num_mismatches + 1
+                print("MISMATCH: encoding %s for n = %d, q = %d" % (enc, case[0], case[1]))
+            key = diff_case(case_dir, case, case_seed)
+            if key is None:
+                continue
+            # Save the minimized case as a standalone program with its input files
+            num_mismatches = num_mismatches + 1
+            case = minimize_case(case_dir, case, case_seed)
+            write_case(case_dir, case)
+            repro_case_dir = os.path.join(repro_dir, "case_%d_%d" % (fuzz_seed, num_cases))
+            shutil.copytree(case_dir, repro_case_dir)
+            shutil.copy(os.path.join(CDT_DIR, case[2]), repro_case_dir)
+            print("MISMATCH: \"%s\" differs for n = %d, q = %d, CDT = %s, sim seed = %d" % (key, case[0], case[1], case[2], case_seed))
+            for instr in case[4]:
+                print("    %s" % instr)
+            print("    Reproducer saved to %s" % repro_case_dir)
+    finally:
+        shutil.rmtree(case_dir)
+
+    print("\n%d cases, %d mismatches (%0.1f s)" % (num_cases, num_mismatches, time.perf_counter() - t_start))
+    if num_mismatches > 0:
+        sys.exit(1)
@@ -0,0 +1,493 @@
+#! /usr/bin/python
+
+###################################################################################################
+#
+# Reference (Scalar) Execution Engine for Sapphire-Sim
+#
+# Original straightforward implementations of the transforms, samplers and encodings in core.py and
+# encoding.py, kept as the reference for differential fuzzing (see scripts/fuzz.py) of optimized
+# implementations. Modular exponentiations use pow(x, e, q) instead of (x**e) % q, which gives the
+# same result without computing the full power.
+#
+###################################################################################################
+
+import math, sys, os, random
+from sha3 import *
+from core import roots_of_unity, rej_fast_factors
+from encoding import supported_encodings
+
+####################################
+# core.py
+####################################
+
+def mult_psi(n, q, poly, line, instr):
+    if 2*n not in roots_of_unity[q]:
+        print("\n[Line %d] %s\nERROR: 2n-th root of unity modulo q does not exist for \"n = %d\" and \"q = %d\"\n" % (line, instr, n, q))
+        exit()        
+    psi = roots_of_unity[q][2*n]
+    factor = 1
+    for i in range(n):
+        poly[i] = (int(poly[i]) * factor) % q
+        factor = (factor * psi) % q
+    return 2 + 1 + (n+1)
+
+def mult_psi_inv(n, q, poly, line, instr):
+    if 2*n not in roots_of_unity[q]:
+        print("\n[Line %d] %s\nERROR: 2n-th root of unity modulo q does not exist for \"n = %d\" and \"q = %d\"\n" % (line, instr, n, q))
+        exit()        
+    psi = roots_of_unity[q][2*n]
+    psi_inv = pow(psi, q-2, q)
+    n_inv = pow(n, q-2, q)
+    factor = 1
+    for i in range(n):
+        poly[i] = (((int(poly[i]) * n_inv) % q) * factor) % q
+        factor = (factor * psi_inv) % q
+    return 2 + 1 + (n+1)
+
+def dif_ntt(n, q, poly, line, instr):
+    if 2*n not in roots_of_unity[q]:
+        print("\n[Line %d] %s\nERROR: 2n-th root of unity modulo q does not exist for \"n = %d\" and \"q = %d\"\n" % (line, instr, n, q))
+        exit()        
+    omega = roots_of_unity[q][n]
+    # bitrev_shuffle
+    j = 0
+    for i in range(1,n):
+        b = n >> 1
+        while j >= b:
+            j -= b
+            b >>= 1
+        j += b
+        if j > i:
+            poly[i], poly[j] = poly[j], poly[i]
+    # ntt
+    trans_size = 2
+    for trans_size in [2**i for i in range(1,int(math.log(n,2))+1)]:
+        wb = 1
+        wb_step = pow(omega, int(n/trans_size), q)
+        for t in range(trans_size >> 1):
+            for trans in range(int(n/trans_size)):
+                i = trans * trans_size + t
+                j = i + (trans_size >> 1)
+                a = poly[i]
+                b = (int(poly[j]) * wb) % q
+                poly[i] = (a + b) % q
+                poly[j] = (a - b) % q
+            wb = (wb * wb_step) % q
+    # bitrev_shuffle
+    j = 0
+    for i in range(1,n):
+        b = n >> 1
+        while j >= b:
+            j -= b
+            b >>= 1
+        j += b
+        if j > i:
+            poly[i], poly[j] = poly[j], poly[i]
+    return 2 + 1 + (1+int(n/2))*int(math.log(n,2))
+
+def dit_ntt(n, q, poly, line, instr):
+    if 2*n not in roots_of_unity[q]:
+        print("\n[Line %d] %s\nERROR: 2n-th root of unity modulo q does not exist for \"n = %d\" and \"q = %d\"\n" % (line, instr, n, q))
+        exit()        
+    omega = roots_of_unity[q][n]
+    # ntt
+    trans_size = 2
+    for trans_size in [2**i for i in range(1,int(math.log(n,2))+1)]:
+        wb = 1
+        wb_step = pow(omega, int(n/trans_size), q)
+        for t in range(trans_size >> 1):
+            for trans in range(int(n/trans_size)):
+                i = trans * trans_size + t
+                j = i + (trans_size >> 1)
+                a = poly[i]
+                b = (int(poly[j]) * wb) % q
+                poly[i] = (a + b) % q
+                poly[j] = (a - b) % q
+            wb = (wb * wb_step) % q
+    return 2 + 1 + (1+int(n/2))*int(math.log(n,2))
+
+def dif_intt(n, q, poly, line, instr):
+    if 2*n not in roots_of_unity[q]:
+        print("\n[Line %d] %s\nERROR: 2n-th root of unity modulo q does not exist for \"n = %d\" and \"q = %d\"\n" % (line, instr, n, q))
+        exit()        
+    omega = roots_of_unity[q][n]
+    omega_inv = pow(omega, q-2, q)
+    # bitrev_shuffle
+    j = 0
+    for i in range(1,n):
+        b = n >> 1
+        while j >= b:
+            j -= b
+            b >>= 1
+        j += b
+        if j > i:
+            poly[i], poly[j] = poly[j], poly[i]
+    # intt
+    trans_size = 2
+    for trans_size in [2**i for i in range(1,int(math.log(n,2))+1)]:
+        wb = 1
+        wb_step = pow(omega_inv, int(n/trans_size), q)
+        for t in range(trans_size >> 1):
+            for trans in range(int(n/trans_size)):
+                i = trans * trans_size + t
+                j = i + (trans_size >> 1)
+                a = poly[i]
+                b = (int(poly[j]) * wb) % q
+                poly[i] = (a + b) % q
+                poly[j] = (a - b) % q
+            wb = (wb * wb_step) % q
+    # bitrev_shuffle
+    j = 0
+    for i in range(1,n):
+        b = n >> 1
+        while j >= b:
+            j -= b
+            b >>= 1
+        j += b
+        if j > i:
+            poly[i], poly[j] = poly[j], poly[i]
+    return 2 + 1 + (1+int(n/2))*int(math.log(n,2))
+
+def dit_intt(n, q, poly, line, instr):
+    if 2*n not in roots_of_unity[q]:
+        print("\n[Line %d] %s\nERROR: 2n-th root of unity modulo q does not exist for \"n = %d\" and \"q = %d\"\n" % (line, instr, n, q))
+        exit()        
+    omega = roots_of_unity[q][n]
+    omega_inv = pow(omega, q-2, q)
+    # intt
+    trans_size = 2
+    for trans_size in [2**i for i in range(1,int(math.log(n,2))+1)]:
+        wb = 1
+        wb_step = pow(omega_inv, int(n/trans_size), q)
+        for t in range(trans_size >> 1):
+            for trans in range(int(n/trans_size)):
+                i = trans * trans_size + t
+                j = i + (trans_size >> 1)
+                a = poly[i]
+                b = (int(poly[j]) * wb) % q
+                poly[i] = (a + b) % q
+                poly[j] = (a - b) % q
+            wb = (wb * wb_step) % q
+    return 2 + 1 + (1+int(n/2))*int(math.log(n,2))
+
+def poly_shift(n, q, ring, poly):
+    coeff = poly[n-1]
+    for i in range(1,n):
+        poly[i] = poly[i-1]
+    if ring == "+":
+        poly[0] = q-coeff
+    if ring == "-":
+        poly[0] = coeff
+    return 2 + 1 + 1 + (3*n)
+
+def rejection_sample(n, q, mode, seed, poly):
+    # Minimum probability of successful rejection sampling of a coefficient in the range [0, q)
+    # for currently supported primes q is 88%, so it may be enough to generate n*32/0.88 = 37n bits
+    # However, we generate 100*n bits to be safe (note that this is for the simulator only, the
+    # actual hardware squeezes out bits from SHAKE only when needed)
+    if mode == 128:
+        buf = shake_128(seed, 100*n)
+    if mode == 256:
+        buf = shake_256(seed, 100*n)
+    bound = rej_fast_factors[q] * q
+    bits = math.ceil(math.log(bound,2))
+    count = 0
+    i = 0
+    while (i < n):
+        sample = int(buf[:8], 16) % 2**bits
+        if sample < bound:
+            poly[i] = sample % q
+            i = i + 1
+        buf = buf[8:]
+        count = count + 1
+    if mode == 128:
+        return 2 + 1 + (25+25+math.ceil(count*29/42)+count)
+    if mode == 256:
+        return 2 + 1 + (25+25+math.ceil(count*33/34)+count)
+
+def binomial_sample(n, q, k, mode, seed, poly):
+    if mode == 128:
+        if k <= 16:
+            buf = shake_128(seed, 32*n)
+        else:
+            buf = shake_128(seed, 64*n)
+    if mode == 256:
+        if k <= 16:
+            buf = shake_256(seed, 32*n)
+        else:
+            buf = shake_256(seed, 64*n)
+    for i in range(n):
+        if k <= 16:
+            a = int(buf[:4], 16) % 2**k
+            buf = buf[4:]
+            b = int(buf[:4], 16) % 2**k
+            buf = buf[4:]
+        else:
+            a = int(buf[:8], 16) % 2**k
+            buf = buf[8:]
+            b = int(buf[:8], 16) % 2**k
+            buf = buf[8:]
+        hw_a = sum( [a & (1<<j) > 0 for j in range(k)] )
+        hw_b = sum( [b & (1<<j) > 0 for j in range(k)] )
+        poly[i] = (hw_a - hw_b + q) % q
+    if mode == 128:
+        if k <= 16:
+            return 2 + 1 + (25+25+math.ceil(n*29/42)+n)
+        else:
+            return 2 + 1 + (25+25+math.ceil(n*29/21)+n)
+    if mode == 256:
+        if k <= 16:
+            return 2 + 1 + (25+25+math.ceil(n*33/34)+n)
+        else:
+            return 2 + 1 + (25+25+math.ceil(n*33/17)+n)
+
+def cdt_sample(n, q, r, mode, seed, cdt, poly):
+    if mode == 128:
+        buf = shake_128(seed, 32*n)
+    if mode == 256:
+        buf = shake_256(seed, 32*n)
+    for i in range(n):
+        val = int(buf[:8], 16) % 2**(r-1)
+        sign = (-1)**(int(int(buf[:8], 16) / 2**(r-1)))
+        buf = buf[8:]
+        sample = 0
+        for j in range(len(cdt)):
+            sample = sample + int(cdt[j] < val)
+        poly[i] = (sign*sample + q) % q
+    if mode == 128:
+        return 2 + 1 + (25+25+math.ceil(n*29/42)+((len(cdt)+3)*n))
+    if mode == 256:
+        return 2 + 1 + (25+25+math.ceil(n*33/34)+((len(cdt)+3)*n))
+
+def uniform_sample(n, q, eta, mode, seed, poly):
+    # Again, we generate 100*n bits to be safe (note that this is for the simulator only, the
+    # actual hardware squeezes out bits from SHAKE only when needed)
+    if mode == 128:
+        buf = shake_128(seed, 100*n)
+    if mode == 256:
+        buf = shake_256(seed, 100*n)
+    bound = 2*eta + 1
+    bits = math.ceil(math.log(bound,2))
+    count = 0
+    i = 0
+    while (i < n):
+        sample = int(buf[:8], 16) % 2**bits
+        if sample < bound:
+            poly[i] = (sample - eta + q) % q
+            i = i + 1
+        buf = buf[8:]
+        count = count + 1
+    if mode == 128:
+        return 2 + 1 + (25+25+math.ceil(count*29/42)+count)
+    if mode == 256:
+        return 2 + 1 + (25+25+math.ceil(count*33/34)+count)
+
+def trinary_sample_1(n, q, m, mode, seed, poly):
+    # Again, we generate 100*n bits to be safe (note that this is for the simulator only, the
+    # actual hardware squeezes out bits from SHAKE only when needed)
+    if mode == 128:
+        buf = shake_128(seed, 100*n)
+    if mode == 256:
+        buf = shake_256(seed, 100*n)
+    poly[:] = [0] * n
+    count = 0
+    i = 0
+    while (i < m):
+        sample = int(buf[:8], 16) % n
+        sign = (-1)**(int(int(buf[:8], 16) / 2**31))
+        if poly[sample] == 0:
+            poly[sample] = (sign + q) % q
+            i = i + 1
+        buf = buf[8:]
+        count = count + 1
+    if mode == 128:
+        return 2 + 1 + (25+25+math.ceil(count*29/42)+(2*count)+n)
+    if mode == 256:
+        return 2 + 1 + (25+25+math.ceil(count*33/34)+(2*count)+n)
+
+def trinary_sample_2(n, q, m0, m1, mode, seed, poly):
+    # Again, we generate 100*n bits to be safe (note that this is for the simulator only, the
+    # actual hardware squeezes out bits from SHAKE only when needed)
+    if mode == 128:
+        buf = shake_128(seed, 100*n)
+    if mode == 256:
+        buf = shake_256(seed, 100*n)
+    poly[:] = [0] * n
+    count = 0
+    i = 0
+    while (i < m0):
+        sample = int(buf[:8], 16) % n
+        if poly[sample] == 0:
+            poly[sample] = 1
+            i = i + 1
+        buf = buf[8:]
+        count = count + 1
+    i = 0
+    while (i < m1):
+        sample = int(buf[:8], 16) % n
+        if poly[sample] == 0:
+            poly[sample] = q-1
+            i = i + 1
+        buf = buf[8:]
+        count = count + 1
+    if mode == 128:
+        return 2 + 1 + (25+25+math.ceil(count*29/42)+(2*count)+n)
+    if mode == 256:
+        return 2 + 1 + (25+25+math.ceil(count*33/34)+(2*count)+n)
+
+def trinary_sample_3(n, q, rho, mode, seed, poly):
+    if mode == 128:
+        buf = shake_128(seed, 32*n)
+    if mode == 256:
+        buf = shake_256(seed, 32*n)
+    bits = int(math.log(rho,2))+1
+    for i in range(n):
+        sample = int(buf[:8], 16) % 2**bits
+        if sample == 0:
+            poly[i] = 1
+        elif sample == 1:
+            poly[i] = q-1
+        else:
+            poly[i] = 0
+        buf = buf[8:]
+    if mode == 128:
+            return 2 + 1 + (25+25+math.ceil(n*29/42)+n)
+    if mode == 256:
+            return 2 + 1 + (25+25+math.ceil(n*33/34)+n)
+
+####################################
+# encoding.py
+####################################
+
+def encode_to_bytearray(n, q, poly, encoding, line, instr):
+    if encoding == "BINARY_0RED":
+        tmp = [0]*(n)
+        for i in range(n):
+            tmp[i] = int(round((2/q)*poly[i])) % 2
+        b_arr = [0]*(int(n/8))
+        for i in range(int(n/8)):
+            for j in range(8):
+                b_arr[i] = b_arr[i] + (2**j)*tmp[8*i+j]
+        #print("b_arr = %s" % b_arr)
+        return b_arr
+    elif encoding == "BINARY_2RED":
+        tmp = [0]*(int(n/2))
+        for i in range(int(n/2)):
+            tmp[i] += abs(poly[i         ] - int(math.floor(q/2)))
+            tmp[i] += abs(poly[i+int(n/2)] - int(math.floor(q/2)))
+            tmp[i] = 1 - int(tmp[i] > (q/2))
+        b_arr = [0]*(int(n/16))
+        for i in range(int(n/16)):
+            for j in range(8):
+                b_arr[i] = b_arr[i] + (2**j)*tmp[8*i+j]
+        #print("b_arr = %s" % b_arr)
+        return b_arr
+    elif encoding == "BINARY_4RED":
+        tmp = [0]*(int(n/4))
+        for i in range(int(n/4)):
+            tmp[i] += abs(poly[i           ] - int(math.floor(q/2)))
+            tmp[i] += abs(poly[i+  int(n/4)] - int(math.floor(q/2)))
+            tmp[i] += abs(poly[i+2*int(n/4)] - int(math.floor(q/2)))
+            tmp[i] += abs(poly[i+3*int(n/4)] - int(math.floor(q/2)))
+            tmp[i] = 1 - int(tmp[i] > (q))
+        b_arr = [0]*(int(n/32))
+        for i in range(int(n/32)):
+            for j in range(8):
+                b_arr[i] = b_arr[i] + (2**j)*tmp[8*i+j]
+        #print("b_arr = %s" % b_arr)
+        return b_arr
+    elif encoding == "BINARY_8RED":
+        tmp = [0]*(int(n/8))
+        for i in range(int(n/8)):
+            tmp[i] += abs(poly[i           ] - int(math.floor(q/2)))
+            tmp[i] += abs(poly[i+  int(n/8)] - int(math.floor(q/2)))
+            tmp[i] += abs(poly[i+2*int(n/8)] - int(math.floor(q/2)))
+            tmp[i] += abs(poly[i+3*int(n/8)] - int(math.floor(q/2)))
+            tmp[i] += abs(poly[i+4*int(n/8)] - int(math.floor(q/2)))
+            tmp[i] += abs(poly[i+5*int(n/8)] - int(math.floor(q/2)))
+            tmp[i] += abs(poly[i+6*int(n/8)] - int(math.floor(q/2)))
+            tmp[i] += abs(poly[i+7*int(n/8)] - int(math.floor(q/2)))
+            tmp[i] = 1 - int(tmp[i] > (2*q))
+        b_arr = [0]*(int(n/64))
+        for i in range(int(n/64)):
+            for j in range(8):
+                b_arr[i] = b_arr[i] + (2**j)*tmp[8*i+j]
+        #print("b_arr = %s" % b_arr)
+        return b_arr
+    elif encoding == "TRUNC_256":
+        tmp = [0]*(256)
+        for i in range(256):
+            tmp[i] = int(round((2/q)*poly[i])) % 2
+        b_arr = [0]*(int(256/8))
+        for i in range(int(256/8)):
+            for j in range(8):
+                b_arr[i] = b_arr[i] + (2**j)*tmp[8*i+j]
+        #print("b_arr = %s" % b_arr)
+        return b_arr
+    elif encoding == "TRUNC_256_MSB":
+        lsbits = int(math.floor(math.log(q,2))) - 2
+        tmp = [0]*(256)
+        for i in range(256):
+            tmp[i] = poly[i] >> (lsbits+1)
+        b_arr = [0]*(int(256/8))
+        for i in range(int(256/8)):
+            for j in range(8):
+                b_arr[i] = b_arr[i] + (2**j)*tmp[8*i+j]
+        #print("b_arr = %s" % b_arr)
+        return b_arr
+    elif encoding == "RECON_SIMPLE":
+        tmp = [0]*(n)
+        for i in range(n):
+            if poly[i] < int(round(q/4)) or poly[i] > int(round(3*q/4)):
+                tmp[i] = 0
+            else:
+                tmp[i] = 1
+        b_arr = [0]*(int(n/8))
+        for i in range(int(n/8)):
+            for j in range(8):
+                b_arr[i] = b_arr[i] + (2**j)*tmp[8*i+j]
+        #print("b_arr = %s" % b_arr)
+        return b_arr
+    else:
+        print("\n[Line %d] %s\nERROR: Unsupported encoding \"%s\", allowed encodings are %s\n" % (line, instr, encoding, supported_encodings))
+        exit()
+
+# "rng" is the random number generator (module "random" or a "random.Random" instance)
+def random_poly_encode(n, q, poly, encoding, line, instr, rng=random):
+    if encoding == "BINARY_0RED":
+        for i in range(n):
+            poly[i] = int(round((q/2)*rng.getrandbits(1)))
+    elif encoding == "BINARY_2RED":
+        for i in range(int(n/2)):
+            poly[i         ] = int(round((q/2)*rng.getrandbits(1)))
+            poly[i+int(n/2)] = poly[i]
+    elif encoding == "BINARY_4RED":
+        for i in range(int(n/4)):
+            poly[i           ] = int(round((q/2)*rng.getrandbits(1)))
+            poly[i+  int(n/4)] = poly[i]
+            poly[i+2*int(n/4)] = poly[i]
+            poly[i+3*int(n/4)] = poly[i]
+    elif encoding == "BINARY_8RED":
+        for i in range(int(n/8)):
+            poly[i           ] = int(round((q/2)*rng.getrandbits(1)))
+            poly[i+  int(n/8)] = poly[i]
+            poly[i+2*int(n/8)] = poly[i]
+            poly[i+3*int(n/8)] = poly[i]
+            poly[i+4*int(n/8)] = poly[i]
+            poly[i+5*int(n/8)] = poly[i]
+            poly[i+6*int(n/8)] = poly[i]
+            poly[i+7*int(n/8)] = poly[i]
+    elif encoding == "TRUNC_256":
+        for i in range(256):
+            poly[i] = int(round((q/2)*rng.getrandbits(1)))
+        for i in range(256,n):
+            poly[i] = 0
+    elif encoding == "TRUNC_256_MSB":
+        lsbits = int(math.floor(math.log(q,2))) - 2
+        for i in range(256):
+            poly[i] = (rng.getrandbits(1) << (lsbits+1)) + (1 << lsbits)
+        for i in range(256,n):
+            poly[i] = 0
+    else:
+        print("\n[Line %d] %s\nERROR: Unsupported encoding \"%s\", allowed encodings are %s\n" % (line, instr, encoding, supported_encodings))
+        exit()
@@ -0,0 +1,277 @@
+#! /usr/bin/python
+
+###################################################################################################
+#
+# Golden-Output Regression Harness for Sapphire-Sim
+#
+# Inputs:  Bundled programs, reference vectors in data/ and golden digests (scripts/golden_digests.json)
+# Outputs: PASS / FAIL per program variant, non-zero exit status on any divergence
+#
+# Five checks are performed in a scratch copy of the tree:
+# (1) DECRYPT is run on the reference vectors in data/<scheme>/, the decrypted plaintext must be
+#     identical to data/<scheme>/pt_out.npy and must encode to the same bytes as pt_in.npy
+# (2) KEYGEN, ENCRYPT and DECRYPT are run in sequence with fixed seeds, the final polynomial memory,
+#     registers, saved vectors, instruction and cycle counts must match the golden digests, and the
+#     simulated cycle count of each variant must lie within the bounds of its static estimate (--estimate)
+# (3) Programs exercising simulator corner cases (see CORNER_PROGRAMS) must run to completion, with and
+#     without streamed power
+# (4) Roots of unity and rejection sampling factors computed for primes outside the tables in core.py must
+#     reproduce the tables (up to the known deviations of the rejection sampling factor rule)
+# (5) The example manifest at the top of batch.py must run to completion, with one row per iteration
+#
+###################################################################################################
+
+import sys, os, io, time, json, shutil, tempfile, hashlib, contextlib
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import sim, batch
+from encoding import encode_to_bytearray
+
+GOLDEN_FILE = os.path.join(ROOT_DIR, "scripts", "golden_digests.json")
+# The bundled CDT-based programs use r = 10
+CDT_FILE = "cdt_files/cdt_file_3p0_10_10"
+DEFINES = ["KEYGEN", "ENCRYPT", "DECRYPT"]
+SEED = 7
+
+# Corner-case programs for check (3)
+CORNER_PROGRAMS = {
+    # Leakage-only DVFS transition cycles at the lowest operating point draw less than 100 uA
+    "set_op_low_vdd" : [
+        "config ( n = 256 , q = 7681 )",
+        "random ( r0 )",
+        "set_op ( vdd = 0.68 , fmhz = 12 )",
+        "sha3_init",
+        "set_op ( vdd = 1.1 , fmhz = 72 )",
+        "end",
+    ],
+}
+
+def digest(obj):
+    return hashlib.sha256(repr(obj).encode()).hexdigest()
+
+# Vectors are compared by value, since the integer type of saved arrays is platform-dependent
+def load_vector(npy_file):
+    return [int(x) for x in np.load(npy_file, allow_pickle = True)]
+
+def vector_digests(data_dir):
+    digests = {}
+    for npy_file in sorted(os.listdir(data_dir)):
+        if npy_file.endswith(".npy"):
+            digests[npy_file] = digest(load_vector(os.path.join(data_dir, npy_file)))
+    return digests
+
+# Returns the data/<scheme> directory used by a program
+def program_data_dir(prog_path):
+    prog_f = open(prog_path)
+    prog_text = prog_f.read()
+    prog_f.close()
+    for line in prog_text.splitlines():
+        if ".npy" in line and "\"" in line:
+            return os.path.dirname(line.split("\"")[1])
+    return None
+
+def load_program(prog_path, define):
+    prog_f = open(prog_path)
+    sim.cdt_mem = sim.load_cdt(CDT_FILE) if "cdt_sample" in prog_f.read() else None
+    prog_f.close()
+    sim.load_program(prog_path, [define])
+
+# Run the loaded program once, returns its summary and (captured) output
+def run_program():
+    sim.seed_rng(SEED)
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        summary = sim.simulate(1.1, 72, 1, report=False)[0]
+    return (summary, out.getvalue())
+
+def encode_match(output):
+    if "--- NO MATCH ---" in output:
+        return False
+    if "--- MATCH ---" in output:
+        return True
+    return None
+
+# Check (1), returns a list of failures
+def check_reference(prog_path):
+    failures = []
+    data_dir = program_data_dir(prog_path)
+    ref_pt_out = load_vector(os.path.join(data_dir, "pt_out.npy"))
+    load_program(prog_path, "DECRYPT")
+    (summary, output) = run_program()
+    pt_out = load_vector(os.path.join(data_dir, "pt_out.npy"))
+    if pt_out != ref_pt_out:
+        failures.append("decrypted plaintext differs from reference pt_out.npy")
+    if encode_match(output) is not True:
+        failures.append("decrypted plaintext does not encode to reference pt_in.npy")
+    return failures
+
+# Check (2), returns the digests of each variant and the variants whose simulated cycles are outside of the
+# bounds of the static estimate
+def run_pipeline(prog_path):
+    results = {}
+    failures = []
+    data_dir = program_data_dir(prog_path)
+    for define in DEFINES:
+        vectors_before = vector_digests(data_dir)
+        load_program(prog_path, define)
+        (summary, output) = run_program()
+        vectors_after = vector_digests(data_dir)
+        (cycles_min, cycles_mean, cycles_std, cycles_max) = sim.estimate_program(1.1, 72)["cycles"]
+        if summary["cycles"] < cycles_min or summary["cycles"] > cycles_max:
+            failures.append("%s: simulated %d cycles, outside of estimated bounds %d - %d" % (define, summary["cycles"], cycles_min, cycles_max))
+        results[define] = {
+            "instructions"  : summary["instructions"],
+            "cycles"        : summary["cycles"],
+            "poly_mem"      : digest(sim.poly_mem),
+            "proc_regs"     : digest(sorted(sim.proc_regs.items())),
+            "saved"         : dict([(f, d) for (f, d) in vectors_after.items() if vectors_before.get(f) != d]),
+            "encode_match"  : encode_match(output),
+        }
+    return (results, failures)
+
+# Check (3), returns a list of failures
+def check_corner(name, instrs):
+    failures = []
+    prog_f = open(name, "w")
+    prog_f.write("\n".join(instrs) + "\n")
+    prog_f.close()
+    sim.cdt_mem = None
+    sim.load_program(name)
+    for stream_power in [False, True]:
+        sim.stream_power = stream_power
+        try:
+            run_program()
+        except Exception as e:
+            failures.append("%s: %s%s" % (name, "(stream_power) " if stream_power else "", repr(e)))
+        finally:
+            sim.stream_power = False
+    return failures
+
+# Factors of the rule in core.rej_fast_factor which differ from the tabulated hardware factors
+REJ_FACTOR_DEVIATIONS = { 3329 : 9, 184321 : 5 }
+
+# Check (4), returns a list of failures
+def check_ntt_params():
+    failures = []
+    for q in sorted(sim.rej_fast_factors):
+        if sim.ntt_roots(q) != sim.roots_of_unity[q]:
+            failures.append("q = %d: computed roots of unity %s differ from table" % (q, sim.ntt_roots(q)))
+        expected = REJ_FACTOR_DEVIATIONS.get(q, sim.rej_fast_factors[q])
+        if sim.rej_fast_factor(q) != expected:
+            failures.append("q = %d: computed rejection sampling factor is %d, expected %d" % (q, sim.rej_fast_factor(q), expected))
+    return failures
+
+# Example manifest from the comment at the top of batch.py
+def read_example_manifest():
+    batch_f = open(os.path.join(ROOT_DIR, "batch.py"))
+    lines = batch_f.read().splitlines()
+    batch_f.close()
+    start = [i for (i, line) in enumerate(lines) if line.startswith("# Example manifest")][0] + 1
+    end = lines.index("# }", start) + 1
+    return "\n".join([line[2:] for line in lines[start:end]])
+
+# Check (5), returns a list of failures
+def check_batch_example():
+    failures = []
+    manifest_f = open("batch_example.json", "w")
+    manifest_f.write(read_example_manifest())
+    manifest_f.close()
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out):
+            manifest = batch.read_manifest("batch_example.json")
+            rows = batch.run_batch(manifest)
+            for out_file in ["batch_example.csv", "batch_example_rows.json"]:
+                batch.write_rows(rows, out_file)
+        num_rows = len(manifest["programs"])*len(manifest["op_points"])*len(manifest["defines"])*manifest["iterations"]
+        if len(rows) != num_rows:
+            failures.append("%d rows written, expected %d" % (len(rows), num_rows))
+    except SystemExit:
+        failures.append("stopped with: %s" % out.getvalue().strip().splitlines()[-1])
+    except Exception as e:
+        failures.append(repr(e))
+    return failures
+
+def compare(name, result, golden):
+    failures = []
+    for key in result:
+        if key not in golden:
+            failures.append("%s: \"%s\" missing from golden digests" % (name, key))
+        elif result[key] != golden[key]:
+            failures.append("%s: \"%s\" is %s, expected %s" % (name, key, result[key], golden[key]))
+    return failures
+
+if __name__ == "__main__":
+    if "--help" in sys.argv:
+        print("Usage: python scripts/regress.py [ --update ]")
+        exit()
+    update = "--update" in sys.argv
+
+    if not update:
+        if not os.path.exists(GOLDEN_FILE):
+            print("\nERROR: Golden digests file %s does not exist (use --update to create it)" % GOLDEN_FILE)
+            exit()
+        golden_f = open(GOLDEN_FILE)
+        golden = json.load(golden_f)
+        golden_f.close()
+
+    # Programs save vectors to data/, so everything is run in a scratch copy of the tree
+    t_start = time.perf_counter()
+    work_dir = tempfile.mkdtemp(prefix="sapphire_regress_")
+    for sub_dir in ["programs", "data", "cdt_files", "calibration"]:
+        shutil.copytree(os.path.join(ROOT_DIR, sub_dir), os.path.join(work_dir, sub_dir))
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    results = {}
+    num_failures = 0
+    try:
+        for prog_file in sorted(os.listdir("programs")):
+            prog_path = os.path.join("programs", prog_file)
+            failures = check_reference(prog_path)
+            (pipeline_results, estimate_failures) = run_pipeline(prog_path)
+            failures = failures + estimate_failures
+            for (define, result) in pipeline_results.items():
+                name = "%s/%s" % (prog_file, define)
+                results[name] = result
+                if not update:
+                    if name not in golden:
+                        failures.append("%s: missing from golden digests" % name)
+                    else:
+                        failures = failures + compare(name, result, golden[name])
+            print("%-40s %s" % (prog_file, "FAIL" if len(failures) > 0 else "PASS"))
+            for failure in failures:
+                print("    %s" % failure)
+            num_failures = num_failures + len(failures)
+        failures = check_ntt_params()
+        print("%-40s %s" % ("ntt_params", "FAIL" if len(failures) > 0 else "PASS"))
+        for failure in failures:
+            print("    %s" % failure)
+        num_failures = num_failures + len(failures)
+        for (name, instrs) in sorted(CORNER_PROGRAMS.items()):
+            failures = check_corner(name, instrs)
+            print("%-40s %s" % (name, "FAIL" if len(failures) > 0 else "PASS"))
+            for failure in failures:
+                print("    %s" % failure)
+            num_failures = num_failures + len(failures)
+        # Run last, since the manifest sets the calibration and other simulator options
+        failures = check_batch_example()
+        print("%-40s %s" % ("batch_example", "FAIL" if len(failures) > 0 else "PASS"))
+        for failure in failures:
+            print("    %s" % failure)
+        num_failures = num_failures + len(failures)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir)
+
+    if update:
+        golden_f = open(GOLDEN_FILE, "w")
+        json.dump(results, golden_f, indent=2, sort_keys=True)
+        golden_f.close()
+        print("\nGolden digests written to %s" % GOLDEN_FILE)
+
+    print("\n%d failures (%0.1f s)" % (num_failures, time.perf_counter() - t_start))
+    if num_failures > 0:
+        sys.exit(1)
@@ -12,6 +12,11 @@
 # SHA-3 functions based on Kecak
 
 import keccak
+from functools import lru_cache
+
+# Digests are memoized so that repeated seeds (e.g. public matrix generation across
+# iterations and programs simulated in the same process) are hashed only once
+HASH_CACHE_SIZE = 256
 
 def sha3_pad(m, r, pad):
     # "m" is byte-hex, but "pad" is binary
@@ -35,36 +40,42 @@ def sha3_pad(m, r, pad):
     #print("m_pad = %s" % m)
     return m
 
+@lru_cache(maxsize=HASH_CACHE_SIZE)
 def sha3_224(msg):
     sha3_keccak = keccak.Keccak(1600)
     msg = sha3_pad(msg, 1152, "01")
     digest = sha3_keccak.Keccak((4*len(msg), msg), 1152, 448, 224, False)
     return digest
 
+@lru_cache(maxsize=HASH_CACHE_SIZE)
 def sha3_256(msg):
     sha3_keccak = keccak.Keccak(1600)
     msg = sha3_pad(msg, 1088, "01")
     digest = sha3_keccak.Keccak((4*len(msg), msg), 1088, 512, 256, False)
     return digest
 
+@lru_cache(maxsize=HASH_CACHE_SIZE)
 def sha3_384(msg):
     sha3_keccak = keccak.Keccak(1600)
     msg = sha3_pad(msg, 832, "01")
     digest = sha3_keccak.Keccak((4*len(msg), msg), 832, 768, 384, False)
     return digest
 
+@lru_cache(maxsize=HASH_CACHE_SIZE)
 def sha3_512(msg):
     sha3_keccak = keccak.Keccak(1600)
     msg = sha3_pad(msg, 576, "01")
     digest = sha3_keccak.Keccak((4*len(msg), msg), 576, 1024, 512, False)
     return digest
 
+@lru_cache(maxsize=HASH_CACHE_SIZE)
 def shake_128(msg, d):
     sha3_keccak = keccak.Keccak(1600)
     msg = sha3_pad(msg, 1344, "1111")
     digest = sha3_keccak.Keccak((4*len(msg), msg), 1344, 256, d, False)
     return digest
 
+@lru_cache(maxsize=HASH_CACHE_SIZE)
 def shake_256(msg, d):
     sha3_keccak = keccak.Keccak(1600)
     msg = sha3_pad(msg, 1088, "1111")
@@ -15,7 +15,7 @@
 import matplotlib.pyplot as plt
 import matplotlib as mpl
 import numpy as np
-import math, sys, os, re, random
+import math, sys, os, re, random, io, hashlib, pickle, time, json, csv, multiprocessing
 from sha3 import *
 from core import *
 from encoding import *
@@ -24,163 +24,659 @@ from encoding import *
 READ_CYCLES = 2  # read data from the crypto core
 WRITE_CYCLES = 2 # write data to the crypto core
 
-# Supported Parameters
-valid_n = [64, 128, 256, 512, 1024, 2048]
+# Instructions transferring data over the host read-write interface
+INTERFACE_OPCODES = ["random_r", "random_poly", "load_r", "save_r", "load_poly", "save_poly"]
+
+# Host Interface Models (see "--interface"), transfers are counted in 32-bit words
+# "word"  : every word is read / written separately ("read" / "write" cycles per word)
+# "burst" : words are transferred in bursts of up to "length" words, each with "setup" cycles of latency
+# "dma"   : the core spends "setup" cycles to program the transfer, which then proceeds in the background at
+#           "bandwidth" words per cycle while the core executes instructions that do not depend on it
+INTERFACE_MODELS = {
+"word"              : { "read" : READ_CYCLES, "write" : WRITE_CYCLES },
+"burst"             : { "setup" : 8, "length" : 16, "read" : 1, "write" : 1 },
+"dma"               : { "setup" : 8, "bandwidth" : 1.0 },
+}
+
+# Polynomial Memory (see "--mem_size" and "--mem_banks"), in coefficients, split into equal banks
+# Two-operand instructions read from one bank and write to another (a copy within a bank takes 3 cycles per coefficient)
+POLY_MEM_SIZE = 8192
+POLY_MEM_BANKS = 2
+# Share of the dynamic current of units accessing the polynomial memory, and share of the leakage current, drawn by
+# the memory of the test chip (estimated), the former scales with the square root of the bank size (bit-line length)
+# and the latter with the memory size
+MEM_DYNAMIC_SHARE = 0.4
+MEM_LEAKAGE_SHARE = 0.6
+MEM_UNITS = ("poly_", "sample_", "reg_poly")
+
+# Default DVFS Transition (see "set_op"), the core is stalled while the supply voltage and clock settle
+DVFS_LATENCY_US = 1.0
+DVFS_ENERGY_PJ = 50.0
+
+# Supported Parameters (other primes q < 2**24 with q = 1 mod 2n are also supported, see "supported_modulus")
+valid_n = [64, 128, 256, 512, 1024, 2048, 4096]
 valid_q = [3329, 7681, 12289, 40961, 65537, 120833, 133121, 184321, 4205569, 4206593, 8058881, 8380417, 8404993]
 
-# Power Consumption Table (Current in uA at 1.1 V and 72 MHz)
-idd_dict = {
-"ctrl"              : 1815,
-"reg_alu"           : 3271,
-"reg_poly"          : 2795,
-"sha3"              : 6115,
-"poly_read_write"   : 6145,
-"poly_init"         : 6120,
-"poly_bitrev"       : 6212,
-"poly_copy"         : 6183,
-"poly_eq_check"     : 5523,
-"poly_norm_check"   : 3019,
-"poly_shift"        : 6201,
-"poly_hash"         : 7503,
-"poly_sum_elems"    : 3630,
-"poly_max_elems"    : 3184,
-"poly_mult_psi"     : { 3329: 7546, 7681: 7335, 12289: 8067, 40961:  9032, 65537: 7455, 120833:  8890, 133121: 8055, 184321:  8740, 4205569: 10418, 4206593:  9352, 8058881: 11726, 8380417:  8441, 8404993:  9156 },
-"poly_ntt"          : { 3329: 8591, 7681: 8483, 12289: 9589, 40961: 10783, 65537: 8619, 120833: 10764, 133121: 9958, 184321: 10585, 4205569: 13455, 4206593: 12657, 8058881: 14365, 8380417: 10366, 8404993: 10922 },
-"poly_poly_addsub"  : { 3329: 5022, 7681: 5290, 12289: 5523, 40961:  5717, 65537: 5464, 120833:  5950, 133121: 5688, 184321:  6125, 4205569:  6422, 4206593:  6498, 8058881:  6862, 8380417:  5921, 8404993:  6071 },
-"poly_poly_mul"     : { 3329: 7557, 7681: 7347, 12289: 8075, 40961:  9046, 65537: 7464, 120833:  8900, 133121: 8066, 184321:  8753, 4205569: 10433, 4206593:  9367, 8058881: 11734, 8380417:  8454, 8404993:  9173 },
-"poly_const_addsub" : { 3329: 3558, 7681: 3581, 12289: 3640, 40961:  3640, 65537: 3630, 120833:  3630, 133121: 3611, 184321:  3644, 4205569:  3653, 4206593:  3655, 8058881:  3620, 8380417:  3611, 8404993:  3628 },
-"poly_const_mul"    : { 3329: 5946, 7681: 5736, 12289: 6134, 40961:  6940, 65537: 5794, 120833:  7144, 133121: 6396, 184321:  7142, 4205569:  8822, 4206593:  7756, 8058881:  9939, 8380417:  7046, 8404993:  7562 },
-"poly_const_and"    : 3504,
-"poly_const_or"     : 3552,
-"poly_const_xor"    : 3514,
-"poly_const_shift"  : 3484,
-"sample_rej"        : 6755,
-"sample_bin"        : 7545,
-"sample_cdt"        : 2764,
-"sample_uni"        : 7573,
-"sample_tri_1"      : 3645,
-"sample_tri_2"      : 3627,
-"sample_tri_3"      : 6791,
+# Power Model Calibration (see "--calibration"), current tables in uA at the reference operating point (1.1 V and
+# 72 MHz for the test chip) and fitted leakage / dynamic current models, loaded into "idd_dict" and "calibration"
+CALIBRATION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calibration", "sapphire.json")
+CALIBRATION_VERSION = 1
+# Units drawing leakage current only, e.g. while the core is stalled on a background transfer or a DVFS transition
+LEAKAGE_ONLY_UNITS = ["interface_wait", "dvfs"]
+
+# Instruction patterns in decode order (the first matching pattern is used)
+# Patterns are matched case-insensitively against the instruction with all spaces removed
+instr_patterns = [
+    ("config",              r'config\(n=(\d+),q=(\d+)\)'),
+    ("set_op",              r'set_op\(vdd=(\d*\.?\d+),fmhz=(\d+)\)'),
+    ("c_set",               r'c(\d)=(\d+)'),
+    ("c_addsub",            r'c(\d)=c(\d)([\+\-])(\d+)'),
+    ("reg_set",             r'reg=(\d+)'),
+    ("tmp_set",             r'tmp=(\d+)'),
+    ("reg_tmp",             r'reg=tmp'),
+    ("tmp_alu",             r'tmp=tmp([\+\-\*&\|\^><][><]*)reg'),
+    ("reg_read_poly",       r'reg=\(poly=(\d+)\)\[(\d+)\]'),
+    ("reg_read_poly_c",     r'reg=\(poly=(\d+)\)\[c(\d)\]'),
+    ("reg_write_poly",      r'\(poly=(\d+)\)\[(\d+)\]=reg'),
+    ("reg_write_poly_c",    r'\(poly=(\d+)\)\[c(\d)\]=reg'),
+    ("poly_max",            r'reg=max\(poly=(\d+)\)'),
+    ("poly_sum",            r'reg=sum\(poly=(\d+)\)'),
+    ("transform",           r'transform\(mode=(DI[FT]_I{0,1}NTT),poly_dst=(\d+),poly_src=(\d+)\)'),
+    ("mult_psi",            r'mult_psi\(poly=(\d+)\)'),
+    ("mult_psi_inv",        r'mult_psi_inv\(poly=(\d+)\)'),
+    ("rej_sample_pseudo",   r'rej_sample\(prng=SHAKE-(\d+),seed=r(\d),c0=(\d+),c1=(\d+),poly=(\d+)\)'),
+    ("bin_sample_pseudo",   r'bin_sample\(prng=SHAKE-(\d+),seed=r(\d),c0=(\d+),c1=(\d+),k=(\d+),poly=(\d+)\)'),
+    ("cdt_sample_pseudo",   r'cdt_sample\(prng=SHAKE-(\d+),seed=r(\d),c0=(\d+),c1=(\d+),r=(\d+),poly=(\d+)\)'),
+    ("uni_sample_pseudo",   r'uni_sample\(prng=SHAKE-(\d+),seed=r(\d),c0=(\d+),c1=(\d+),eta=(\d+),poly=(\d+)\)'),
+    ("tri_sample_1_pseudo", r'tri_sample_1\(prng=SHAKE-(\d+),seed=r(\d),c0=(\d+),c1=(\d+),m=(\d+),poly=(\d+)\)'),
+    ("tri_sample_2_pseudo", r'tri_sample_2\(prng=SHAKE-(\d+),seed=r(\d),c0=(\d+),c1=(\d+),m0=(\d+),m1=(\d+),poly=(\d+)\)'),
+    ("tri_sample_3_pseudo", r'tri_sample_3\(prng=SHAKE-(\d+),seed=r(\d),c0=(\d+),c1=(\d+),rho=1/(\d+),poly=(\d+)\)'),
+    ("rej_sample",          r'rej_sample\(prng=SHAKE-(\d+),seed=r(\d),poly=(\d+)\)'),
+    ("bin_sample",          r'bin_sample\(prng=SHAKE-(\d+),seed=r(\d),k=(\d+),poly=(\d+)\)'),
+    ("cdt_sample",          r'cdt_sample\(prng=SHAKE-(\d+),seed=r(\d),r=(\d+),poly=(\d+)\)'),
+    ("uni_sample",          r'uni_sample\(prng=SHAKE-(\d+),seed=r(\d),eta=(\d+),poly=(\d+)\)'),
+    ("tri_sample_1",        r'tri_sample_1\(prng=SHAKE-(\d+),seed=r(\d),m=(\d+),poly=(\d+)\)'),
+    ("tri_sample_2",        r'tri_sample_2\(prng=SHAKE-(\d+),seed=r(\d),m0=(\d+),m1=(\d+),poly=(\d+)\)'),
+    ("tri_sample_3",        r'tri_sample_3\(prng=SHAKE-(\d+),seed=r(\d),rho=1/(\d+),poly=(\d+)\)'),
+    ("init",                r'init\(poly=(\d+)\)'),
+    ("poly_copy",           r'poly_copy\(poly_dst=(\d+),poly_src=(\d+)\)'),
+    ("poly_op",             r'poly_op\(op=([\w_]+),poly_dst=(\d+),poly_src=(\d+)\)'),
+    ("shift_poly",          r'shift_poly\(ring=x\^N([\+\-])1,poly_dst=(\d+),poly_src=(\d+)\)'),
+    ("eq_check",            r'flag=eq_check\(poly0=(\d+),poly1=(\d+)\)'),
+    ("inf_norm_check",      r'flag=inf_norm_check\(poly=(\d+),bound=(\d+)\)'),
+    ("compare_c",           r'flag=compare\(c(\d),(\d+)\)'),
+    ("compare_reg",         r'flag=compare\(reg,(\d+)\)'),
+    ("compare_tmp",         r'flag=compare\(tmp,(\d+)\)'),
+    ("branch",              r'if\(flag([!=]=)([\-\+]{0,1})([01])\)goto([\w\d_]+)'),
+    ("sha3_init",           r'sha3_init'),
+    ("sha3_absorb_poly",    r'sha3_(\d+)_absorb\(poly=(\d+)\)'),
+    ("sha3_absorb_r",       r'sha3_(\d+)_absorb\(r(\d)\)'),
+    ("sha3_256_digest",     r'r(\d)=sha3_256_digest'),
+    ("sha3_512_digest",     r'r0\|\|r1=sha3_512_digest'),
+    ("end",                 r'end'),
+    ("nop",                 r'nop'),
+    ("encode_compare",      r'encode_compare\("(.*)","(.*)",encoding=([\w_]+)\)'),
+    ("encode_print",        r'encode_print\(poly=(\d+),encoding=([\w_]+)\)'),
+    ("random_r",            r'random\(r(\d)\)'),
+    ("random_poly",         r'random\(poly=(\d+),encoding=([\w\d_]+),"(.*)"\)'),
+    ("load_r",              r'load\(r(\d),"(.*)"\)'),
+    ("save_r",              r'save\(r(\d),"(.*)"\)'),
+    ("load_poly",           r'load\(poly=(\d+),"(.*)"\)'),
+    ("save_poly",           r'save\(poly=(\d+),"(.*)"\)'),
+    ("print_r",             r'print\(r(\d)\)'),
+    ("print_reg",           r'print\(reg\)'),
+    ("print_tmp",           r'print\(tmp\)'),
+    ("print_flag",          r'print\(flag\)'),
+    ("print_c",             r'print\(c(\d)\)'),
+    ("print_poly",          r'print\(poly=(\d+)\)'),
+]
+instr_regex = [(opcode, re.compile(pattern, re.M|re.I)) for (opcode, pattern) in instr_patterns]
+
+# Statically known operands of each instruction, checked once by "verify_program" after the program is loaded, as
+# (kind, argument index, name), where "poly" operands must be polynomials of the configured memory, "bank_pair"
+# operands polynomials in different memory banks, "index" operands coefficient indices, "c" and "r" operands
+# existing registers and "imm16" / "imm24" operands values fitting in the named 16-bit / 24-bit register
+SAMPLE_PSEUDO_OPERANDS = [("prng", 0, None), ("r", 1, None), ("imm16", 2, "c0"), ("imm16", 3, "c1"), ("poly", -1, "poly")]
+SAMPLE_OPERANDS = [("prng", 0, None), ("r", 1, None), ("poly", -1, "poly")]
+instr_operands = {
+    "c_set"               : [("c", 0, None), ("imm16", 1, "c{0}")],
+    "c_addsub"            : [("c", 0, None), ("c", 1, None), ("imm16", 3, "c{0}")],
+    "reg_set"             : [("imm24", 0, "reg")],
+    "tmp_set"             : [("imm24", 0, "tmp")],
+    "reg_read_poly"       : [("poly", 0, "poly"), ("index", 1, None)],
+    "reg_read_poly_c"     : [("poly", 0, "poly"), ("c", 1, None)],
+    "reg_write_poly"      : [("poly", 0, "poly"), ("index", 1, None)],
+    "reg_write_poly_c"    : [("poly", 0, "poly"), ("c", 1, None)],
+    "poly_max"            : [("poly", 0, "poly")],
+    "poly_sum"            : [("poly", 0, "poly")],
+    "transform"           : [("poly", 1, "poly_dst"), ("poly", 2, "poly_src"), ("bank_pair", (1, 2), ("poly_dst", "poly_src"))],
+    "mult_psi"            : [("poly", 0, "poly")],
+    "mult_psi_inv"        : [("poly", 0, "poly")],
+    "rej_sample_pseudo"   : SAMPLE_PSEUDO_OPERANDS,
+    "bin_sample_pseudo"   : SAMPLE_PSEUDO_OPERANDS + [("range32", 4, "k")],
+    "cdt_sample_pseudo"   : SAMPLE_PSEUDO_OPERANDS + [("range32", 4, "r")],
+    "uni_sample_pseudo"   : SAMPLE_PSEUDO_OPERANDS + [("below_q", 4, "eta")],
+    "tri_sample_1_pseudo" : SAMPLE_PSEUDO_OPERANDS + [("below_n", 4, "m")],
+    "tri_sample_2_pseudo" : SAMPLE_PSEUDO_OPERANDS + [("below_n", 4, "m0"), ("below_n", 5, "m1"), ("below_n", (4, 5), "m0 + m1")],
+    "tri_sample_3_pseudo" : SAMPLE_PSEUDO_OPERANDS + [("rho", 4, None)],
+    "rej_sample"          : SAMPLE_OPERANDS,
+    "bin_sample"          : SAMPLE_OPERANDS + [("range32", 2, "k")],
+    "cdt_sample"          : SAMPLE_OPERANDS + [("range32", 2, "r")],
+    "uni_sample"          : SAMPLE_OPERANDS + [("below_q", 2, "eta")],
+    "tri_sample_1"        : SAMPLE_OPERANDS + [("below_n", 2, "m")],
+    "tri_sample_2"        : SAMPLE_OPERANDS + [("below_n", 2, "m0"), ("below_n", 3, "m1"), ("below_n", (2, 3), "m0 + m1")],
+    "tri_sample_3"        : SAMPLE_OPERANDS + [("rho", 2, None)],
+    "init"                : [("poly", 0, "poly")],
+    "poly_copy"           : [("poly", 0, "poly_dst"), ("poly", 1, "poly_src")],
+    "poly_op"             : [("poly", 1, "poly_dst"), ("poly", 2, "poly_src"), ("bank_pair", (1, 2), ("poly_dst", "poly_src"))],
+    "shift_poly"          : [("poly", 1, "poly_dst"), ("poly", 2, "poly_src"), ("bank_pair", (1, 2), ("poly_dst", "poly_src"))],
+    "eq_check"            : [("poly", 0, "poly0"), ("poly", 1, "poly1"), ("bank_pair", (0, 1), ("poly0", "poly1"))],
+    "inf_norm_check"      : [("poly", 0, "poly")],
+    "compare_c"           : [("c", 0, None), ("imm16", 1, "c{0}")],
+    "compare_reg"         : [("imm24", 0, "reg")],
+    "compare_tmp"         : [("imm24", 0, "tmp")],
+    "sha3_absorb_poly"    : [("sha3", 0, None), ("poly", 1, "poly")],
+    "sha3_absorb_r"       : [("sha3", 0, None), ("r", 1, None)],
+    "sha3_256_digest"     : [("r", 0, None)],
+    "encode_print"        : [("poly", 0, "poly")],
+    "random_r"            : [("r", 0, None)],
+    "random_poly"         : [("poly", 0, "poly")],
+    "load_r"              : [("r", 0, None)],
+    "save_r"              : [("r", 0, None)],
+    "load_poly"           : [("poly", 0, "poly")],
+    "save_poly"           : [("poly", 0, "poly")],
+    "print_r"             : [("r", 0, None)],
+    "print_c"             : [("c", 0, None)],
+    "print_poly"          : [("poly", 0, "poly")],
 }
+tmp_alu_ops = ["+", "-", "*", "&", "|", "^", ">>", "<<"]
+supported_poly_ops = ["ADD", "SUB", "MUL", "BITREV", "CONST_ADD", "CONST_SUB", "CONST_MUL", "CONST_AND", "CONST_OR", "CONST_XOR", "CONST_RSHIFT", "CONST_LSHIFT"]
 
-# Instruction decode and execute
-def instr_exec(instr, iter_count):
+# Instruction decode, returns the opcode and operand strings ("None" for unsupported instructions)
+def decode_instr(instr):
+    instr_t = instr.replace(" ", "")
+    for (opcode, regex) in instr_regex:
+        matchObj = regex.match(instr_t)
+        if matchObj:
+            return (opcode, matchObj.groups())
+    return (None, ())
+
+# Read a calibration file, in JSON format (see calibration/sapphire.json) or in CSV format with "unit,q,idd_ua" rows
+# (leave "q" empty for units whose current does not depend on the modulus), whose current tables replace those of
+# the default calibration (units that are not listed keep their default tables), along with its current models
+# Parsed files are cached (per path and modification time), so that batch runs only read them once
+def read_calibration(cal_file):
+    if not os.path.exists(cal_file):
+        print("\nERROR: Calibration file %s does not exist" % cal_file)
+        exit()
+    key = (os.path.abspath(cal_file), os.path.getmtime(cal_file))
+    if key in calibration_cache:
+        return calibration_cache[key]
+    cal_f = open(cal_file, newline="")
+    if cal_file.endswith(".csv"):
+        cal = dict(read_calibration(CALIBRATION_FILE))
+        cal["units"] = dict(cal["units"])
+        cal["name"] = os.path.basename(cal_file)
+        replaced = set()
+        for row in csv.DictReader(cal_f):
+            if row["q"] == "":
+                cal["units"][row["unit"]] = float(row["idd_ua"])
+            else:
+                if row["unit"] not in replaced:
+                    cal["units"][row["unit"]] = {}
+                cal["units"][row["unit"]][int(row["q"])] = float(row["idd_ua"])
+            replaced.add(row["unit"])
+    else:
+        cal = json.load(cal_f)
+        if cal.get("format") != "sapphire-calibration" or cal.get("version") != CALIBRATION_VERSION:
+            print("\nERROR: Calibration file %s is not a version %d Sapphire calibration file" % (cal_file, CALIBRATION_VERSION))
+            exit()
+        cal.setdefault("name", os.path.basename(cal_file))
+        # Moduli are strings in JSON
+        for (unit, idd) in cal["units"].items():
+            if isinstance(idd, dict):
+                cal["units"][unit] = dict([(int(q), q_idd) for (q, q_idd) in idd.items()])
+    cal_f.close()
+    for (unit, idd) in cal["units"].items():
+        if isinstance(idd, dict) and len(idd) == 0:
+            print("\nERROR: Calibration file %s lists no moduli for unit \"%s\"" % (cal_file, unit))
+            exit()
+    calibration_cache[key] = cal
+    return cal
+
+# Load a calibration file, units missing from it are reported when they are charged
+def load_calibration(cal_file):
+    global calibration
+    global idd_dict
+    global i_leak_ref
+
+    calibration = read_calibration(cal_file)
+    idd_dict = dict(calibration["units"])
+    i_leak_ref = calibration["reference"]["leakage_ua"]
+    for unit in LEAKAGE_ONLY_UNITS:
+        idd_dict[unit] = i_leak_ref
+    idd_interpolated.clear()
+
+# Set the operating temperature (in Celsius, None for the reference temperature), which only scales leakage if
+# the loaded calibration characterizes temperature
+def set_temperature(temp):
+    global temp_c
+
+    temp_c = temp
+    if temp_c is not None and calibration["leakage"]["temp_coefficient"] == 0:
+        print("\nWARNING: Calibration \"%s\" does not characterize temperature (its leakage temp_coefficient is 0), the temperature of %0.1f C has no effect\n" % (calibration["name"], temp_c))
+
+# Current of a unit for a modulus missing from its table, interpolated linearly in log2(q) between the nearest
+# listed moduli (and equal to the current of the nearest listed modulus outside of their range)
+def interpolate_idd(unit, q):
+    if (unit, q) not in idd_interpolated:
+        table = sorted(idd_dict[unit].items())
+        below = [(q_i, idd) for (q_i, idd) in table if q_i < q]
+        above = [(q_i, idd) for (q_i, idd) in table if q_i > q]
+        if len(below) == 0 or len(above) == 0:
+            idd_interpolated[(unit, q)] = (above + below)[0 if len(below) == 0 else -1][1]
+        else:
+            ((q0, idd0), (q1, idd1)) = (below[-1], above[0])
+            idd_interpolated[(unit, q)] = idd0 + (idd1 - idd0)*(math.log2(q) - math.log2(q0))/(math.log2(q1) - math.log2(q0))
+    return idd_interpolated[(unit, q)]
+
+# Scaling of dynamic current with operating frequency and supply voltage, relative to the reference operating point
+def freq_scale(fmhz):
+    return (fmhz/calibration["reference"]["fmhz"])**calibration["dynamic"]["fmhz_exponent"]
+
+def volt_scale(vdd):
+    return (vdd/calibration["reference"]["vdd"])**calibration["dynamic"]["vdd_exponent"]
+
+# Set the size (in coefficients) and number of banks of the polynomial memory, and scale its current accordingly
+def set_memory(size, banks):
+    global mem_size
+    global mem_banks
+    global mem_idd_scale
+    global mem_leak_scale
+
+    if size <= 0 or size & (size - 1) != 0:
+        print("\nERROR: Polynomial memory size %d must be a power of 2" % size)
+        exit()
+    if banks < 2 or banks & (banks - 1) != 0:
+        print("\nERROR: Number of polynomial memory banks %d must be a power of 2 (at least 2)" % banks)
+        exit()
+    if size/banks < min(valid_n):
+        print("\nERROR: Polynomial memory banks must hold at least %d coefficients (%d coefficients in %d banks)" % (min(valid_n), size, banks))
+        exit()
+    mem_size = size
+    mem_banks = banks
+    mem_idd_scale = 1 - MEM_DYNAMIC_SHARE + MEM_DYNAMIC_SHARE*math.sqrt((size/banks)/(POLY_MEM_SIZE/POLY_MEM_BANKS))
+    mem_leak_scale = 1 - MEM_LEAKAGE_SHARE + MEM_LEAKAGE_SHARE*(size/POLY_MEM_SIZE)
+
+# Returns True if two polynomials (of "n" coefficients) are in the same memory bank
+def same_bank(poly0, poly1, n):
+    bank_slots = int(mem_size/mem_banks/n)
+    return int(poly0/bank_slots) == int(poly1/bank_slots)
+
+# Polynomials in each memory bank, e.g. "0 to 3, 4 to 7"
+def bank_ranges(n):
+    bank_slots = int(mem_size/mem_banks/n)
+    return ", ".join(["%d to %d" % (bank*bank_slots, (bank+1)*bank_slots - 1) for bank in range(mem_banks)])
+
+# Current of a hardware unit at the reference operating point (for modulus "q"), scaled to the polynomial memory configuration
+def unit_idd(unit, q):
+    if unit not in idd_dict:
+        print("\nERROR: No current for hardware unit \"%s\" in calibration \"%s\"" % (unit, calibration["name"]))
+        exit()
+    idd = idd_dict[unit]
+    if isinstance(idd, dict):
+        idd = idd[q] if q in idd else interpolate_idd(unit, q)
+    if mem_idd_scale != 1 and unit.startswith(MEM_UNITS):
+        idd = i_leak_ref + (idd - i_leak_ref)*mem_idd_scale
+    return idd
+
+# Leakage current (in uA) at supply voltage "vdd" and the operating temperature (see "--temp"), scaled to the
+# polynomial memory configuration
+def leakage_current(vdd):
+    leakage = calibration["leakage"]
+    temp_factor = math.exp(leakage["temp_coefficient"]*(temp_c - calibration["reference"]["temp_c"])) if temp_c is not None else 1
+    return leakage["a"]*math.exp(leakage["b"]*vdd)*temp_factor*mem_leak_scale
+
+# Charge cycles to a hardware unit (key of "idd_dict")
+# Current is looked up per modulus where the unit's current depends on "q"
+def charge(unit, cycles):
+    global ticks
+    global charge_ns
+
+    if profile_host:
+        t_start = time.perf_counter_ns()
+    idd = unit_idd(unit, param_q)
+    # Cycles overlapping a background transfer also draw the current of the transfer (see "--interface dma")
+    background = min(cycles, dma_until - ticks) if dma_until > ticks else 0
+    ticks = ticks + cycles
+    if stream_power:
+        if background > 0:
+            stream_power_segment(idd + dma_idd, background)
+        if cycles > background:
+            stream_power_segment(idd, cycles - background)
+    else:
+        power.extend([idd + dma_idd]*background + [idd]*(cycles - background))
+    if unit not in unit_stats:
+        unit_stats[unit] = [0, 0]
+    unit_stats[unit][0] = unit_stats[unit][0] + cycles
+    unit_stats[unit][1] = unit_stats[unit][1] + idd*cycles
+    if current_section not in section_stats:
+        section_stats[current_section] = [0, 0]
+    section_stats[current_section][0] = section_stats[current_section][0] + cycles
+    section_stats[current_section][1] = section_stats[current_section][1] + idd*cycles
+    if trace_f is not None or overlap:
+        trace_charges.append((unit, cycles, idd*cycles))
+    if gating and cycles > 0:
+        gating_log.append((ticks - cycles, cycles, unit))
+    if background > 0:
+        # Charged to the "dma" unit without cycles, since they are already counted for the charged unit
+        if "dma" not in unit_stats:
+            unit_stats["dma"] = [0, 0]
+        unit_stats["dma"][1] = unit_stats["dma"][1] + dma_idd*background
+        section_stats[current_section][1] = section_stats[current_section][1] + dma_idd*background
+        if trace_f is not None or overlap:
+            trace_charges.append(("dma", 0, dma_idd*background))
+    if profile_host:
+        charge_ns = charge_ns + (time.perf_counter_ns() - t_start)
+
+# Select the host interface model and its parameters, e.g. "burst" or "dma:setup=4,bandwidth=0.5"
+# Parameters that are not provided keep their default values (see "INTERFACE_MODELS")
+def set_interface(spec):
+    global interface_model
+    global interface_params
+
+    (model, sep, params) = spec.partition(":")
+    if model not in INTERFACE_MODELS:
+        print("\nERROR: Unsupported interface model \"%s\" (Valid models: %s)" % (model, list(INTERFACE_MODELS)))
+        exit()
+    interface_params = dict(INTERFACE_MODELS[model])
+    for param in params.split(",") if params != "" else []:
+        (key, sep, value) = param.partition("=")
+        if key not in interface_params:
+            print("\nERROR: Unsupported parameter \"%s\" for interface model \"%s\" (Valid parameters: %s)" % (key, model, list(interface_params)))
+            exit()
+        try:
+            interface_params[key] = type(INTERFACE_MODELS[model][key])(value)
+        except ValueError:
+            print("\nERROR: Invalid value \"%s\" for interface parameter \"%s\"" % (value, key))
+            exit()
+        if interface_params[key] < 0 or (key != "setup" and interface_params[key] == 0):
+            print("\nERROR: Interface parameter \"%s\" must be %s" % (key, "non-negative" if key == "setup" else "positive"))
+            exit()
+    interface_model = model
+
+# Cycles to transfer "words" 32-bit words to ("write") or from the crypto core
+# Returns (cycles for which the core is busy, cycles of the transfer in the background)
+def interface_cycles(words, write):
+    direction = "write" if write else "read"
+    if interface_model == "burst":
+        return (math.ceil(words/interface_params["length"])*interface_params["setup"] + words*interface_params[direction], 0)
+    if interface_model == "dma":
+        return (interface_params["setup"], math.ceil(words/interface_params["bandwidth"]))
+    return (words*interface_params[direction], 0)
+
+# Charge a host interface transfer of "operand" (register or polynomial) to a hardware unit
+def interface_charge(unit, words, write, operand):
+    global dma_until
+    global dma_idd
+    global dma_operand
+
+    (cycles, background) = interface_cycles(words, write)
+    if interface_log is not None and cycles + background > 0:
+        interface_log.append((ticks, cycles + background))
+    charge(unit, cycles)
+    interface_stats["transfers"] = interface_stats["transfers"] + 1
+    interface_stats["words"] = interface_stats["words"] + words
+    interface_stats["cycles"] = interface_stats["cycles"] + cycles
+    interface_stats["background_cycles"] = interface_stats["background_cycles"] + background
+    if background > 0:
+        dma_until = ticks + background
+        dma_idd = unit_idd(unit, param_q) - i_leak_ref
+        dma_operand = operand
+
+# Returns True if an instruction must wait for the background transfer to complete, i.e. if it accesses the
+# transferred operand, uses the interface or files, reconfigures the polynomial memory or ends the program
+def dma_dependent(opcode, args):
+    if opcode is None:
+        return False
+    if opcode in INTERFACE_OPCODES or opcode in ["config", "end", "encode_compare"]:
+        return True
+    operands = overlap_operands(opcode, args)
+    return operands is not None and dma_operand in operands[0] + operands[1]
+
+# Streaming power statistics (see "--stream_power")
+# Per-cycle power values are summarized in a mergeable quantile sketch (log-spaced buckets with 1% relative
+# accuracy, as in DDSketch) instead of being stored, so that memory does not grow with program length
+SKETCH_GAMMA = 1.01/0.99
+
+def sketch_new():
+    return { "count" : 0, "sum" : 0.0, "min" : math.inf, "max" : -math.inf, "buckets" : {} }
+
+def sketch_add(sketch, values):
+    values = np.maximum(values, 1e-9)
+    (indices, counts) = np.unique(np.ceil(np.log(values)/math.log(SKETCH_GAMMA)).astype(int), return_counts=True)
+    for (index, count) in zip(indices.tolist(), counts.tolist()):
+        sketch["buckets"][index] = sketch["buckets"].get(index, 0) + count
+    sketch["count"] = sketch["count"] + len(values)
+    sketch["sum"] = sketch["sum"] + float(values.sum())
+    sketch["min"] = min(sketch["min"], float(values.min()))
+    sketch["max"] = max(sketch["max"], float(values.max()))
+
+# Merge sketches, e.g. of multiple iterations or of parallel workers (bucket indices may be strings after JSON export)
+def sketch_merge(sketches):
+    merged = sketch_new()
+    for sketch in sketches:
+        for (index, count) in sketch["buckets"].items():
+            merged["buckets"][int(index)] = merged["buckets"].get(int(index), 0) + count
+        merged["count"] = merged["count"] + sketch["count"]
+        merged["sum"] = merged["sum"] + sketch["sum"]
+        merged["min"] = min(merged["min"], sketch["min"])
+        merged["max"] = max(merged["max"], sketch["max"])
+    return merged
+
+def sketch_quantile(sketch, quantile):
+    rank = quantile*(sketch["count"] - 1)
+    seen = 0
+    for index in sorted(sketch["buckets"]):
+        seen = seen + sketch["buckets"][index]
+        if seen > rank:
+            value = 2*(SKETCH_GAMMA**index)/(SKETCH_GAMMA + 1)
+            return min(max(value, sketch["min"]), sketch["max"])
+    return sketch["max"]
+
+# Convert current of a charged segment to power (same as "convert_power") and add it to the sketch
+# Noise is drawn from a separate generator, so that functional results do not depend on this mode
+def stream_power_segment(idd, cycles):
+    (vdd, fmhz) = stream_op_point
+    i_leak = leakage_current(vdd)
+    idd = i_leak + ((idd - i_leak_ref)*freq_scale(fmhz)*volt_scale(vdd))
+    noise = noise_rng.integers(-max(int(idd/100), 1), max(int(idd/100), 1), size=cycles)
+    sketch_add(power_stats, (idd + noise)*vdd)
+
+# Operating point segments (see "set_op"), each starting with a snapshot of the per-unit and per-section statistics
+# and of the sum of streamed power, so that the statistics of a segment are the difference to the next snapshot
+def op_segment(vdd, fmhz):
+    return {
+        "start"         : ticks,
+        "vdd"           : vdd,
+        "fmhz"          : fmhz,
+        "units"         : dict([(unit, list(stats)) for (unit, stats) in unit_stats.items()]),
+        "sections"      : dict([(section, list(stats)) for (section, stats) in section_stats.items()]),
+        "power_sum"     : power_stats["sum"],
+        "transition_pj" : 0,
+    }
+
+# Switch to operating point (vdd, fmhz) at the current cycle, the transition is charged at the new operating point
+def op_transition(vdd, fmhz):
+    global stream_op_point
+
+    segment = op_segment(vdd, fmhz)
+    segment["transition_pj"] = dvfs_energy_pj
+    op_segments.append(segment)
+    stream_op_point = (vdd, fmhz)
+    charge("dvfs", dvfs_cycles(fmhz))
+
+# Cycle costs of the instructions, shared by "instr_exec" and the static estimator (see "static_charges"), with the
+# cycle counts of the transforms and samplers in core.py
+CTRL_OPCODES = set(["config", "c_set", "reg_set", "tmp_set", "reg_tmp", "compare_c", "compare_reg", "compare_tmp", "branch", "set_op", "end", "nop"])
+POLY_OP_UNITS = { "ADD" : "poly_poly_addsub", "SUB" : "poly_poly_addsub", "MUL" : "poly_poly_mul", "CONST_ADD" : "poly_const_addsub", "CONST_SUB" : "poly_const_addsub", "CONST_MUL" : "poly_const_mul",
+                  "CONST_AND" : "poly_const_and", "CONST_OR" : "poly_const_or", "CONST_XOR" : "poly_const_xor", "CONST_RSHIFT" : "poly_const_shift", "CONST_LSHIFT" : "poly_const_shift" }
+SAMPLER_UNITS = { "rej_sample" : "sample_rej", "bin_sample" : "sample_bin", "cdt_sample" : "sample_cdt", "uni_sample" : "sample_uni",
+                  "tri_sample_1" : "sample_tri_1", "tri_sample_2" : "sample_tri_2", "tri_sample_3" : "sample_tri_3" }
+
+# Cycles charged per hardware unit by an instruction whose cycle count only depends on its operands and "n",
+# returns a list of (unit, cycles), or None for samplers and host interface instructions
+# (the DVFS transition of "set_op" is charged separately, see "dvfs_cycles")
+def instr_costs(opcode, args, n):
+    if opcode in CTRL_OPCODES:
+        return [("ctrl", 2)]
+    if opcode in ["c_addsub", "tmp_alu"]:
+        return [("reg_alu", 2)]
+    if opcode in ["reg_read_poly", "reg_read_poly_c"]:
+        return [("reg_poly", 2 + 1 + 2)]
+    if opcode in ["reg_write_poly", "reg_write_poly_c"]:
+        return [("reg_poly", 2 + 1 + 1)]
+    if opcode in ["poly_max", "poly_sum"]:
+        return [("poly_max_elems" if opcode == "poly_max" else "poly_sum_elems", 2 + 1 + 1 + n)]
+    if opcode == "transform":
+        # Need to copy polynomial when n is an even power of 2
+        if int(math.log(n,2)) % 2 == 0:
+            return [("poly_ntt", ntt_cycles(n)), ("poly_copy", 2 + 1 + 1 + int(n/4))]
+        return [("poly_ntt", ntt_cycles(n))]
+    if opcode in ["mult_psi", "mult_psi_inv"]:
+        return [("poly_mult_psi", mult_psi_cycles(n))]
+    if opcode == "init":
+        return [("poly_init", 2 + 1 + 1 + int(n/4))]
+    if opcode == "poly_copy":
+        # Fast copy between different memory banks
+        if not same_bank(int(args[0]), int(args[1]), n):
+            return [("poly_copy", 2 + 1 + 1 + int(n/4))]
+        return [("poly_copy", 2 + 1 + 1 + (3*n))]
+    if opcode == "poly_op":
+        if args[0] == "BITREV":
+            return [("poly_bitrev", 2 + 1 + (1+int(n/4)))]
+        if args[0] in POLY_OP_UNITS:
+            return [(POLY_OP_UNITS[args[0]], 2 + 1 + 1 + n)]
+        return []
+    if opcode == "shift_poly":
+        return [("poly_shift", 2 + 1 + 1 + int(n/4))]
+    if opcode == "eq_check":
+        return [("poly_eq_check", 2 + 1 + 2 + n)]
+    if opcode == "inf_norm_check":
+        return [("poly_norm_check", 2 + 2 + 1 + 1 + n)]
+    if opcode == "sha3_init":
+        return [("sha3", 2 + 1 + 25)]
+    if opcode == "sha3_absorb_poly":
+        if int(args[0]) == 256:
+            return [("poly_hash", 2 + 1 + 1 + n + math.ceil(n/34)*(17+25))]
+        return [("poly_hash", 2 + 1 + 1 + n + math.ceil(n/18)*(9+25))]
+    if opcode == "sha3_absorb_r":
+        if int(args[0]) == 256:
+            return [("sha3", 2 + 1 + (17+25))]
+        return [("sha3", 2 + 1 + (9+25))]
+    if opcode == "sha3_256_digest":
+        return [("sha3", 2 + 1 + (25+25+2))]
+    if opcode == "sha3_512_digest":
+        return [("sha3", 2 + 1 + (25+25+3))]
+    return None
+
+# Hardware unit of a sampler (or sampler pseudo-instruction) and cycles to update the "c0" / "c1" (pseudo-instructions)
+# and "reg" (uni_sample, tri_sample_2) registers, to which the cycles returned by the sampler in core.py are added
+def sampler_costs(opcode):
+    sampler = opcode[:-len("_pseudo")] if opcode.endswith("_pseudo") else opcode
+    cycles = (2 + 2 if opcode.endswith("_pseudo") else 0) + (2 if sampler in ["uni_sample", "tri_sample_2"] else 0)
+    return (SAMPLER_UNITS[sampler], cycles)
+
+# Host interface transfer of a random / load / save instruction, returns (unit, words, write)
+def interface_transfer(opcode, n):
+    if opcode.endswith("_r"):
+        return ("ctrl", 8, opcode != "save_r")
+    return ("poly_read_write", n, opcode != "save_poly")
+
+# Cycles of a DVFS transition to operating frequency "fmhz"
+def dvfs_cycles(fmhz):
+    return math.ceil(dvfs_latency_us*fmhz)
+
+# Charge the costs of an instruction (see "instr_costs") at the configured n
+def charge_instr(opcode, args):
+    for (unit, cycles) in instr_costs(opcode, args, param_n):
+        charge(unit, cycles)
+
+# Instruction execute
+def instr_exec(instr, decoded, iter_count):
     global keccak_buf
     global proc_regs
     global poly_mem
     global poly_tmp
     global param_n
     global param_q
-    global ticks
     global pc
-    global power
+    global poly_slots
 
-    instr_t = instr.replace(" ", "")
+    (opcode, args) = decoded
 
     # INSTRUCTION - Parameter Configuration
-    matchObj = re.match(r'config\(n=(\d+),q=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        param_n = int(matchObj.group(1))
-        param_q = int(matchObj.group(2))
+    if opcode == "config":
+        param_n = int(args[0])
+        param_q = int(args[1])
         #print("config: n = %d, q = %d" % (param_n, param_q))
-        if param_n not in valid_n:
-            print("\n[Line %4d] %s\nERROR: Unsupported parameter \"n = %d\" (Valid \"n\": %s)\n" % (lines[pc], instr, param_n, valid_n))
-            exit()
-        if param_q not in valid_q:
-            print("\n[Line %4d] %s\nERROR: Unsupported parameter \"q = %d\" (Valid prime \"q\": %s)\n" % (lines[pc], instr, param_q, valid_q))
-            exit()
         # Initialize polynomial memory
-        poly_mem = [[0 for i in range(param_n)] for j in range(int(8192/param_n))]
+        poly_slots = int(mem_size/param_n)
+        poly_mem = [[0 for i in range(param_n)] for j in range(poly_slots)]
         poly_tmp = [0 for i in range(param_n)]
-        #poly_mem = np.zeros((int(8192/param_n), param_n))
+        #poly_mem = np.zeros((poly_slots, param_n))
         #poly_tmp = np.zeros((param_n))
         #poly_mem = np.array(poly_mem, dtype=np.int64).tolist()
         #poly_tmp = np.array(poly_mem, dtype=np.int64).tolist()
         pc = pc + 1
-        ticks = ticks + 2
-        power = power + ([idd_dict["ctrl"]]*2)
+        charge_instr(opcode, args)
         return 0
 
     # INSTRUCTION - Register Write Operation
-    matchObj = re.match(r'c(\d)=(\d+)', instr_t, re.M|re.I)
-    if matchObj:
-        reg = int(matchObj.group(1))
-        val = int(matchObj.group(2))
-        if reg > 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"c%d\", please use \"c0\" or \"c1\"\n" % (lines[pc], instr, reg))
-            exit()
-        if val >= 2**16:
-            print("\n[Line %4d] %s\nERROR: Value %s too big for 16-bit register \"c%d\"\n" % (lines[pc], instr, val, reg))
-            exit()
+    if opcode == "c_set":
+        reg = int(args[0])
+        val = int(args[1])
         # Update register value
         proc_regs["c%s" % reg] = val
         pc = pc + 1
-        ticks = ticks + 2
-        power = power + ([idd_dict["ctrl"]]*2)
+        charge_instr(opcode, args)
         return 1
-    matchObj = re.match(r'c(\d)=c(\d)([\+\-])(\d+)', instr_t, re.M|re.I)
-    if matchObj:
-        reg_dst = int(matchObj.group(1))
-        reg_src = int(matchObj.group(2))
-        val = int(matchObj.group(4))
-        if reg_dst > 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"c%d\", please use \"c0\" or \"c1\"\n" % (lines[pc], instr, reg_dst))
-            exit()
-        if reg_src > 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"c%d\", please use \"c0\" or \"c1\"\n" % (lines[pc], instr, reg_src))
-            exit()
-        if reg_dst != reg_src:
-            print("\n[Line %4d] %s\nERROR: Must use \"c0 = c0 +/- <val>\" or \"c1 = c1 +/- <val>\"\n" % (lines[pc], instr))
-            exit()
-        if val >= 2**16:
-            print("\n[Line %4d] %s\nERROR: Value %d too big for 16-bit register \"c%d\"\n" % (lines[pc], instr, val, reg_dst))
-            exit()
+    if opcode == "c_addsub":
+        reg_dst = int(args[0])
+        reg_src = int(args[1])
+        val = int(args[3])
         # Update register value
-        if matchObj.group(3) == "+":
+        if args[2] == "+":
             proc_regs["c%d" % reg_dst] = (proc_regs["c%d" % reg_dst] + val) % 2**16
-        if matchObj.group(3) == "-":
+        if args[2] == "-":
             proc_regs["c%d" % reg_dst] = (proc_regs["c%d" % reg_dst] - val) % 2**16
         pc = pc + 1
-        ticks = ticks + 2
-        power = power + ([idd_dict["reg_alu"]]*2)
+        charge_instr(opcode, args)
         return 1
-    matchObj = re.match(r'reg=(\d+)', instr_t, re.M|re.I)
-    if matchObj:
-        val = int(matchObj.group(1))
-        if val >= 2**24:
-            print("\n[Line %4d] %s\nERROR: Value %d too big for 24-bit register \"reg\"\n" % (lines[pc], instr, val))
-            exit()
+    if opcode == "reg_set":
+        val = int(args[0])
         # Update register value
         proc_regs["reg"] = val
         pc = pc + 1
-        ticks = ticks + 2
-        power = power + ([idd_dict["ctrl"]]*2)
+        charge_instr(opcode, args)
         return 1
-    matchObj = re.match(r'tmp=(\d+)', instr_t, re.M|re.I)
-    if matchObj:
-        val = int(matchObj.group(1))
-        if val >= 2**24:
-            print("\n[Line %4d] %s\nERROR: Value %d too big for 24-bit register \"tmp\"\n" % (lines[pc], instr, val))
-            exit()
+    if opcode == "tmp_set":
+        val = int(args[0])
         # Update register value
         proc_regs["tmp"] = val
         pc = pc + 1
-        ticks = ticks + 2
-        power = power + ([idd_dict["ctrl"]]*2)
+        charge_instr(opcode, args)
         return 1
-    matchObj = re.match(r'reg=tmp', instr_t, re.M|re.I)
-    if matchObj:
+    if opcode == "reg_tmp":
         # Update register value
         proc_regs["reg"] = proc_regs["tmp"]
         pc = pc + 1
-        ticks = ticks + 2
-        power = power + ([idd_dict["ctrl"]]*2)
+        charge_instr(opcode, args)
         return 1
 
     # INSTRUCTION - Register ALU Operation
-    matchObj = re.match(r'tmp=tmp([\+\-\*&\|\^><][><]*)reg', instr_t, re.M|re.I)
-    if matchObj:
-        op = matchObj.group(1)
+    if opcode == "tmp_alu":
+        op = args[0]
         #print("op: %s" % op)
         if op == "+":
             # Update register value
@@ -212,91 +708,47 @@ def instr_exec(instr, iter_count):
                 proc_regs["tmp"] = (proc_regs["tmp"] << proc_regs["reg"]) % 2**24
             else:
                 proc_regs["tmp"] = 0
-        else:
-            print("\n[Line %4d] %s\nERROR: Unsupported operation \"%s\", allowed operators are {+, -, *, &, |, ^, >>, <<}\n" % (lines[pc], instr, op))
-            exit()
         pc = pc + 1
-        ticks = ticks + 2
-        power = power + ([idd_dict["reg_alu"]]*2)
+        charge_instr(opcode, args)
         return 1
 
     # INSTRUCTION - Register Polynomial Operation
-    matchObj = re.match(r'reg=\(poly=(\d+)\)\[(\d+)\]', instr_t, re.M|re.I)
-    if matchObj:
-        poly = int(matchObj.group(1))
-        index = int(matchObj.group(2))
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
-        if index >= param_n:
-            print("\n[Line %4d] %s\nERROR: Index \"%d\" out of range, allowed indices for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, param_n))
-            exit()
+    if opcode == "reg_read_poly":
+        poly = int(args[0])
+        index = int(args[1])
         # Read polynomial coefficient and update register value
         proc_regs["reg"] = poly_mem[poly][index]
-        cycles = 2 + 1 + 2
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["reg_poly"]]*cycles)
+        charge_instr(opcode, args)
         return 2
-    matchObj = re.match(r'reg=\(poly=(\d+)\)\[c(\d)\]', instr_t, re.M|re.I)
-    if matchObj:
-        poly = int(matchObj.group(1))
-        reg = int(matchObj.group(2))
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
-        if int(matchObj.group(1)) > 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"c%d\", please use \"c0\" or \"c1\"\n" % (lines[pc], instr, reg))
-            exit()
+    if opcode == "reg_read_poly_c":
+        poly = int(args[0])
+        reg = int(args[1])
         # Read polynomial coefficient and update register value
         proc_regs["reg"] = poly_mem[poly][proc_regs["c%d" % reg] % param_n]
-        cycles = 2 + 1 + 2
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["reg_poly"]]*cycles)
+        charge_instr(opcode, args)
         return 2
-    matchObj = re.match(r'\(poly=(\d+)\)\[(\d+)\]=reg', instr_t, re.M|re.I)
-    if matchObj:
-        poly = int(matchObj.group(1))
-        index = int(matchObj.group(2))
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
-        if index >= param_n:
-            print("\n[Line %4d] %s\nERROR: Index \"%d\" out of range, allowed indices for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, param_n))
-            exit()
+    if opcode == "reg_write_poly":
+        poly = int(args[0])
+        index = int(args[1])
         # Read register value and update polynomial coefficient
         poly_mem[poly][index] = proc_regs["reg"]
-        cycles = 2 + 1 + 1
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["reg_poly"]]*cycles)
+        charge_instr(opcode, args)
         return 2
-    matchObj = re.match(r'\(poly=(\d+)\)\[c(\d)\]=reg', instr_t, re.M|re.I)
-    if matchObj:
-        poly = int(matchObj.group(1))
-        reg = int(matchObj.group(2))
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
-        if reg > 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"c%d\", please use \"c0\" or \"c1\"\n" % (lines[pc], instr, reg))
-            exit()
+    if opcode == "reg_write_poly_c":
+        poly = int(args[0])
+        reg = int(args[1])
         # Read register value and update polynomial coefficient
         poly_mem[poly][proc_regs["c%d" % reg] % param_n] = proc_regs["reg"]
-        cycles = 2 + 1 + 1
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["reg_poly"]]*cycles)
+        charge_instr(opcode, args)
         return 2
 
     # INSTRUCTION - Polynomial Absolute Maximum in range [-q/2, + q/2]
-    matchObj = re.match(r'reg=max\(poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        poly = int(matchObj.group(1))
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
+    if opcode == "poly_max":
+        poly = int(args[0])
         # Compute maximum of coefficients and update register value
         proc_regs["reg"] = 0
         for i in range(param_n):
@@ -304,19 +756,13 @@ def instr_exec(instr, iter_count):
                 proc_regs["reg"] = poly_mem[poly][i]
             if poly_mem[poly][i] >= int(param_q/2) and (param_q - poly_mem[poly][i]) > proc_regs["reg"]:
                 proc_regs["reg"] = (param_q - poly_mem[poly][i])
-        cycles = 2 + 1 + 1 + param_n
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["poly_max_elems"]]*cycles)
+        charge_instr(opcode, args)
         return 2
 
     # INSTRUCTION - Polynomial Sum of Coefficients in range [-q/2, + q/2]
-    matchObj = re.match(r'reg=sum\(poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        poly = int(matchObj.group(1))
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
+    if opcode == "poly_sum":
+        poly = int(args[0])
         # Compute sum of coefficients and update register value
         proc_regs["reg"] = 0
         for i in range(param_n):
@@ -326,674 +772,359 @@ def instr_exec(instr, iter_count):
                 proc_regs["reg"] = proc_regs["reg"] + (poly_mem[poly][i] - param_q)
         proc_regs["reg"] = abs(proc_regs["reg"])
         #print("sum = %d" % proc_regs["reg"])
-        cycles = 2 + 1 + 1 + param_n
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["poly_sum_elems"]]*cycles)
+        charge_instr(opcode, args)
         return 2
 
     # INSTRUCTION - Polynomial Number Theoretic Transform
-    matchObj = re.match(r'transform\(mode=(DI[FT]_I{0,1}NTT),poly_dst=(\d+),poly_src=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        mode = matchObj.group(1)
-        poly_dst = int(matchObj.group(2))
-        poly_src = int(matchObj.group(3))
-        if poly_dst >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly_dst = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly_dst, param_n, int(8192/param_n)))
-            exit()
-        if poly_src >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly_src = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly_src, param_n, int(8192/param_n)))
-            exit()
-        if not ((poly_src < int(4096/param_n) and poly_dst >= int(4096/param_n)) or (poly_dst < int(4096/param_n) and poly_src >= int(4096/param_n))):
-            print("\n[Line %4d] %s\nERROR: Polynomial pair \"poly_dst = %d, poly_src = %d\" is not allowed for n = %d, ensure \"poly_dst < %d, poly_src >= %d\" or \"poly_src < %d, poly_dst >= %d\"\n" % (lines[pc], instr, poly_dst, poly_src, param_n, int(4096/param_n), int(4096/param_n), int(4096/param_n), int(4096/param_n)))
-            exit()
+    if opcode == "transform":
+        mode = args[0]
+        poly_dst = int(args[1])
+        poly_src = int(args[2])
         # Compute transform and update polynomial coefficients
         if mode == "DIF_NTT":
             # assume standard input, bit-reversed output
-            cycles = dif_ntt(param_n, param_q, poly_mem[poly_src], lines[pc], instr)
+            dif_ntt(param_n, param_q, poly_mem[poly_src], lines[pc], instr)
             poly_mem[poly_dst] = poly_mem[poly_src].copy()
-            poly_mem[poly_src] = [(random.getrandbits(24) % param_q) for i in range(param_n)] # Source polynomial gets clobbered
+            poly_mem[poly_src] = [(func_rng.getrandbits(24) % param_q) for i in range(param_n)] # Source polynomial gets clobbered
         if mode == "DIT_NTT":
             # assume bit-reversed input, standard output
-            cycles = dit_ntt(param_n, param_q, poly_mem[poly_src], lines[pc], instr)
+            dit_ntt(param_n, param_q, poly_mem[poly_src], lines[pc], instr)
             poly_mem[poly_dst] = poly_mem[poly_src].copy()
-            poly_mem[poly_src] = [(random.getrandbits(24) % param_q) for i in range(param_n)] # Source polynomial gets clobbered
+            poly_mem[poly_src] = [(func_rng.getrandbits(24) % param_q) for i in range(param_n)] # Source polynomial gets clobbered
         if mode == "DIF_INTT":
             # assume standard input, bit-reversed output
-            cycles = dif_intt(param_n, param_q, poly_mem[poly_src], lines[pc], instr)
+            dif_intt(param_n, param_q, poly_mem[poly_src], lines[pc], instr)
             poly_mem[poly_dst] = poly_mem[poly_src].copy()
-            poly_mem[poly_src] = [(random.getrandbits(24) % param_q) for i in range(param_n)] # Source polynomial gets clobbered
+            poly_mem[poly_src] = [(func_rng.getrandbits(24) % param_q) for i in range(param_n)] # Source polynomial gets clobbered
         if mode == "DIT_INTT":
             # assume bit-reversed input, standard output
-            cycles = dit_intt(param_n, param_q, poly_mem[poly_src], lines[pc], instr)
+            dit_intt(param_n, param_q, poly_mem[poly_src], lines[pc], instr)
             poly_mem[poly_dst] = poly_mem[poly_src].copy()
-            poly_mem[poly_src] = [(random.getrandbits(24) % param_q) for i in range(param_n)] # Source polynomial gets clobbered
+            poly_mem[poly_src] = [(func_rng.getrandbits(24) % param_q) for i in range(param_n)] # Source polynomial gets clobbered
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["poly_ntt"][param_q]]*cycles)
-        # Need to copy polynomial when n is an even power of 2
-        if int(math.log(param_n,2)) % 2 == 0:
-            cycles = 2 + 1 + 1 + int(param_n/4)
-            ticks = ticks + cycles
-            power = power + ([idd_dict["poly_copy"]]*cycles)
+        charge_instr(opcode, args)
         return 3
 
     # INSTRUCTION - Pre- and Post- Processing for Negative-Wrapped Convolution
-    matchObj = re.match(r'mult_psi\(poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        poly = int(matchObj.group(1))
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
+    if opcode == "mult_psi":
+        poly = int(args[0])
         # Pre-process polynomial coefficients
-        cycles = mult_psi(param_n, param_q, poly_mem[poly], lines[pc], instr)
-        proc_regs["tmp"] = random.getrandbits(24) # "tmp" register gets clobbered
+        mult_psi(param_n, param_q, poly_mem[poly], lines[pc], instr)
+        proc_regs["tmp"] = func_rng.getrandbits(24) # "tmp" register gets clobbered
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["poly_mult_psi"][param_q]]*cycles)
+        charge_instr(opcode, args)
         return 3
-    matchObj = re.match(r'mult_psi_inv\(poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        poly = int(matchObj.group(1))
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
+    if opcode == "mult_psi_inv":
+        poly = int(args[0])
         # Pre-process polynomial coefficients
-        cycles = mult_psi_inv(param_n, param_q, poly_mem[poly], lines[pc], instr)
-        proc_regs["tmp"] = random.getrandbits(24) # "tmp" register gets clobbered
+        mult_psi_inv(param_n, param_q, poly_mem[poly], lines[pc], instr)
+        proc_regs["tmp"] = func_rng.getrandbits(24) # "tmp" register gets clobbered
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["poly_mult_psi"][param_q]]*cycles)
+        charge_instr(opcode, args)
         return 3
 
     # PSEUDO-INSTRUCTION - Rejection Sampling
-    matchObj = re.match(r'rej_sample\(prng=SHAKE-(\d+),seed=r(\d),c0=(\d+),c1=(\d+),poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        mode = int(matchObj.group(1))
-        reg = int(matchObj.group(2))
-        val_c0 = int(matchObj.group(3))
-        val_c1 = int(matchObj.group(4))
-        poly = int(matchObj.group(5))
-        if mode != 128 and mode != 256:
-            print("\n[Line %4d] %s\nERROR: Only SHAKE-128 and SHAKE-256 are supported\n" % (lines[pc], instr))
-            exit()
-        if reg != 0 and reg != 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", allowed registers are r0 and r1\n" % (lines[pc], instr, reg))
-            exit()
-        if val_c0 >= 2**16:
-            print("\n[Line %4d] %s\nERROR: Value %d too big for 16-bit register \"c0\"\n" % (lines[pc], instr, val_c0))
-            exit()
-        if val_c1 >= 2**16:
-            print("\n[Line %4d] %s\nERROR: Value %d too big for 16-bit register \"c1\"\n" % (lines[pc], instr, val_c1))
-            exit()
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
+    if opcode == "rej_sample_pseudo":
+        mode = int(args[0])
+        reg = int(args[1])
+        val_c0 = int(args[2])
+        val_c1 = int(args[3])
+        poly = int(args[4])
         # Update register values
         proc_regs["c0"] = val_c0
         proc_regs["c1"] = val_c1
-        cycles = 2 + 2
+        (unit, cycles) = sampler_costs(opcode)
         # Sample polynomial coefficients
         cycles = cycles + rejection_sample(param_n, param_q, mode, hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0') + hex(proc_regs["c0"])[2:].rstrip("L").rjust(4,'0') + hex(proc_regs["c1"])[2:].rstrip("L").rjust(4,'0'), poly_mem[poly])
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["sample_rej"]]*cycles)
+        charge(unit, cycles)
         return 4
 
     # PSEUDO-INSTRUCTION - Binomial Sampling
-    matchObj = re.match(r'bin_sample\(prng=SHAKE-(\d+),seed=r(\d),c0=(\d+),c1=(\d+),k=(\d+),poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        mode = int(matchObj.group(1))
-        reg = int(matchObj.group(2))
-        val_c0 = int(matchObj.group(3))
-        val_c1 = int(matchObj.group(4))
-        param_k = int(matchObj.group(5))
-        poly = int(matchObj.group(6))
-        if mode != 128 and mode != 256:
-            print("\n[Line %4d] %s\nERROR: Only SHAKE-128 and SHAKE-256 are supported\n" % (lines[pc], instr))
-            exit()
-        if reg != 0 and reg != 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", allowed registers are r0 and r1\n" % (lines[pc], instr, reg))
-            exit()
-        if val_c0 >= 2**16:
-            print("\n[Line %4d] %s\nERROR: Value %d too big for 16-bit register \"c0\"\n" % (lines[pc], instr, val_c0))
-            exit()
-        if val_c1 >= 2**16:
-            print("\n[Line %4d] %s\nERROR: Value %d too big for 16-bit register \"c1\"\n" % (lines[pc], instr, val_c1))
-            exit()
-        if param_k < 1 or param_k > 32:
-            print("\n[Line %4d] %s\nERROR: Value of \"k\" must be in the range 1 to 32\n" % (lines[pc], instr))
-            exit()
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
+    if opcode == "bin_sample_pseudo":
+        mode = int(args[0])
+        reg = int(args[1])
+        val_c0 = int(args[2])
+        val_c1 = int(args[3])
+        param_k = int(args[4])
+        poly = int(args[5])
         # Update register values
         proc_regs["c0"] = val_c0
         proc_regs["c1"] = val_c1
-        cycles = 2 + 2
+        (unit, cycles) = sampler_costs(opcode)
         # Sample polynomial coefficients
         cycles = cycles + binomial_sample(param_n, param_q, param_k, mode, hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0') + hex(proc_regs["c0"])[2:].rstrip("L").rjust(4,'0') + hex(proc_regs["c1"])[2:].rstrip("L").rjust(4,'0'), poly_mem[poly])
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["sample_bin"]]*cycles)
+        charge(unit, cycles)
         return 4
 
     # PSEUDO-INSTRUCTION - Cumulative Distribution Table Sampling
-    matchObj = re.match(r'cdt_sample\(prng=SHAKE-(\d+),seed=r(\d),c0=(\d+),c1=(\d+),r=(\d+),poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        mode = int(matchObj.group(1))
-        reg = int(matchObj.group(2))
-        val_c0 = int(matchObj.group(3))
-        val_c1 = int(matchObj.group(4))
-        param_r = int(matchObj.group(5))
-        poly = int(matchObj.group(6))
-        if mode != 128 and mode != 256:
-            print("\n[Line %4d] %s\nERROR: Only SHAKE-128 and SHAKE-256 are supported\n" % (lines[pc], instr))
-            exit()
-        if reg != 0 and reg != 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", allowed registers are r0 and r1\n" % (lines[pc], instr, reg))
-            exit()
-        if val_c0 >= 2**16:
-            print("\n[Line %4d] %s\nERROR: Value %d too big for 16-bit register \"c0\"\n" % (lines[pc], instr, val_c0))
-            exit()
-        if val_c1 >= 2**16:
-            print("\n[Line %4d] %s\nERROR: Value %d too big for 16-bit register \"c1\"\n" % (lines[pc], instr, val_c1))
-            exit()
-        if param_r < 1 or param_r > 32:
-            print("\n[Line %4d] %s\nERROR: Value of \"r\" must be in the range 1 to 32\n" % (lines[pc], instr))
-            exit()
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
-        if "--cdt" not in sys.argv:
+    if opcode == "cdt_sample_pseudo":
+        mode = int(args[0])
+        reg = int(args[1])
+        val_c0 = int(args[2])
+        val_c1 = int(args[3])
+        param_r = int(args[4])
+        poly = int(args[5])
+        if cdt_mem is None:
             print("\n[Line %4d] %s\nERROR: CDT not provided, please provide a valid CDT file to use CDT-based sampling\n" % (lines[pc], instr))
             exit()
         # Update register values
         proc_regs["c0"] = val_c0
         proc_regs["c1"] = val_c1
-        cycles = 2 + 2
+        (unit, cycles) = sampler_costs(opcode)
         # Sample polynomial coefficients
         cycles = cycles + cdt_sample(param_n, param_q, param_r, mode, hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0') + hex(proc_regs["c0"])[2:].rstrip("L").rjust(4,'0') + hex(proc_regs["c1"])[2:].rstrip("L").rjust(4,'0'), cdt_mem, poly_mem[poly])
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["sample_cdt"]]*cycles)
+        charge(unit, cycles)
         return 4
 
     # PSEUDO-INSTRUCTION - Uniform Sampling
-    matchObj = re.match(r'uni_sample\(prng=SHAKE-(\d+),seed=r(\d),c0=(\d+),c1=(\d+),eta=(\d+),poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        mode = int(matchObj.group(1))
-        reg = int(matchObj.group(2))
-        val_c0 = int(matchObj.group(3))
-        val_c1 = int(matchObj.group(4))
-        param_eta = int(matchObj.group(5))
-        poly = int(matchObj.group(6))
-        if mode != 128 and mode != 256:
-            print("\n[Line %4d] %s\nERROR: Only SHAKE-128 and SHAKE-256 are supported\n" % (lines[pc], instr))
-            exit()
-        if reg != 0 and reg != 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", allowed registers are r0 and r1\n" % (lines[pc], instr, reg))
-            exit()
-        if val_c0 >= 2**16:
-            print("\n[Line %4d] %s\nERROR: Value %d too big for 16-bit register \"c0\"\n" % (lines[pc], instr, val_c0))
-            exit()
-        if val_c1 >= 2**16:
-            print("\n[Line %4d] %s\nERROR: Value %d too big for 16-bit register \"c1\"\n" % (lines[pc], instr, val_c1))
-            exit()
-        if param_eta >= param_q:
-            print("\n[Line %4d] %s\nERROR: Value of \"eta\" too large, must be less than %d\n" % (lines[pc], instr, param_q))
-            exit()
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
+    if opcode == "uni_sample_pseudo":
+        mode = int(args[0])
+        reg = int(args[1])
+        val_c0 = int(args[2])
+        val_c1 = int(args[3])
+        param_eta = int(args[4])
+        poly = int(args[5])
         # Update register values
         proc_regs["c0"] = val_c0
         proc_regs["c1"] = val_c1
         proc_regs["reg"] = param_eta
-        cycles = 2 + 2 + 2
+        (unit, cycles) = sampler_costs(opcode)
         # Sample polynomial coefficients
         cycles = cycles + uniform_sample(param_n, param_q, param_eta, mode, hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0') + hex(proc_regs["c0"])[2:].rstrip("L").rjust(4,'0') + hex(proc_regs["c1"])[2:].rstrip("L").rjust(4,'0'), poly_mem[poly])
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["sample_uni"]]*cycles)
+        charge(unit, cycles)
         return 4
 
     # PSEUDO-INSTRUCTION - Trinary Sampling #1
-    matchObj = re.match(r'tri_sample_1\(prng=SHAKE-(\d+),seed=r(\d),c0=(\d+),c1=(\d+),m=(\d+),poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        mode = int(matchObj.group(1))
-        reg = int(matchObj.group(2))
-        val_c0 = int(matchObj.group(3))
-        val_c1 = int(matchObj.group(4))
-        param_m = int(matchObj.group(5))
-        poly = int(matchObj.group(6))
-        if mode != 128 and mode != 256:
-            print("\n[Line %4d] %s\nERROR: Only SHAKE-128 and SHAKE-256 are supported\n" % (lines[pc], instr))
-            exit()
-        if reg != 0 and reg != 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", allowed registers are r0 and r1\n" % (lines[pc], instr, reg))
-            exit()
-        if val_c0 >= 2**16:
-            print("\n[Line %4d] %s\nERROR: Value %d too big for 16-bit register \"c0\"\n" % (lines[pc], instr, val_c0))
-            exit()
-        if val_c1 >= 2**16:
-            print("\n[Line %4d] %s\nERROR: Value %d too big for 16-bit register \"c1\"\n" % (lines[pc], instr, val_c1))
-            exit()
-        if param_m >= param_n:
-            print("\n[Line %4d] %s\nERROR: Value of \"m\" too large, must be less than %d\n" % (lines[pc], instr, param_n))
-            exit()
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
+    if opcode == "tri_sample_1_pseudo":
+        mode = int(args[0])
+        reg = int(args[1])
+        val_c0 = int(args[2])
+        val_c1 = int(args[3])
+        param_m = int(args[4])
+        poly = int(args[5])
         # Update register values
         proc_regs["c0"] = val_c0
         proc_regs["c1"] = val_c1
-        cycles = 2 + 2
+        (unit, cycles) = sampler_costs(opcode)
         # Sample polynomial coefficients
         cycles = cycles + trinary_sample_1(param_n, param_q, param_m, mode, hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0') + hex(proc_regs["c0"])[2:].rstrip("L").rjust(4,'0') + hex(proc_regs["c1"])[2:].rstrip("L").rjust(4,'0'), poly_mem[poly])
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["sample_tri_1"]]*cycles)
+        charge(unit, cycles)
         return 4
 
     # PSEUDO-INSTRUCTION - Trinary Sampling #2
-    matchObj = re.match(r'tri_sample_2\(prng=SHAKE-(\d+),seed=r(\d),c0=(\d+),c1=(\d+),m0=(\d+),m1=(\d+),poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        mode = int(matchObj.group(1))
-        reg = int(matchObj.group(2))
-        val_c0 = int(matchObj.group(3))
-        val_c1 = int(matchObj.group(4))
-        param_m0 = int(matchObj.group(5))
-        param_m1 = int(matchObj.group(6))
-        poly = int(matchObj.group(7))
-        if mode != 128 and mode != 256:
-            print("\n[Line %4d] %s\nERROR: Only SHAKE-128 and SHAKE-256 are supported\n" % (lines[pc], instr))
-            exit()
-        if reg != 0 and reg != 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", allowed registers are r0 and r1\n" % (lines[pc], instr, reg))
-            exit()
-        if val_c0 >= 2**16:
-            print("\n[Line %4d] %s\nERROR: Value %d too big for 16-bit register \"c0\"\n" % (lines[pc], instr, val_c0))
-            exit()
-        if val_c1 >= 2**16:
-            print("\n[Line %4d] %s\nERROR: Value %d too big for 16-bit register \"c1\"\n" % (lines[pc], instr, val_c1))
-            exit()
-        if param_m0 >= param_n:
-            print("\n[Line %4d] %s\nERROR: Value of \"m0\" too large, must be less than %d\n" % (lines[pc], instr, param_n))
-            exit()
-        if param_m1 >= param_n:
-            print("\n[Line %4d] %s\nERROR: Value of \"m1\" too large, must be less than %d\n" % (lines[pc], instr, param_n))
-            exit()
-        if (param_m0 + param_m1) >= param_n:
-            print("\n[Line %4d] %s\nERROR: Value of \"m0 + m1\" too large, must be less than %d\n" % (lines[pc], instr, param_n))
-            exit()
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
+    if opcode == "tri_sample_2_pseudo":
+        mode = int(args[0])
+        reg = int(args[1])
+        val_c0 = int(args[2])
+        val_c1 = int(args[3])
+        param_m0 = int(args[4])
+        param_m1 = int(args[5])
+        poly = int(args[6])
         # Update register values
         proc_regs["c0"] = val_c0
         proc_regs["c1"] = val_c1
         proc_regs["reg"] = param_m0 + (param_m1 * 2**12)
-        cycles = 2 + 2 + 2
+        (unit, cycles) = sampler_costs(opcode)
         # Sample polynomial coefficients
         cycles = cycles + trinary_sample_2(param_n, param_q, param_m0, param_m1, mode, hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0') + hex(proc_regs["c0"])[2:].rstrip("L").rjust(4,'0') + hex(proc_regs["c1"])[2:].rstrip("L").rjust(4,'0'), poly_mem[poly])
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["sample_tri_2"]]*cycles)
+        charge(unit, cycles)
         return 4
 
     # PSEUDO-INSTRUCTION - Trinary Sampling #3
-    matchObj = re.match(r'tri_sample_3\(prng=SHAKE-(\d+),seed=r(\d),c0=(\d+),c1=(\d+),rho=1/(\d+),poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        mode = int(matchObj.group(1))
-        reg = int(matchObj.group(2))
-        val_c0 = int(matchObj.group(3))
-        val_c1 = int(matchObj.group(4))
-        param_rho = int(matchObj.group(5))
-        poly = int(matchObj.group(6))
-        if mode != 128 and mode != 256:
-            print("\n[Line %4d] %s\nERROR: Only SHAKE-128 and SHAKE-256 are supported\n" % (lines[pc], instr))
-            exit()
-        if reg != 0 and reg != 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", allowed registers are r0 and r1\n" % (lines[pc], instr, reg))
-            exit()
-        if val_c0 >= 2**16:
-            print("\n[Line %4d] %s\nERROR: Value %d too big for 16-bit register \"c0\"\n" % (lines[pc], instr, val_c0))
-            exit()
-        if val_c1 >= 2**16:
-            print("\n[Line %4d] %s\nERROR: Value %d too big for 16-bit register \"c1\"\n" % (lines[pc], instr, val_c1))
-            exit()
-        if param_rho != 2 and param_rho != 4 and param_rho != 8 and param_rho != 16 and param_rho != 32 and param_rho != 64 and param_rho != 128:
-            print("\n[Line %4d] %s\nERROR: Unsupported parameter \"rho = 1/%d\" (Valid \"rho\": [1/2, 1/4, 1/8, 1/16, 1/32, 1/64, 1/128])\n" % (lines[pc], instr, param_rho))
-            exit()
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
+    if opcode == "tri_sample_3_pseudo":
+        mode = int(args[0])
+        reg = int(args[1])
+        val_c0 = int(args[2])
+        val_c1 = int(args[3])
+        param_rho = int(args[4])
+        poly = int(args[5])
         # Update register values
         proc_regs["c0"] = val_c0
         proc_regs["c1"] = val_c1
-        cycles = 2 + 2
+        (unit, cycles) = sampler_costs(opcode)
         # Sample polynomial coefficients
         cycles = cycles + trinary_sample_3(param_n, param_q, param_rho, mode, hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0') + hex(proc_regs["c0"])[2:].rstrip("L").rjust(4,'0') + hex(proc_regs["c1"])[2:].rstrip("L").rjust(4,'0'), poly_mem[poly])
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["sample_tri_3"]]*cycles)
+        charge(unit, cycles)
         return 4
 
     # INSTRUCTION - Rejection Sampling
-    matchObj = re.match(r'rej_sample\(prng=SHAKE-(\d+),seed=r(\d),poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        mode = int(matchObj.group(1))
-        reg = int(matchObj.group(2))
-        poly = int(matchObj.group(3))
-        if mode != 128 and mode != 256:
-            print("\n[Line %4d] %s\nERROR: Only SHAKE-128 and SHAKE-256 are supported\n" % (lines[pc], instr))
-            exit()
-        if reg != 0 and reg != 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", allowed registers are r0 and r1\n" % (lines[pc], instr, reg))
-            exit()
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
+    if opcode == "rej_sample":
+        mode = int(args[0])
+        reg = int(args[1])
+        poly = int(args[2])
+        (unit, cycles) = sampler_costs(opcode)
         # Sample polynomial coefficients
-        cycles = rejection_sample(param_n, param_q, mode, hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0') + hex(proc_regs["c0"])[2:].rstrip("L").rjust(4,'0') + hex(proc_regs["c1"])[2:].rstrip("L").rjust(4,'0'), poly_mem[poly])
+        cycles = cycles + rejection_sample(param_n, param_q, mode, hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0') + hex(proc_regs["c0"])[2:].rstrip("L").rjust(4,'0') + hex(proc_regs["c1"])[2:].rstrip("L").rjust(4,'0'), poly_mem[poly])
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["sample_rej"]]*cycles)
+        charge(unit, cycles)
         return 4
 
     # INSTRUCTION - Binomial Sampling
-    matchObj = re.match(r'bin_sample\(prng=SHAKE-(\d+),seed=r(\d),k=(\d+),poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        mode = int(matchObj.group(1))
-        reg = int(matchObj.group(2))
-        param_k = int(matchObj.group(3))
-        poly = int(matchObj.group(4))
-        if mode != 128 and mode != 256:
-            print("\n[Line %4d] %s\nERROR: Only SHAKE-128 and SHAKE-256 are supported\n" % (lines[pc], instr))
-            exit()
-        if reg != 0 and reg != 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", allowed registers are r0 and r1\n" % (lines[pc], instr, reg))
-            exit()
-        if param_k < 1 or param_k > 32:
-            print("\n[Line %4d] %s\nERROR: Value of \"k\" must be in the range 1 to 32\n" % (lines[pc], instr))
-            exit()
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
+    if opcode == "bin_sample":
+        mode = int(args[0])
+        reg = int(args[1])
+        param_k = int(args[2])
+        poly = int(args[3])
+        (unit, cycles) = sampler_costs(opcode)
         # Sample polynomial coefficients
-        cycles = binomial_sample(param_n, param_q, param_k, mode, hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0') + hex(proc_regs["c0"])[2:].rstrip("L").rjust(4,'0') + hex(proc_regs["c1"])[2:].rstrip("L").rjust(4,'0'), poly_mem[poly])
+        cycles = cycles + binomial_sample(param_n, param_q, param_k, mode, hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0') + hex(proc_regs["c0"])[2:].rstrip("L").rjust(4,'0') + hex(proc_regs["c1"])[2:].rstrip("L").rjust(4,'0'), poly_mem[poly])
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["sample_bin"]]*cycles)
+        charge(unit, cycles)
         return 4
 
     # INSTRUCTION - Cumulative Distribution Table Sampling
-    matchObj = re.match(r'cdt_sample\(prng=SHAKE-(\d+),seed=r(\d),r=(\d+),poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        mode = int(matchObj.group(1))
-        reg = int(matchObj.group(2))
-        param_r = int(matchObj.group(3))
-        poly = int(matchObj.group(4))
-        if mode != 128 and mode != 256:
-            print("\n[Line %4d] %s\nERROR: Only SHAKE-128 and SHAKE-256 are supported\n" % (lines[pc], instr))
-            exit()
-        if reg != 0 and reg != 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", allowed registers are r0 and r1\n" % (lines[pc], instr, reg))
-            exit()
-        if param_r < 1 or param_r > 32:
-            print("\n[Line %4d] %s\nERROR: Value of \"r\" must be in the range 1 to 32\n" % (lines[pc], instr))
-            exit()
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
-        if "--cdt" not in sys.argv:
+    if opcode == "cdt_sample":
+        mode = int(args[0])
+        reg = int(args[1])
+        param_r = int(args[2])
+        poly = int(args[3])
+        if cdt_mem is None:
             print("\n[Line %4d] %s\nERROR: CDT not provided, please provide a valid CDT file to use CDT-based sampling\n" % (lines[pc], instr))
             exit()
+        (unit, cycles) = sampler_costs(opcode)
         # Sample polynomial coefficients
-        cycles = cdt_sample(param_n, param_q, param_r, mode, hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0') + hex(proc_regs["c0"])[2:].rstrip("L").rjust(4,'0') + hex(proc_regs["c1"])[2:].rstrip("L").rjust(4,'0'), cdt_mem, poly_mem[poly])
+        cycles = cycles + cdt_sample(param_n, param_q, param_r, mode, hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0') + hex(proc_regs["c0"])[2:].rstrip("L").rjust(4,'0') + hex(proc_regs["c1"])[2:].rstrip("L").rjust(4,'0'), cdt_mem, poly_mem[poly])
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["sample_cdt"]]*cycles)
+        charge(unit, cycles)
         return 4
 
     # INSTRUCTION - Uniform Sampling
-    matchObj = re.match(r'uni_sample\(prng=SHAKE-(\d+),seed=r(\d),eta=(\d+),poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        mode = int(matchObj.group(1))
-        reg = int(matchObj.group(2))
-        param_eta = int(matchObj.group(3))
-        poly = int(matchObj.group(4))
-        if mode != 128 and mode != 256:
-            print("\n[Line %4d] %s\nERROR: Only SHAKE-128 and SHAKE-256 are supported\n" % (lines[pc], instr))
-            exit()
-        if reg != 0 and reg != 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", allowed registers are r0 and r1\n" % (lines[pc], instr, reg))
-            exit()
-        if param_eta >= param_q:
-            print("\n[Line %4d] %s\nERROR: Value of \"eta\" too large, must be less than %d\n" % (lines[pc], instr, param_q))
-            exit()
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
+    if opcode == "uni_sample":
+        mode = int(args[0])
+        reg = int(args[1])
+        param_eta = int(args[2])
+        poly = int(args[3])
         # Update register values
         proc_regs["reg"] = param_eta
-        cycles = 2
+        (unit, cycles) = sampler_costs(opcode)
         # Sample polynomial coefficients
         cycles = cycles + uniform_sample(param_n, param_q, param_eta, mode, hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0') + hex(proc_regs["c0"])[2:].rstrip("L").rjust(4,'0') + hex(proc_regs["c1"])[2:].rstrip("L").rjust(4,'0'), poly_mem[poly])
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["sample_uni"]]*cycles)
+        charge(unit, cycles)
         return 4
 
     # INSTRUCTION - Trinary Sampling #1
-    matchObj = re.match(r'tri_sample_1\(prng=SHAKE-(\d+),seed=r(\d),m=(\d+),poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        mode = int(matchObj.group(1))
-        reg = int(matchObj.group(2))
-        param_m = int(matchObj.group(3))
-        poly = int(matchObj.group(4))
-        if mode != 128 and mode != 256:
-            print("\n[Line %4d] %s\nERROR: Only SHAKE-128 and SHAKE-256 are supported\n" % (lines[pc], instr))
-            exit()
-        if reg != 0 and reg != 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", allowed registers are r0 and r1\n" % (lines[pc], instr, reg))
-            exit()
-        if param_m >= param_n:
-            print("\n[Line %4d] %s\nERROR: Value of \"m\" too large, must be less than %d\n" % (lines[pc], instr, param_n))
-            exit()
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
+    if opcode == "tri_sample_1":
+        mode = int(args[0])
+        reg = int(args[1])
+        param_m = int(args[2])
+        poly = int(args[3])
+        (unit, cycles) = sampler_costs(opcode)
         # Sample polynomial coefficients
-        cycles = trinary_sample_1(param_n, param_q, param_m, mode, hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0') + hex(proc_regs["c0"])[2:].rstrip("L").rjust(4,'0') + hex(proc_regs["c1"])[2:].rstrip("L").rjust(4,'0'), poly_mem[poly])
+        cycles = cycles + trinary_sample_1(param_n, param_q, param_m, mode, hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0') + hex(proc_regs["c0"])[2:].rstrip("L").rjust(4,'0') + hex(proc_regs["c1"])[2:].rstrip("L").rjust(4,'0'), poly_mem[poly])
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["sample_tri_1"]]*cycles)
+        charge(unit, cycles)
         return 4
 
     # INSTRUCTION - Trinary Sampling #2
-    matchObj = re.match(r'tri_sample_2\(prng=SHAKE-(\d+),seed=r(\d),m0=(\d+),m1=(\d+),poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        mode = int(matchObj.group(1))
-        reg = int(matchObj.group(2))
-        param_m0 = int(matchObj.group(3))
-        param_m1 = int(matchObj.group(4))
-        poly = int(matchObj.group(5))
-        if mode != 128 and mode != 256:
-            print("\n[Line %4d] %s\nERROR: Only SHAKE-128 and SHAKE-256 are supported\n" % (lines[pc], instr))
-            exit()
-        if reg != 0 and reg != 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", allowed registers are r0 and r1\n" % (lines[pc], instr, reg))
-            exit()
-        if param_m0 >= param_n:
-            print("\n[Line %4d] %s\nERROR: Value of \"m0\" too large, must be less than %d\n" % (lines[pc], instr, param_n))
-            exit()
-        if param_m1 >= param_n:
-            print("\n[Line %4d] %s\nERROR: Value of \"m1\" too large, must be less than %d\n" % (lines[pc], instr, param_n))
-            exit()
-        if (param_m0 + param_m1) >= param_n:
-            print("\n[Line %4d] %s\nERROR: Value of \"m0 + m1\" too large, must be less than %d\n" % (lines[pc], instr, param_n))
-            exit()
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
+    if opcode == "tri_sample_2":
+        mode = int(args[0])
+        reg = int(args[1])
+        param_m0 = int(args[2])
+        param_m1 = int(args[3])
+        poly = int(args[4])
         # Update register values
         proc_regs["reg"] = param_m0 + (param_m1 * 2**12)
-        cycles = 2
+        (unit, cycles) = sampler_costs(opcode)
         # Sample polynomial coefficients
         cycles = cycles + trinary_sample_2(param_n, param_q, param_m0, param_m1, mode, hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0') + hex(proc_regs["c0"])[2:].rstrip("L").rjust(4,'0') + hex(proc_regs["c1"])[2:].rstrip("L").rjust(4,'0'), poly_mem[poly])
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["sample_tri_2"]]*cycles)
+        charge(unit, cycles)
         return 4
 
     # INSTRUCTION - Trinary Sampling #3
-    matchObj = re.match(r'tri_sample_3\(prng=SHAKE-(\d+),seed=r(\d),rho=1/(\d+),poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        mode = int(matchObj.group(1))
-        reg = int(matchObj.group(2))
-        param_rho = int(matchObj.group(3))
-        poly = int(matchObj.group(4))
-        if mode != 128 and mode != 256:
-            print("\n[Line %4d] %s\nERROR: Only SHAKE-128 and SHAKE-256 are supported\n" % (lines[pc], instr))
-            exit()
-        if reg != 0 and reg != 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", allowed registers are r0 and r1\n" % (lines[pc], instr, reg))
-            exit()
-        if param_rho != 2 and param_rho != 4 and param_rho != 8 and param_rho != 16 and param_rho != 32 and param_rho != 64 and param_rho != 128:
-            print("\n[Line %4d] %s\nERROR: Unsupported parameter \"rho = 1/%d\" (Valid \"rho\": [1/2, 1/4, 1/8, 1/16, 1/32, 1/64, 1/128])\n" % (lines[pc], instr, param_rho))
-            exit()
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
+    if opcode == "tri_sample_3":
+        mode = int(args[0])
+        reg = int(args[1])
+        param_rho = int(args[2])
+        poly = int(args[3])
+        (unit, cycles) = sampler_costs(opcode)
         # Sample polynomial coefficients
-        cycles = trinary_sample_3(param_n, param_q, param_rho, mode, hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0') + hex(proc_regs["c0"])[2:].rstrip("L").rjust(4,'0') + hex(proc_regs["c1"])[2:].rstrip("L").rjust(4,'0'), poly_mem[poly])
+        cycles = cycles + trinary_sample_3(param_n, param_q, param_rho, mode, hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0') + hex(proc_regs["c0"])[2:].rstrip("L").rjust(4,'0') + hex(proc_regs["c1"])[2:].rstrip("L").rjust(4,'0'), poly_mem[poly])
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["sample_tri_3"]]*cycles)
+        charge(unit, cycles)
         return 4
     
     # INSTRUCTION - Polynomial Initialization
-    matchObj = re.match(r'init\(poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        poly = int(matchObj.group(1))
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
+    if opcode == "init":
+        poly = int(args[0])
         # Set all polynomial coefficients to zero
         poly_mem[poly] = [0 for i in range(param_n)]
-        cycles = 2 + 1 + 1 + int(param_n/4)
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["poly_init"]]*cycles)
+        charge_instr(opcode, args)
         return 5
 
     # INSTRUCTION - Polynomial Copy
-    matchObj = re.match(r'poly_copy\(poly_dst=(\d+),poly_src=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        poly_dst = int(matchObj.group(1))
-        poly_src = int(matchObj.group(2))
-        if poly_dst >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly_dst = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly_dst, param_n, int(8192/param_n)))
-            exit()
-        if poly_src >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly_src = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly_src, param_n, int(8192/param_n)))
-            exit()
+    if opcode == "poly_copy":
+        poly_dst = int(args[0])
+        poly_src = int(args[1])
         # Copy polynomial coefficients (handle both fast and slow cases in cycle count)
         poly_mem[poly_dst] = poly_mem[poly_src].copy()
-        if ((poly_src < int(4096/param_n) and poly_dst >= int(4096/param_n)) or (poly_dst < int(4096/param_n) and poly_src >= int(4096/param_n))):
-            cycles = 2 + 1 + 1 + int(param_n/4)
-        else:
-            cycles = 2 + 1 + 1 + (3*param_n)
-        proc_regs["tmp"] = random.getrandbits(24) # "tmp" register gets clobbered
+        proc_regs["tmp"] = func_rng.getrandbits(24) # "tmp" register gets clobbered
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["poly_copy"]]*cycles)
+        charge_instr(opcode, args)
         return 5
 
-    supported_poly_ops = ["ADD", "SUB", "MUL", "BITREV", "CONST_ADD", "CONST_SUB", "CONST_MUL", "CONST_AND", "CONST_OR", "CONST_XOR", "CONST_RSHIFT", "CONST_LSHIFT"]
-
     # INSTRUCTION - Polynomial ALU Operations
-    matchObj = re.match(r'poly_op\(op=([\w_]+),poly_dst=(\d+),poly_src=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        op = matchObj.group(1)
-        poly_dst = int(matchObj.group(2))
-        poly_src = int(matchObj.group(3))
-        if poly_dst >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly_dst = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly_dst, param_n, int(8192/param_n)))
-            exit()
-        if poly_src >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly_src = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly_src, param_n, int(8192/param_n)))
-            exit()
-        if not ((poly_src < int(4096/param_n) and poly_dst >= int(4096/param_n)) or (poly_dst < int(4096/param_n) and poly_src >= int(4096/param_n))):
-            print("\n[Line %4d] %s\nERROR: Polynomial pair \"poly_dst = %d, poly_src = %d\" is not allowed for n = %d, ensure \"poly_dst < %d, poly_src >= %d\" or \"poly_src < %d, poly_dst >= %d\"\n" % (lines[pc], instr, poly_dst, poly_src, param_n, int(4096/param_n), int(4096/param_n), int(4096/param_n), int(4096/param_n)))
-            exit()
+    if opcode == "poly_op":
+        op = args[0]
+        poly_dst = int(args[1])
+        poly_src = int(args[2])
         #print("op: %s" % op)
         if op == "ADD":
             # Update polynomial coefficients
             for i in range(param_n):
                 poly_mem[poly_dst][i] = (int(poly_mem[poly_src][i]) + int(poly_mem[poly_dst][i])) % param_q
-            proc_regs["tmp"] = random.getrandbits(24) # "tmp" register gets clobbered
-            cycles = 2 + 1 + 1 + param_n
-            power = power + ([idd_dict["poly_poly_addsub"][param_q]]*cycles)
+            proc_regs["tmp"] = func_rng.getrandbits(24) # "tmp" register gets clobbered
         elif op == "SUB":
             # Update polynomial coefficients
             for i in range(param_n):
                 poly_mem[poly_dst][i] = (int(poly_mem[poly_src][i]) - int(poly_mem[poly_dst][i]) + param_q) % param_q
-            proc_regs["tmp"] = random.getrandbits(24) # "tmp" register gets clobbered
-            cycles = 2 + 1 + 1 + param_n
-            power = power + ([idd_dict["poly_poly_addsub"][param_q]]*cycles)
+            proc_regs["tmp"] = func_rng.getrandbits(24) # "tmp" register gets clobbered
         elif op == "MUL":
             # Update polynomial coefficients
             for i in range(param_n):
                 poly_mem[poly_dst][i] = (int(poly_mem[poly_src][i]) * int(poly_mem[poly_dst][i])) % param_q
-            proc_regs["tmp"] = random.getrandbits(24) # "tmp" register gets clobbered
-            cycles = 2 + 1 + 1 + param_n
-            power = power + ([idd_dict["poly_poly_mul"][param_q]]*cycles)
+            proc_regs["tmp"] = func_rng.getrandbits(24) # "tmp" register gets clobbered
         elif op == "BITREV":
             # Update polynomial coefficients
             for i in range(param_n):
-                i_rev = int(('{:0{w}b}'.format(i, w=int(math.log(param_n,2))))[::-1], 2)
-                poly_mem[poly_dst][i_rev] = poly_mem[poly_src][i]
-            cycles = 2 + 1 + (1+int(param_n/4))
-            power = power + ([idd_dict["poly_bitrev"]]*cycles)
+                poly_mem[poly_dst][i] = poly_mem[poly_src][i]
+            for (i, j) in bitrev_pairs(param_n):
+                poly_mem[poly_dst][i] = poly_mem[poly_src][j]
+                poly_mem[poly_dst][j] = poly_mem[poly_src][i]
         elif op == "CONST_ADD":
             # Update polynomial coefficients
             for i in range(param_n):
                 poly_mem[poly_dst][i] = (int(poly_mem[poly_src][i]) + proc_regs["reg"]) % param_q
-            cycles = 2 + 1 + 1 + param_n
-            power = power + ([idd_dict["poly_const_addsub"][param_q]]*cycles)
         elif op == "CONST_SUB":
             # Update polynomial coefficients
             for i in range(param_n):
                 poly_mem[poly_dst][i] = (int(poly_mem[poly_src][i]) - proc_regs["reg"] + param_q) % param_q
-            cycles = 2 + 1 + 1 + param_n
-            power = power + ([idd_dict["poly_const_addsub"][param_q]]*cycles)
         elif op == "CONST_MUL":
             # Update polynomial coefficients
             for i in range(param_n):
                 poly_mem[poly_dst][i] = (int(poly_mem[poly_src][i]) * proc_regs["reg"]) % param_q
-            cycles = 2 + 1 + 1 + param_n
-            power = power + ([idd_dict["poly_const_mul"][param_q]]*cycles)
         elif op == "CONST_AND":
             # Update polynomial coefficients
             for i in range(param_n):
                 poly_mem[poly_dst][i] = (poly_mem[poly_src][i] & proc_regs["reg"])
-            cycles = 2 + 1 + 1 + param_n
-            power = power + ([idd_dict["poly_const_and"]]*cycles)
         elif op == "CONST_OR":
             # Update polynomial coefficients
             for i in range(param_n):
                 poly_mem[poly_dst][i] = (poly_mem[poly_src][i] | proc_regs["reg"])
-            cycles = 2 + 1 + 1 + param_n
-            power = power + ([idd_dict["poly_const_or"]]*cycles)
         elif op == "CONST_XOR":
             # Update polynomial coefficients
             for i in range(param_n):
                 poly_mem[poly_dst][i] = (poly_mem[poly_src][i] ^ proc_regs["reg"])
-            cycles = 2 + 1 + 1 + param_n
-            power = power + ([idd_dict["poly_const_xor"]]*cycles)
         elif op == "CONST_RSHIFT":
             # Update polynomial coefficients
             for i in range(param_n):
@@ -1001,8 +1132,6 @@ def instr_exec(instr, iter_count):
                     poly_mem[poly_dst][i] = (poly_mem[poly_src][i] >> proc_regs["reg"]) % 2**24
                 else:
                     poly_mem[poly_dst][i] = 0
-            cycles = 2 + 1 + 1 + param_n
-            power = power + ([idd_dict["poly_const_shift"]]*cycles)
         elif op == "CONST_LSHIFT":
             # Update polynomial coefficients
             for i in range(param_n):
@@ -1010,83 +1139,46 @@ def instr_exec(instr, iter_count):
                     poly_mem[poly_dst][i] = (poly_mem[poly_src][i] << proc_regs["reg"]) % 2**24
                 else:
                     poly_mem[poly_dst][i] = 0
-            cycles = 2 + 1 + 1 + param_n
-            power = power + ([idd_dict["poly_const_shift"]]*cycles)
-        else:
-            print("\n[Line %4d] %s\nERROR: Unsupported operation \"%s\", allowed operations are %s\n" % (lines[pc], instr, op, supported_poly_ops))
-            exit()
         pc = pc + 1
-        ticks = ticks + cycles
+        charge_instr(opcode, args)
         return 5
 
     # INSTRUCTION - Polynomial Circular Left Shift (Multiplication by x modulo x^N+1 and x^N-1)
-    matchObj = re.match(r'shift_poly\(ring=x\^N([\+\-])1,poly_dst=(\d+),poly_src=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        ring = matchObj.group(1)
-        poly_dst = int(matchObj.group(2))
-        poly_src = int(matchObj.group(3))
-        if poly_dst >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly_dst = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly_dst, param_n, int(8192/param_n)))
-            exit()
-        if poly_src >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly_src = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly_src, param_n, int(8192/param_n)))
-            exit()
-        if not ((poly_src < int(4096/param_n) and poly_dst >= int(4096/param_n)) or (poly_dst < int(4096/param_n) and poly_src >= int(4096/param_n))):
-            print("\n[Line %4d] %s\nERROR: Polynomial pair \"poly_dst = %d, poly_src = %d\" is not allowed for n = %d, ensure \"poly_dst < %d, poly_src >= %d\" or \"poly_src < %d, poly_dst >= %d\"\n" % (lines[pc], instr, poly_dst, poly_src, param_n, int(4096/param_n), int(4096/param_n), int(4096/param_n), int(4096/param_n)))
-            exit()
+    if opcode == "shift_poly":
+        ring = args[0]
+        poly_dst = int(args[1])
+        poly_src = int(args[2])
         # Update polynomial coefficients
         for i in range(1, param_n):
             poly_mem[poly_dst][i] = poly_mem[poly_src][i-1]
         if ring == "+":
-            poly_mem[poly_dst][0] = param_q - poly_mem[poly_scr][param_n-1]
+            poly_mem[poly_dst][0] = param_q - poly_mem[poly_src][param_n-1]
         if ring == "-":
-            poly_mem[poly_dst][0] = poly_mem[poly_scr][param_n-1]
-        cycles = 2 + 1 + 1 + int(param_n/4)
+            poly_mem[poly_dst][0] = poly_mem[poly_src][param_n-1]
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["poly_shift"]]*cycles)
+        charge_instr(opcode, args)
         return 5
 
     # INSTRUCTION - Polynomial Equality Check
-    matchObj = re.match(r'flag=eq_check\(poly0=(\d+),poly1=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        poly0 = int(matchObj.group(1))
-        poly1 = int(matchObj.group(2))
-        if poly0 >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly0 = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly0, param_n, int(8192/param_n)))
-            exit()
-        if poly1 >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly1 = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly1, param_n, int(8192/param_n)))
-            exit()
-        if not ((poly1 < int(4096/param_n) and poly0 >= int(4096/param_n)) or (poly0 < int(4096/param_n) and poly1 >= int(4096/param_n))):
-            print("\n[Line %4d] %s\nERROR: Polynomial pair \"poly0 = %d, poly1 = %d\" is not allowed for n = %d, ensure \"poly0 < %d, poly1 >= %d\" or \"poly1 < %d, poly0 >= %d\"\n" % (lines[pc], instr, poly0, poly1, param_n, int(4096/param_n), int(4096/param_n), int(4096/param_n), int(4096/param_n)))
-            exit()
+    if opcode == "eq_check":
+        poly0 = int(args[0])
+        poly1 = int(args[1])
         # Compare polynomial coefficients and update flag
         if poly_mem[poly0] == poly_mem[poly1]:
             proc_regs["flag"] = 1
         else:
             proc_regs["flag"] = 0
-        proc_regs["tmp"] = random.getrandbits(24) # "tmp" register gets clobbered
-        cycles = 2 + 1 + 2 + param_n
+        proc_regs["tmp"] = func_rng.getrandbits(24) # "tmp" register gets clobbered
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["poly_eq_check"]]*cycles)
+        charge_instr(opcode, args)
         return 6
 
     # INSTRUCTION - Polynomial Infinity Norm Check
-    matchObj = re.match(r'flag=inf_norm_check\(poly=(\d+),bound=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        poly = int(matchObj.group(1))
-        bound = int(matchObj.group(2))
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
-        if bound >= 2**24:
-            print("\n[Line %4d] %s\nERROR: Parameter \"bound = %d\" too large, must be less than 2**24\n" % (lines[pc], instr, bound))
-            exit()
+    if opcode == "inf_norm_check":
+        poly = int(args[0])
+        bound = int(args[1])
         # Update register value
         proc_regs["reg"] = bound
-        cycles = 2
         # Compare infinity norm of polynomial with specified bound and update flag
         count = 0
         for i in range(param_n):
@@ -1096,23 +1188,14 @@ def instr_exec(instr, iter_count):
             proc_regs["flag"] = 1
         else:
             proc_regs["flag"] = 0
-        cycles = cycles + 2 + 1 + 1 + param_n
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["poly_inf_norm_check"]]*cycles)
+        charge_instr(opcode, args)
         return 6
 
     # INSTRUCTION - Register Comparison
-    matchObj = re.match(r'flag=compare\(c(\d),(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        reg = int(matchObj.group(1))
-        val = int(matchObj.group(2))
-        if reg > 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"c%d\", please use \"c0\" or \"c1\"\n" % (lines[pc], instr, reg))
-            exit()
-        if val >= 2**16:
-            print("\n[Line %4d] %s\nERROR: Value %s too big for 16-bit register \"c%d\"\n" % (lines[pc], instr, val, reg))
-            exit()
+    if opcode == "compare_c":
+        reg = int(args[0])
+        val = int(args[1])
         # Compare register value and update flag
         if proc_regs["c%s" % reg] < val:
             proc_regs["flag"] = -1
@@ -1121,15 +1204,10 @@ def instr_exec(instr, iter_count):
         else:
             proc_regs["flag"] = 0
         pc = pc + 1
-        ticks = ticks + 2
-        power = power + ([idd_dict["ctrl"]]*2)
+        charge_instr(opcode, args)
         return 6
-    matchObj = re.match(r'flag=compare\(reg,(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        val = int(matchObj.group(1))
-        if val >= 2**24:
-            print("\n[Line %4d] %s\nERROR: Value %s too big for 24-bit register \"reg\"\n" % (lines[pc], instr, val))
-            exit()
+    if opcode == "compare_reg":
+        val = int(args[0])
         # Compare register value and update flag
         if proc_regs["reg"] < val:
             proc_regs["flag"] == -1
@@ -1138,15 +1216,10 @@ def instr_exec(instr, iter_count):
         else:
             proc_regs["flag"] = 0
         pc = pc + 1
-        ticks = ticks + 2
-        power = power + ([idd_dict["ctrl"]]*2)
+        charge_instr(opcode, args)
         return 6
-    matchObj = re.match(r'flag=compare\(tmp,(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        val = int(matchObj.group(1))
-        if val >= 2**24:
-            print("\n[Line %4d] %s\nERROR: Value %s too big for 24-bit register \"tmp\"\n" % (lines[pc], instr, val))
-            exit()
+    if opcode == "compare_tmp":
+        val = int(args[0])
         # Compare register value and update flag
         if proc_regs["tmp"] < val:
             proc_regs["flag"] == -1
@@ -1155,20 +1228,15 @@ def instr_exec(instr, iter_count):
         else:
             proc_regs["flag"] = 0
         pc = pc + 1
-        ticks = ticks + 2
-        power = power + ([idd_dict["ctrl"]]*2)
+        charge_instr(opcode, args)
         return 6
     
     # INSTRUCTION - Check Flag and Jump
-    matchObj = re.match(r'if\(flag([!=]=)([\-\+]{0,1})([01])\)goto([\w\d_]+)', instr_t, re.M|re.I)
-    if matchObj:
-        op = matchObj.group(1)
-        sign = matchObj.group(2)
-        val = int(matchObj.group(3))
-        label = matchObj.group(4)
-        if label not in labels:
-            print("\n[Line %4d] %s\nERROR: Label \"%s\" not found\n" % (lines[pc], instr, label))
-            exit()
+    if opcode == "branch":
+        op = args[0]
+        sign = args[1]
+        val = int(args[2])
+        label = args[3]
         # Check flag value and jump
         if op == "==":
             if val == 0:
@@ -1204,102 +1272,71 @@ def instr_exec(instr, iter_count):
                         pc = labels[label]
                     else:
                         pc = pc + 1
-        ticks = ticks + 2
-        power = power + ([idd_dict["ctrl"]]*2)
+        charge_instr(opcode, args)
         return 6
 
     # INSTRUCTION - SHA3 Operations
-    matchObj = re.match(r'sha3_init', instr_t, re.M|re.I)
-    if matchObj:
+    if opcode == "sha3_init":
         keccak_buf = ""
-        cycles = 2 + 1 + 25
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["sha3"]]*cycles)
+        charge_instr(opcode, args)
         return 7
-    matchObj = re.match(r'sha3_(\d+)_absorb\(poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        mode = int(matchObj.group(1))
-        poly = int(matchObj.group(2))
-        if mode != 256 and mode != 512:
-            print("\n[Line %4d] %s\nERROR: Only SHA3-256 and SHA3-512 are supported\n" % (lines[pc], instr))
-            exit()
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
+    if opcode == "sha3_absorb_poly":
+        mode = int(args[0])
+        poly = int(args[1])
         # Push zero-padded polynomial coefficients into Keccak buffer
         for i in range(param_n):
             keccak_buf = keccak_buf + hex(poly_mem[poly][i])[2:].rstrip("L").rjust(8,'0')
-        if mode == 256:
-            cycles = 2 + 1 + 1 + param_n + math.ceil(param_n/34)*(17+25)
-        if mode == 512:
-            cycles = 2 + 1 + 1 + param_n + math.ceil(param_n/18)*(9+25)
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["poly_hash"]]*cycles)
+        charge_instr(opcode, args)
         return 7
-    matchObj = re.match(r'sha3_(\d+)_absorb\(r(\d)\)', instr_t, re.M|re.I)
-    if matchObj:
-        mode = int(matchObj.group(1))
-        reg = int(matchObj.group(2))
-        if mode != 256 and mode != 512:
-            print("\n[Line %4d] %s\nERROR: Only SHA3-256 and SHA3-512 are supported\n" % (lines[pc], instr))
-            exit()
-        if reg != 0 and reg != 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", allowed registers are r0 and r1\n" % (lines[pc], instr, reg))
-            exit()
+    if opcode == "sha3_absorb_r":
+        mode = int(args[0])
+        reg = int(args[1])
         # Push seed register contents into Keccak buffer
         keccak_buf = keccak_buf + hex(proc_regs["r%d" % reg])[2:].rstrip("L").rjust(64,'0')
-        if mode == 256:
-            cycles = 2 + 1 + (17+25)
-        if mode == 512:
-            cycles = 2 + 1 + (9+25)
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["sha3"]]*cycles)
+        charge_instr(opcode, args)
         return 7
-    matchObj = re.match(r'r(\d)=sha3_256_digest', instr_t, re.M|re.I)
-    if matchObj:
-        reg = int(matchObj.group(1))
-        if reg != 0 and reg != 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", allowed registers are r0 and r1\n" % (lines[pc], instr, reg))
-            exit()
+    if opcode == "sha3_256_digest":
+        reg = int(args[0])
         # Generate SHA3-256 digest
         digest = sha3_256(keccak_buf)
         proc_regs["r%d" % reg] = int(digest, 16)
         keccak_buf = ""
-        cycles = 2 + 1 + (25+25+2)
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["sha3"]]*cycles)
+        charge_instr(opcode, args)
         return 7
-    matchObj = re.match(r'r0\|\|r1=sha3_512_digest', instr_t, re.M|re.I)
-    if matchObj:
+    if opcode == "sha3_512_digest":
         # Generate SHA3-512 digest
         digest = sha3_512(keccak_buf)
         proc_regs["r0"] = int(digest, 16) >> 256
         proc_regs["r1"] = int(digest, 16) % 2**256
         keccak_buf = ""
-        cycles = 2 + 1 + (25+25+3)
         pc = pc + 1
-        ticks = ticks + cycles
-        power = power + ([idd_dict["sha3"]]*cycles)
+        charge_instr(opcode, args)
         return 7
 
+    # SIMULATOR-INSTRUCTION - Dynamic Voltage and Frequency Scaling
+    if opcode == "set_op":
+        vdd = float(args[0])
+        fmhz = int(args[1])
+        pc = pc + 1
+        charge_instr(opcode, args)
+        if (vdd, fmhz) != (op_segments[-1]["vdd"], op_segments[-1]["fmhz"]):
+            op_transition(vdd, fmhz)
+        return -98
+
     # INSTRUCTION - End of Program
-    matchObj = re.match(r'end', instr_t, re.M|re.I)
-    if matchObj:
+    if opcode == "end":
         #print("end-of-program")
-        ticks = ticks + 2
-        power = power + ([idd_dict["ctrl"]]*2)
+        charge_instr(opcode, args)
         return 99
 
     # INSTRUCTION - NOP
-    matchObj = re.match(r'nop', instr_t, re.M|re.I)
-    if matchObj:
+    if opcode == "nop":
         #print("no-operation")
-        ticks = ticks + 2
-        power = power + ([idd_dict["ctrl"]]*2)
+        charge_instr(opcode, args)
         return -98
 
     # DEBUG-INSTRUCTION - Compare Encoded Polynomials (Debug Only)
@@ -1308,10 +1345,9 @@ def instr_exec(instr, iter_count):
         f_prefix = "iter_%d_" % iter_count
     else:
         f_prefix = ""
-    matchObj = re.match(r'encode_compare\("(.*)","(.*)",encoding=([\w_]+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        f1 = matchObj.group(1)
-        f2 = matchObj.group(2)
+    if opcode == "encode_compare":
+        f1 = args[0]
+        f2 = args[1]
         if not f1.endswith(".npy"):
             print("\n[Line %4d] %s\nWARNING: Adding .npy extension to filename \"%s\"\n" % (lines[pc], instr, f1))
             f1 = f1 + ".npy"
@@ -1320,7 +1356,7 @@ def instr_exec(instr, iter_count):
             f2 = f2 + ".npy"
         f1 = f1.replace(os.path.basename(f1), f_prefix + os.path.basename(f1))
         f2 = f2.replace(os.path.basename(f2), f_prefix + os.path.basename(f2))
-        encoding = matchObj.group(3)
+        encoding = args[2]
         if not os.path.exists(f1):
             print("\n[Line %4d] %s\nERROR: Input file %s for \"encode_compare\" does not exist" % (lines[pc], instr, f1))
             exit()
@@ -1341,14 +1377,10 @@ def instr_exec(instr, iter_count):
         return -98
 
     # DEBUG-INSTRUCTION - Print Encoded Polynomial (Debug Only)
-    matchObj = re.match(r'encode_print\(poly=(\d+),encoding=([\w_]+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        poly = int(matchObj.group(1))
-        encoding = matchObj.group(2)
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
-        if "--verbose" in sys.argv:
+    if opcode == "encode_print":
+        poly = int(args[0])
+        encoding = args[1]
+        if verbose:
             b = encode_to_bytearray(param_n, param_q, poly_mem[poly], encoding, lines[pc], instr)
             print("byte_array = %s" % b)
         pc = pc + 1
@@ -1362,170 +1394,119 @@ def instr_exec(instr, iter_count):
         f_prefix = "iter_%d_" % iter_count
     else:
         f_prefix = ""
-    matchObj = re.match(r'random\(r(\d)\)', instr_t, re.M|re.I)
-    if matchObj:
-        reg = int(matchObj.group(1))
-        if reg > 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", please use \"r0\" or \"r1\"\n" % (lines[pc], instr, reg))
-            exit()
-        proc_regs["r%d" % reg] = random.getrandbits(256)
-        cycles = WRITE_CYCLES*8
+    if opcode == "random_r":
+        reg = int(args[0])
+        proc_regs["r%d" % reg] = func_rng.getrandbits(256)
         pc = pc + 1
-        if "--free_rw" not in sys.argv:
-            ticks = ticks + cycles
-            power = power + ([idd_dict["ctrl"]]*cycles)
+        if not free_rw:
+            interface_charge(*interface_transfer(opcode, param_n), "r%d" % reg)
         return -98
-    matchObj = re.match(r'random\(poly=(\d+),encoding=([\w\d_]+),"(.*)"\)', instr_t, re.M|re.I)
-    if matchObj:
-        poly = int(matchObj.group(1))
-        encoding = matchObj.group(2)
-        f = matchObj.group(3)
+    if opcode == "random_poly":
+        poly = int(args[0])
+        encoding = args[1]
+        f = args[2]
         if not f.endswith(".npy"):
             print("\n[Line %4d] %s\nWARNING: Adding .npy extension to filename \"%s\"\n" % (lines[pc], instr, f))
             f = f + ".npy"
         f = f.replace(os.path.basename(f), f_prefix + os.path.basename(f))
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
         if os.path.exists(f):
             print("\n[Line %4d] %s\nWARNING: Output file %s for \"random\" already exists" % (lines[pc], instr, f))
-        random_poly_encode(param_n, param_q, poly_mem[poly], encoding, lines[pc], instr)
+        random_poly_encode(param_n, param_q, poly_mem[poly], encoding, lines[pc], instr, func_rng)
         np.save(f, np.asarray(poly_mem[poly]))
-        cycles = WRITE_CYCLES*param_n
         pc = pc + 1
-        if "--free_rw" not in sys.argv:
-            ticks = ticks + cycles
-            power = power + ([idd_dict["poly_read_write"]]*cycles)
+        if not free_rw:
+            interface_charge(*interface_transfer(opcode, param_n), "poly%d" % poly)
         return -98
-    matchObj = re.match(r'load\(r(\d),"(.*)"\)', instr_t, re.M|re.I)
-    if matchObj:
-        reg = int(matchObj.group(1))
-        f = matchObj.group(2)
+    if opcode == "load_r":
+        reg = int(args[0])
+        f = args[1]
         if not f.endswith(".npy"):
             print("\n[Line %4d] %s\nWARNING: Adding .npy extension to filename \"%s\"\n" % (lines[pc], instr, f))
             f = f + ".npy"
         f = f.replace(os.path.basename(f), f_prefix + os.path.basename(f))
-        if reg > 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", please use \"r0\" or \"r1\"\n" % (lines[pc], instr, reg))
-            exit()
         if not os.path.exists(f):
             print("\n[Line %4d] %s\nERROR: Input file %s for \"load\" does not exist" % (lines[pc], instr, f))
             exit()
         proc_regs["r%d" % reg] = list(np.load(f, allow_pickle = True))[0]
-        cycles = WRITE_CYCLES*8
         pc = pc + 1
-        if "--free_rw" not in sys.argv:
-            ticks = ticks + cycles
-            power = power + ([idd_dict["ctrl"]]*cycles)
+        if not free_rw:
+            interface_charge(*interface_transfer(opcode, param_n), "r%d" % reg)
         return -98
-    matchObj = re.match(r'save\(r(\d),"(.*)"\)', instr_t, re.M|re.I)
-    if matchObj:
-        reg = int(matchObj.group(1))
-        f = matchObj.group(2)
+    if opcode == "save_r":
+        reg = int(args[0])
+        f = args[1]
         if not f.endswith(".npy"):
             print("\n[Line %4d] %s\nWARNING: Adding .npy extension to filename \"%s\"\n" % (lines[pc], instr, f))
             f = f + ".npy"
         f = f.replace(os.path.basename(f), f_prefix + os.path.basename(f))
-        if reg > 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", please use \"r0\" or \"r1\"\n" % (lines[pc], instr, reg))
-            exit()
         if os.path.exists(f):
             print("\n[Line %4d] %s\nWARNING: Output file %s for \"save\" already exists" % (lines[pc], instr, f))
         np.save(f, np.asarray([proc_regs["r%d" % reg]]))
-        cycles = READ_CYCLES*8
         pc = pc + 1
-        if "--free_rw" not in sys.argv:
-            ticks = ticks + cycles
-            power = power + ([idd_dict["ctrl"]]*cycles)
+        if not free_rw:
+            interface_charge(*interface_transfer(opcode, param_n), "r%d" % reg)
         return -98
-    matchObj = re.match(r'load\(poly=(\d+),"(.*)"\)', instr_t, re.M|re.I)
-    if matchObj:
-        poly = int(matchObj.group(1))
-        f = matchObj.group(2)
+    if opcode == "load_poly":
+        poly = int(args[0])
+        f = args[1]
         if not f.endswith(".npy"):
             print("\n[Line %4d] %s\nWARNING: Adding .npy extension to filename \"%s\"\n" % (lines[pc], instr, f))
             f = f + ".npy"
         f = f.replace(os.path.basename(f), f_prefix + os.path.basename(f))
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
         if not os.path.exists(f):
             print("\n[Line %4d] %s\nERROR: Input file %s for \"load\" does not exist" % (lines[pc], instr, f))
             exit()
         poly_mem[poly] = list(np.load(f, allow_pickle = True)).copy()
-        cycles = WRITE_CYCLES*param_n
         pc = pc + 1
-        if "--free_rw" not in sys.argv:
-            ticks = ticks + cycles
-            power = power + ([idd_dict["poly_read_write"]]*cycles)
+        if not free_rw:
+            interface_charge(*interface_transfer(opcode, param_n), "poly%d" % poly)
         return -98
-    matchObj = re.match(r'save\(poly=(\d+),"(.*)"\)', instr_t, re.M|re.I)
-    if matchObj:
-        poly = int(matchObj.group(1))
-        f = matchObj.group(2)
+    if opcode == "save_poly":
+        poly = int(args[0])
+        f = args[1]
         if not f.endswith(".npy"):
             print("\n[Line %4d] %s\nWARNING: Adding .npy extension to filename \"%s\"\n" % (lines[pc], instr, f))
             f = f + ".npy"
         f = f.replace(os.path.basename(f), f_prefix + os.path.basename(f))
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
         if os.path.exists(f):
             print("\n[Line %4d] %s\nWARNING: Output file %s for \"save\" already exists" % (lines[pc], instr, f))
         np.save(f, np.asarray(poly_mem[poly]))
-        cycles = READ_CYCLES*param_n
         pc = pc + 1
-        if "--free_rw" not in sys.argv:
-            ticks = ticks + cycles
-            power = power + ([idd_dict["poly_read_write"]]*cycles)
+        if not free_rw:
+            interface_charge(*interface_transfer(opcode, param_n), "poly%d" % poly)
         return -98
 
     # DEBUG-INSTRUCTION - Print (Debug Only)
-    matchObj = re.match(r'print\(r(\d)\)', instr_t, re.M|re.I)
-    if matchObj:
-        reg = int(matchObj.group(1))
-        if reg > 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"r%d\", please use \"r0\" or \"r1\"\n" % (lines[pc], instr, reg))
-            exit()
-        if "--verbose" in sys.argv:
+    if opcode == "print_r":
+        reg = int(args[0])
+        if verbose:
             print("\nr%d = 0x%s\n" % (reg, hex(proc_regs["r%d" % reg])[2:].upper().rstrip("L").rjust(64,'0')))
         pc = pc + 1
         return -99
-    matchObj = re.match(r'print\(reg\)', instr_t, re.M|re.I)
-    if matchObj:
-        if "--verbose" in sys.argv:
+    if opcode == "print_reg":
+        if verbose:
             print("\nreg = %d\n" % proc_regs["reg"])
         pc = pc + 1
         return -99
-    matchObj = re.match(r'print\(tmp\)', instr_t, re.M|re.I)
-    if matchObj:
-        if "--verbose" in sys.argv:
+    if opcode == "print_tmp":
+        if verbose:
             print("\ntmp = %d\n" % proc_regs["tmp"])
         pc = pc + 1
         return -99
-    matchObj = re.match(r'print\(flag\)', instr_t, re.M|re.I)
-    if matchObj:
-        if "--verbose" in sys.argv:
+    if opcode == "print_flag":
+        if verbose:
             print("\nflag = %d\n" % proc_regs["flag"])
         pc = pc + 1
         return -99
-    matchObj = re.match(r'print\(c(\d)\)', instr_t, re.M|re.I)
-    if matchObj:
-        reg = int(matchObj.group(1))
-        if reg > 1:
-            print("\n[Line %4d] %s\nERROR: No such register \"c%d\", please use \"c0\" or \"c1\"\n" % (lines[pc], instr, reg))
-            exit()
-        if "--verbose" in sys.argv:
+    if opcode == "print_c":
+        reg = int(args[0])
+        if verbose:
             print("\nc%d = %d\n" % (reg, proc_regs["c%d" % reg]))
         pc = pc + 1
         return -99
-    matchObj = re.match(r'print\(poly=(\d+)\)', instr_t, re.M|re.I)
-    if matchObj:
-        poly = int(matchObj.group(1))
-        if poly >= int(8192/param_n):
-            print("\n[Line %4d] %s\nERROR: No such polynomial \"poly = %d\", allowed polynomials for n = %d are 0 to %d\n" % (lines[pc], instr, poly, param_n, int(8192/param_n)))
-            exit()
-        if "--verbose" in sys.argv:
+    if opcode == "print_poly":
+        poly = int(args[0])
+        if verbose:
             print("\npoly[%d] = %s\n" % (poly, poly_mem[poly]))
         pc = pc + 1
         return -99
@@ -1537,145 +1518,351 @@ def instr_exec(instr, iter_count):
 # SAPPHIRE-SIM
 #====================================
 
-# Check arguments
-if len(sys.argv) < 7 or ("--prog" not in sys.argv) or ("--vdd" not in sys.argv) or ("--fmhz" not in sys.argv):
-    print("\nERROR: Incorrect arguments provided for simulator script")
-    print("Usage: python sim.py --prog <program_file_path>")
-    print("                     --vdd <voltage>")
-    print("                     --fmhz <frequency_mhz>")
-    print("                     [ --verbose ]")
-    print("                     [ --free_rw ]")
-    print("                     [ --plot_power ]")
-    print("                     [ --cdt <cdt_file_path> ]")
-    print("                     [ --iter <num_iterations> ]")
-    exit()
-
-# Check that program file exists
-if not os.path.exists(sys.argv[sys.argv.index("--prog") + 1]):
-    print("\nERROR: Program file %s does not exist" % sys.argv[2])
-    exit()
-
-# Check supply voltage
-vdd = float(sys.argv[sys.argv.index("--vdd") + 1])
-if vdd < 0.68 or vdd > 1.21:
-    print("\nERROR: Supply voltage outside acceptable range of 0.68-1.21 V\n")
-    exit()
-
-# Check operating frequency
+# Check supply voltage and operating frequency
 # fmax = 12 MHz at 0.68 V and 72 MHz at 1.1 V
 # Model fmax as a linear function of vdd (not exactly accurate but good enough for our simulator)
-fmhz = int(sys.argv[sys.argv.index("--fmhz") + 1])
-fmax = int(12 + (72-12)*(vdd - 0.68)/(1.1-0.68))
-if fmhz > fmax:
-    print("\nERROR: Operating frequency above maximum %d MHz at %0.2f V\n" % (fmax, vdd))
-    exit()
-
-defines = ["main"]
-ifdefs = []
-active_ifdef = "main"
-labels = {}
+def max_frequency(vdd):
+    return int(12 + (72-12)*(vdd - 0.68)/(1.1-0.68))
 
-# Read program file
-imem_f = open(sys.argv[sys.argv.index("--prog") + 1])
-imem = []
+def check_operating_point(vdd, fmhz):
+    if vdd < 0.68 or vdd > 1.21:
+        print("\nERROR: Supply voltage outside acceptable range of 0.68-1.21 V\n")
+        exit()
+    fmax = max_frequency(vdd)
+    if fmhz > fmax:
+        print("\nERROR: Operating frequency above maximum %d MHz at %0.2f V\n" % (fmax, vdd))
+        exit()
 
-# Process ifdefs
-for (i, instr) in enumerate(imem_f):
-    # Identify `define flags
-    matchObj = re.match(r'`define\s*(.+)', instr.strip(), re.M|re.I)
-    if matchObj:
-        defines.append(matchObj.group(1))
-        imem.append("")
-        continue
-    # Identify `ifdef flags
-    matchObj = re.match(r'`ifdef\s*(.+)', instr.strip(), re.M|re.I)
-    if matchObj:
-        ifdefs.append(active_ifdef)
-        active_ifdef = matchObj.group(1)
-        imem.append("")
-        continue
-    # Identify `endif flags
-    matchObj = re.match(r'`endif', instr.strip(), re.M|re.I)
-    if matchObj:
-        active_ifdef = ifdefs[-1]
-        ifdefs = ifdefs[:-1]
-        imem.append("")
-        continue
-    # Ignore instructions inside undeclared `ifdef blocks
-    if active_ifdef not in defines:
-        imem.append("")
-        continue
-    imem.append(instr)
-
-imem_f.close()
-
-# Remove comments
-imem = [re.sub(r'#.*$', "", instr) for instr in imem]
-
-# Remove empty lines and leading / trailing spaces
-lines = [i+1 for i in range(len(imem)) if imem[i].strip()]
-imem = [instr.strip() for instr in imem if instr.strip()]
-
-# Parse labels (labels must be followed by an instruction in the same line)
-for (i, instr) in enumerate(imem):
-    matchObj = re.match(r'([\w\d_]+)\s*:\s*(.+)', instr.strip(), re.M|re.I)
-    if matchObj:
-        label = matchObj.group(1)
-        labels[label] = i
-        imem[i] = matchObj.group(2)
-
-# Check if first instruction is "config"
-if not re.match(r'config.*', imem[0], re.M|re.I):
-    print("\nERROR: First instruction of program must be \"config\"\n")
-    exit()
-
-# Check if last instruction is "end"
-if not re.match(r'end', imem[len(imem)-1], re.M|re.I):
-    print("\nWARNING: Last instruction of program must be \"end\", appending \"end\" at the end of program\n")
-    imem.append("end")
+# Preprocessed programs are cached on disk, keyed by the program file contents, the define flags
+# and the instruction patterns, so that repeated runs of the same variant skip preprocessing
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".sim_cache")
+CACHE_VERSION = 2 # increment when the contents of cached programs change
+
+def program_cache_file(prog_text, prog_defines):
+    key = hashlib.sha256()
+    key.update(prog_text.encode())
+    key.update(("\n".join(sorted(set(prog_defines)))).encode())
+    key.update(repr(instr_patterns).encode())
+    key.update(("v%d" % CACHE_VERSION).encode())
+    return os.path.join(CACHE_DIR, key.hexdigest() + ".pkl")
+
+# Roots of unity and rejection sampling factors of primes outside "valid_q" are cached on disk by modulus
+NTT_CACHE_VERSION = 2 # increment when the computed parameters change
+NTT_CACHE_FILE = os.path.join(CACHE_DIR, "ntt_params_v%d.json" % NTT_CACHE_VERSION)
+
+def read_ntt_cache():
+    if not use_cache or not os.path.exists(NTT_CACHE_FILE):
+        return {}
+    cache_f = open(NTT_CACHE_FILE)
+    try:
+        ntt_cache = json.load(cache_f)
+    except ValueError:
+        ntt_cache = {}
+    cache_f.close()
+    return ntt_cache
+
+# Returns whether "q" can be configured with dimension "n", the roots of unity and rejection sampling factor
+# of a new prime with q = 1 mod 2n are computed (or read from the cache) and added to the tables in core.py
+def supported_modulus(n, q):
+    if q in valid_q:
+        return True
+    if q >= 2**24 or (q-1) % (2*n) != 0:
+        return False
+    if q in roots_of_unity:
+        return True
+    if not is_prime(q):
+        return False
+    ntt_cache = read_ntt_cache()
+    if str(q) not in ntt_cache:
+        ntt_cache[str(q)] = { "roots" : ntt_roots(q), "rej_fast_factor" : rej_fast_factor(q) }
+        if use_cache:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            cache_f = open(NTT_CACHE_FILE + ".%d.tmp" % os.getpid(), "w")
+            json.dump(ntt_cache, cache_f, indent=2, sort_keys=True)
+            cache_f.close()
+            os.replace(NTT_CACHE_FILE + ".%d.tmp" % os.getpid(), NTT_CACHE_FILE)
+    roots_of_unity[q] = dict([(int(k), omega) for (k, omega) in ntt_cache[str(q)]["roots"].items()])
+    rej_fast_factors[q] = ntt_cache[str(q)]["rej_fast_factor"]
+    return True
+
+# Read program file, process `ifdef blocks, parse labels and decode instructions
+# "prog_defines" are enabled in addition to the `define flags in the program file
+def load_program(prog_file, prog_defines=[]):
+    global imem
+    global lines
+    global labels
+    global idecode
+    global decode_ns
+    global sections
+
+    # Check that program file exists
+    if not os.path.exists(prog_file):
+        print("\nERROR: Program file %s does not exist" % prog_file)
+        exit()
 
-keccak_buf = ""
-proc_regs = {
-"r0"    : 0,
-"r1"    : 0,
-"reg"   : 0,
-"tmp"   : 0,
-"c0"    : 0,
-"c1"    : 0,
-"flag"  : 0,
-}
-poly_mem = []
-poly_tmp = []
-param_n = 0
-param_q = 0
-ticks = 0
-pc = 0
+    # Read program file
+    imem_f = open(prog_file)
+    prog_text = imem_f.read()
+    imem_f.close()
+
+    # Use cached program, if available
+    if use_cache:
+        cache_file = program_cache_file(prog_text, prog_defines)
+        if os.path.exists(cache_file):
+            cache_f = open(cache_file, "rb")
+            (imem, lines, labels, idecode, sections, warnings) = pickle.load(cache_f)
+            cache_f.close()
+            decode_ns = None
+            for warning in warnings:
+                print(warning)
+            verify_program()
+            return
+
+    defines = ["main"] + list(prog_defines)
+    ifdefs = []
+    active_ifdef = "main"
+    labels = {}
+    warnings = []
+    imem = []
+    imem_ifdefs = []
+
+    # Process ifdefs (and keep track of the innermost `ifdef block of each line)
+    for (i, instr) in enumerate(io.StringIO(prog_text)):
+        # Identify `define flags
+        matchObj = re.match(r'`define\s*(.+)', instr.strip(), re.M|re.I)
+        if matchObj:
+            defines.append(matchObj.group(1))
+            imem.append("")
+            continue
+        # Identify `ifdef flags
+        matchObj = re.match(r'`ifdef\s*(.+)', instr.strip(), re.M|re.I)
+        if matchObj:
+            ifdefs.append(active_ifdef)
+            active_ifdef = matchObj.group(1)
+            imem.append("")
+            continue
+        # Identify `endif flags
+        matchObj = re.match(r'`endif', instr.strip(), re.M|re.I)
+        if matchObj:
+            active_ifdef = ifdefs[-1]
+            ifdefs = ifdefs[:-1]
+            imem.append("")
+            continue
+        # Ignore instructions inside undeclared `ifdef blocks
+        if active_ifdef not in defines:
+            imem.append("")
+            continue
+        imem.append(instr)
+        imem_ifdefs.append((i, active_ifdef))
+    imem_ifdefs = dict(imem_ifdefs)
+
+    # Remove comments
+    imem = [re.sub(r'#.*$', "", instr) for instr in imem]
+
+    # Remove empty lines and leading / trailing spaces
+    lines = [i+1 for i in range(len(imem)) if imem[i].strip()]
+    imem = [instr.strip() for instr in imem if instr.strip()]
+
+    # Parse labels (labels must be followed by an instruction in the same line)
+    for (i, instr) in enumerate(imem):
+        matchObj = re.match(r'([\w\d_]+)\s*:\s*(.+)', instr.strip(), re.M|re.I)
+        if matchObj:
+            label = matchObj.group(1)
+            labels[label] = i
+            imem[i] = matchObj.group(2)
+
+    # Assign each instruction to a section, i.e. its `ifdef block ("main" outside `ifdef blocks)
+    # followed by the closest preceding label within the same block, if any
+    sections = []
+    section_label = None
+    for (i, instr) in enumerate(imem):
+        ifdef = imem_ifdefs[lines[i]-1]
+        if i > 0 and ifdef != imem_ifdefs[lines[i-1]-1]:
+            section_label = None
+        if i in labels.values():
+            section_label = [label for label in labels if labels[label] == i][0]
+        sections.append(ifdef if section_label is None else "%s/%s" % (ifdef, section_label))
+
+    # Check if first instruction is "config"
+    if not re.match(r'config.*', imem[0], re.M|re.I):
+        print("\nERROR: First instruction of program must be \"config\"\n")
+        exit()
 
-power = []
+    # Check if last instruction is "end"
+    if not re.match(r'end', imem[len(imem)-1], re.M|re.I):
+        warnings.append("\nWARNING: Last instruction of program must be \"end\", appending \"end\" at the end of program\n")
+        print(warnings[-1])
+        imem.append("end")
+        lines.append(lines[-1])
+        sections.append(sections[-1])
+
+    # Decode instructions
+    idecode = []
+    decode_ns = []
+    for instr in imem:
+        t_start = time.perf_counter_ns()
+        idecode.append(decode_instr(instr))
+        decode_ns.append(time.perf_counter_ns() - t_start)
+
+    # Save program to cache
+    if use_cache:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        cache_f = open(cache_file + ".%d.tmp" % os.getpid(), "wb")
+        pickle.dump((imem, lines, labels, idecode, sections, warnings), cache_f)
+        cache_f.close()
+        os.replace(cache_file + ".%d.tmp" % os.getpid(), cache_file)
+
+    # Check statically known operands (not cached, since they depend on the polynomial memory configuration)
+    verify_program()
+
+# Returns the errors of an operand of an instruction (see "instr_operands") for configured parameters "n" and "q"
+# (None if the instruction cannot be reached from a valid "config" instruction, then only checks independent of the
+# configuration are performed)
+def operand_errors(kind, index, name, args, config):
+    if isinstance(index, tuple):
+        val = sum([int(args[i]) for i in index])
+    else:
+        val = int(args[index])
+    if kind == "c" and val > 1:
+        return ["No such register \"c%d\", please use \"c0\" or \"c1\"" % val]
+    if kind == "r" and val > 1:
+        return ["No such register \"r%d\", allowed registers are r0 and r1" % val]
+    if kind == "imm16" and val >= 2**16:
+        return ["Value %d too big for 16-bit register \"%s\"" % (val, name.format(*args))]
+    if kind == "imm24" and val >= 2**24:
+        return ["Value %d too big for 24-bit register \"%s\"" % (val, name.format(*args))]
+    if kind == "prng" and val != 128 and val != 256:
+        return ["Only SHAKE-128 and SHAKE-256 are supported"]
+    if kind == "sha3" and val != 256 and val != 512:
+        return ["Only SHA3-256 and SHA3-512 are supported"]
+    if kind == "range32" and (val < 1 or val > 32):
+        return ["Value of \"%s\" must be in the range 1 to 32" % name]
+    if kind == "rho" and val not in [2, 4, 8, 16, 32, 64, 128]:
+        return ["Unsupported parameter \"rho = 1/%d\" (Valid \"rho\": [1/2, 1/4, 1/8, 1/16, 1/32, 1/64, 1/128])" % val]
+    if config is None:
+        return []
+    (n, q) = config
+    slots = int(mem_size/n)
+    if kind == "poly" and val >= slots:
+        return ["No such polynomial \"%s = %d\", allowed polynomials for n = %d are 0 to %d" % (name, val, n, slots-1)]
+    if kind == "index" and val >= n:
+        return ["Index \"%d\" out of range, allowed indices for n = %d are 0 to %d" % (val, n, n-1)]
+    if kind == "below_n" and val >= n:
+        return ["Value of \"%s\" too large, must be less than %d" % (name, n)]
+    if kind == "below_q" and val >= q:
+        return ["Value of \"%s\" too large, must be less than %d" % (name, q)]
+    if kind == "bank_pair":
+        (p0, p1) = (int(args[index[0]]), int(args[index[1]]))
+        if p0 < slots and p1 < slots and same_bank(p0, p1, n):
+            return ["Polynomial pair \"%s = %d, %s = %d\" is not allowed for n = %d, ensure that they are in different memory banks (polynomials %s)" % (name[0], p0, name[1], p1, n, bank_ranges(n))]
+    return []
+
+# Returns the errors of a "config" instruction
+def config_errors(n, q):
+    if n not in valid_n:
+        return ["Unsupported parameter \"n = %d\" (Valid \"n\": %s)" % (n, valid_n)]
+    if not supported_modulus(n, q):
+        return ["Unsupported parameter \"q = %d\" (Valid prime \"q\": %s or any prime q < 2**24 with q = 1 mod %d)" % (q, valid_q, 2*n)]
+    if n > mem_size/mem_banks:
+        return ["Unsupported parameter \"n = %d\" for polynomial memory of %d coefficients in %d banks (at most %d coefficients per bank)" % (n, mem_size, mem_banks, int(mem_size/mem_banks))]
+    return []
+
+# Static verification of the loaded program, all statically known operands (polynomials, memory bank pairs, indices,
+# registers, immediates, sampler parameters, operations and labels) are checked once, so that they are not checked
+# again on every execution of an instruction
+# Operands depending on "n" and "q" are checked for each configuration reaching the instruction along the control flow
+# All errors are reported (with line numbers) before exiting
+def verify_program():
+    # Configurations reaching each instruction (the first instruction is always "config")
+    configs = [set() for instr in imem]
+    configs[0].add(None)
+    pending = [0]
+    while len(pending) > 0:
+        pc = pending.pop()
+        (opcode, args) = idecode[pc]
+        if opcode == "config":
+            (n, q) = (int(args[0]), int(args[1]))
+            out = set([(n, q)]) if len(config_errors(n, q)) == 0 else set()
+        else:
+            out = configs[pc]
+        if opcode == "end":
+            next_pcs = []
+        elif opcode == "branch" and args[3] in labels:
+            next_pcs = [pc + 1, labels[args[3]]]
+        else:
+            next_pcs = [pc + 1]
+        for next_pc in next_pcs:
+            if next_pc < len(imem) and not out <= configs[next_pc]:
+                configs[next_pc] = configs[next_pc] | out
+                pending.append(next_pc)
+
+    errors = []
+    for (pc, (opcode, args)) in enumerate(idecode):
+        instr_errors = []
+        if opcode is None:
+            instr_errors.append("Instruction not supported")
+        elif opcode == "config":
+            instr_errors = instr_errors + config_errors(int(args[0]), int(args[1]))
+        elif opcode == "c_addsub" and args[0] != args[1]:
+            instr_errors.append("Must use \"c0 = c0 +/- <val>\" or \"c1 = c1 +/- <val>\"")
+        elif opcode == "tmp_alu" and args[0] not in tmp_alu_ops:
+            instr_errors.append("Unsupported operation \"%s\", allowed operators are {+, -, *, &, |, ^, >>, <<}" % args[0])
+        elif opcode == "poly_op" and args[0] not in supported_poly_ops:
+            instr_errors.append("Unsupported operation \"%s\", allowed operations are %s" % (args[0], supported_poly_ops))
+        elif opcode == "inf_norm_check" and int(args[1]) >= 2**24:
+            instr_errors.append("Parameter \"bound = %d\" too large, must be less than 2**24" % int(args[1]))
+        elif opcode == "branch" and args[3] not in labels:
+            instr_errors.append("Label \"%s\" not found" % args[3])
+        elif opcode == "set_op":
+            vdd = float(args[0])
+            fmhz = int(args[1])
+            if vdd < 0.68 or vdd > 1.21:
+                instr_errors.append("Supply voltage outside acceptable range of 0.68-1.21 V")
+            elif fmhz < 1 or fmhz > max_frequency(vdd):
+                instr_errors.append("Operating frequency outside acceptable range of 1-%d MHz at %0.2f V" % (max_frequency(vdd), vdd))
+        for config in sorted(configs[pc], key=lambda config: (0, 0) if config is None else config) or [None]:
+            for (kind, index, name) in instr_operands.get(opcode, []):
+                instr_errors = instr_errors + operand_errors(kind, index, name, args, config)
+            if opcode in ["transform", "mult_psi", "mult_psi_inv"] and config is not None and 2*config[0] not in roots_of_unity[config[1]]:
+                instr_errors.append("2n-th root of unity modulo q does not exist for \"n = %d\" and \"q = %d\"" % config)
+        for error in sorted(set(instr_errors), key=instr_errors.index):
+            errors.append("\n[Line %4d] %s\nERROR: %s" % (lines[pc], imem[pc], error))
+
+    if len(errors) > 0:
+        for error in errors:
+            print(error)
+        print("\n%d error(s) found in program\n" % len(errors))
+        exit()
 
-# Read CDT file, if provided
-if "--cdt" in sys.argv:
-    if not os.path.exists(sys.argv[sys.argv.index("--cdt") + 1]):
-        print("\nERROR: CDT file %s does not exist" % sys.argv[sys.argv.index("--cdt") + 1])
+# Read CDT file
+def load_cdt(cdt_file):
+    if not os.path.exists(cdt_file):
+        print("\nERROR: CDT file %s does not exist" % cdt_file)
         exit()
-    cdt_mem = open(sys.argv[sys.argv.index("--cdt") + 1])
-    cdt_mem = [cdval.strip() for cdval in cdt_mem if cdval.strip()]
-    cdt_mem = [int(cdval) for cdval in cdt_mem]
-    if len(cdt_mem) > 64:
+    cdt_f = open(cdt_file)
+    cdt = [cdval.strip() for cdval in cdt_f if cdval.strip()]
+    cdt = [int(cdval) for cdval in cdt]
+    cdt_f.close()
+    if len(cdt) > 64:
         print("\nERROR: CDT is longer than 64 entries")
         exit()
+    return cdt
 
-num_iters = 1
-
-# Read number of iterations, if provided
-if "--iter" in sys.argv:
-    num_iters = int(sys.argv[sys.argv.index("--iter") + 1])
-
-ticks_arr = []
-power_arr = []
-energy_arr = []
+# Execute one iteration of the loaded program, returns the number of instructions executed
+def run_iteration(iter_count):
+    global keccak_buf
+    global ticks
+    global pc
+    global power
+    global unit_stats
+    global section_stats
+    global current_section
+    global power_stats
+    global interface_stats
+    global dma_until
+    global op_segments
+    global stream_op_point
 
-for i in range(num_iters):
     keccak_buf = ""
     proc_regs["r0"] = 0
     proc_regs["r1"] = 0
@@ -1687,12 +1874,40 @@ for i in range(num_iters):
     ticks = 0
     pc = 0
     power = []
+    unit_stats = {}
+    section_stats = {}
+    power_stats = sketch_new()
+    interface_stats = { "transfers" : 0, "words" : 0, "cycles" : 0, "background_cycles" : 0, "stall_cycles" : 0 }
+    dma_until = 0
+    op_segments = [op_segment(*sim_op_point)]
+    stream_op_point = sim_op_point
+    if mem_usage:
+        mem_usage_reset()
+    if gating:
+        del gating_log[:]
+    if overlap:
+        overlap_reset()
+
+    if trace_f is not None:
+        trace_event({ "name" : "thread_name", "ph" : "M", "pid" : 0, "tid" : iter_count, "args" : { "name" : "Iteration %d" % (iter_count+1) } })
 
     # The lattice-crypto core is not pipelined
     # Requires 1 cycle to fetch and >= 1 cycles to decode and execute instruction
     instr_count = 0
     while (1):
-        if "--verbose" in sys.argv:
+        current_section = sections[pc]
+        if trace_f is not None:
+            trace_pc = pc
+            trace_ticks = ticks
+            del trace_charges[:]
+        if tail_latency:
+            tail_pc = pc
+            tail_ticks = ticks
+        if overlap:
+            overlap_pc = pc
+            overlap_ticks = ticks
+            del trace_charges[:]
+        if verbose:
             if pc in labels.values():
                 for (label, label_pc) in labels.items():
                     if label_pc == pc:
@@ -1700,7 +1915,35 @@ for i in range(num_iters):
                 print("[%3d] %s : %s" %(pc, label, imem[pc]))
             else:
                 print("[%3d] %s" %(pc, imem[pc]))
-        ret = instr_exec(imem[pc], i)
+        if mem_usage:
+            mem_usage_instr(idecode[pc], ticks)
+        # Stall until a background transfer the instruction depends on has completed
+        if dma_until > ticks and dma_dependent(*idecode[pc]):
+            interface_stats["stall_cycles"] = interface_stats["stall_cycles"] + (dma_until - ticks)
+            charge("interface_wait", dma_until - ticks)
+        if profile_host:
+            instr_pc = pc
+            ticks_start = ticks
+            charge_ns_start = charge_ns
+            t_start = time.perf_counter_ns()
+            ret = instr_exec(imem[pc], idecode[pc], iter_count)
+            t_exec = time.perf_counter_ns() - t_start
+            if instr_pc not in host_profile:
+                host_profile[instr_pc] = [0, 0, 0, 0]
+            host_profile[instr_pc][0] = host_profile[instr_pc][0] + 1
+            host_profile[instr_pc][1] = host_profile[instr_pc][1] + (ticks - ticks_start)
+            host_profile[instr_pc][2] = host_profile[instr_pc][2] + (t_exec - (charge_ns - charge_ns_start))
+            host_profile[instr_pc][3] = host_profile[instr_pc][3] + (charge_ns - charge_ns_start)
+        else:
+            ret = instr_exec(imem[pc], idecode[pc], iter_count)
+        if trace_f is not None:
+            trace_instr(iter_count, trace_pc, trace_ticks)
+        if overlap:
+            overlap_instr(overlap_pc, overlap_ticks)
+        if tail_latency and ticks > tail_ticks:
+            if tail_pc not in tail_cycles:
+                tail_cycles[tail_pc] = []
+            tail_cycles[tail_pc].append(ticks - tail_ticks)
 
         # Invalid instruction
         if ret == -1:
@@ -1714,7 +1957,23 @@ for i in range(num_iters):
         if ret == 99:
             break
 
-    # Convert current to power at specified operating condition
+    return instr_count
+
+# All randomness of the simulator is drawn from two independent generators, so that runs are reproducible
+# for a given seed: "func_rng" for functional data ("random" instructions, clobbered registers and polynomials)
+# and "noise_rng" for power noise (vectorized), seeded from a separate substream of the same seed
+# Seed "None" draws fresh entropy from the operating system
+def seed_rng(seed):
+    global func_rng
+    global noise_rng
+
+    func_rng = random.Random(seed)
+    noise_rng = np.random.default_rng(np.random.SeedSequence(seed).spawn(1)[0])
+
+# Convert current to power at specified operating condition, returns leakage current
+def convert_power(vdd, fmhz):
+    global power
+
     # Take into account the fact that leakage power and dynamic power scale differently
     # Leakage current is assumed independent of processor state and operating frequency
     # i_leak = 102.6 uA at 0.70 V
@@ -1728,29 +1987,190 @@ for i in range(num_iters):
     # i_leak = 355.7 uA at 1.10 V
     # Model leakage current as an exponential function of vdd (pretty accurate, curve-fitted from measurements)
     # Model active current as proportional to vdd and fmhz (again, not exactly accurate but good enough for our simulator)
-    i_leak = 11.728*math.exp(3.0933*vdd)
-    power = [(i_leak + ((idd - 355.7)*(fmhz/72)*(vdd/1.1))) for idd in power]
-
-    # Add some tiny random noise (+/-1%) to current values
-    power = [idd + random.randrange(-int(idd/100),int(idd/100)) for idd in power]
+    # Leakage of the polynomial memory scales with its size (see "--mem_size")
+    # Each operating point segment (see "set_op") is converted at its own vdd and fmhz
+    i_leak = leakage_current(vdd)
+    if stream_power:
+        return i_leak
+    current = np.asarray(power, dtype=float)
+    supply = np.zeros(len(power))
+    for (segment, end) in zip(op_segments, [segment["start"] for segment in op_segments[1:]] + [len(power)]):
+        (seg_vdd, seg_fmhz, start) = (segment["vdd"], segment["fmhz"], segment["start"])
+        current[start:end] = leakage_current(seg_vdd) + ((current[start:end] - i_leak_ref)*freq_scale(seg_fmhz)*volt_scale(seg_vdd))
+        supply[start:end] = seg_vdd
+
+    # Add some tiny random noise (+/-1%) to current values (at least +/-1 uA, e.g. for leakage-only cycles at low vdd)
+    bound = np.maximum((current/100).astype(np.int64), 1)
+    current = current + noise_rng.integers(-bound, bound)
 
     # Finally, convert current to power
-    power = [idd*vdd for idd in power]
-
-    if num_iters > 1:
-        print("\n[iter = %d]" % (i+1))
+    power = (current*supply).tolist()
+
+    return i_leak
+
+# Energy (without noise) of "cycles" cycles drawing a total of "idd_sum" (sum of per-cycle currents at the reference operating point)
+def energy_pj(cycles, idd_sum, vdd, fmhz):
+    i_leak = leakage_current(vdd)
+    return vdd*((i_leak*cycles) + ((idd_sum - i_leak_ref*cycles)*freq_scale(fmhz)*volt_scale(vdd)))/fmhz
+
+# Summarize program execution (call after "convert_power")
+# Energy of each hardware unit is computed from its average current, without noise
+# Time and energy are accumulated over the operating point segments (see "set_op")
+def summarize(instr_count, vdd, fmhz):
+    units = {}
+    section_summaries = {}
+    segments = []
+    for (segment, end) in zip(op_segments, op_segments[1:] + [op_segment(None, None)]):
+        (seg_vdd, seg_fmhz) = (segment["vdd"], segment["fmhz"])
+        for (stats, key) in [(units, "units"), (section_summaries, "sections")]:
+            for (name, (end_ticks, end_idd)) in end[key].items():
+                (start_ticks, start_idd) = segment[key].get(name, (0, 0))
+                if end_ticks == start_ticks and end_idd == start_idd:
+                    continue
+                if name not in stats:
+                    stats[name] = { "cycles": 0, "energy_pj": 0 }
+                stats[name]["cycles"] = stats[name]["cycles"] + (end_ticks - start_ticks)
+                stats[name]["energy_pj"] = stats[name]["energy_pj"] + energy_pj(end_ticks - start_ticks, end_idd - start_idd, seg_vdd, seg_fmhz)
+        seg_power = end["power_sum"] - segment["power_sum"] if stream_power else sum(power[segment["start"]:end["start"]])
+        segments.append({ "vdd" : seg_vdd, "fmhz" : seg_fmhz, "cycles" : end["start"] - segment["start"], "time_us" : (end["start"] - segment["start"])/seg_fmhz,
+                          "energy_pj" : seg_power/seg_fmhz + segment["transition_pj"], "transition_pj" : segment["transition_pj"] })
+        if segment["transition_pj"] > 0:
+            units.setdefault("dvfs", { "cycles": 0, "energy_pj": 0 })
+            units["dvfs"]["energy_pj"] = units["dvfs"]["energy_pj"] + segment["transition_pj"]
+    time_us = sum([segment["time_us"] for segment in segments])
+    total_energy_pj = sum([segment["energy_pj"] for segment in segments])
+    # Average power over time, which is the average per-cycle power at a single operating point
+    if len(segments) == 1:
+        avg_power_uw = (power_stats["sum"] if stream_power else sum(power))/ticks
     else:
-        print("\n")
+        avg_power_uw = total_energy_pj/time_us
+    summary = {
+        "instructions"  : instr_count,
+        "cycles"        : ticks,
+        "time_us"       : time_us,
+        "avg_power_uw"  : avg_power_uw,
+        "energy_pj"     : total_energy_pj,
+        "units"         : units,
+        "sections"      : section_summaries,
+    }
+    if len(segments) > 1:
+        summary["op_points"] = op_point_summary(segments)
+    if stream_power:
+        summary["power_stats"] = power_stats_summary(power_stats)
+    if overlap:
+        summary["overlap"] = overlap_summary(vdd, fmhz)
+    if interface_report:
+        summary["interface"] = interface_summary(fmhz)
+    if mem_usage:
+        summary["memory"] = mem_usage_summary()
+    if gating:
+        summary["gating"] = gating_summary(vdd, fmhz)
+    if optimize:
+        summary["unit_stats"] = dict([(unit, list(stats)) for (unit, stats) in unit_stats.items()])
+    return summary
+
+# Time and energy per operating point, over all segments at the same operating point
+def op_point_summary(segments):
+    op_points = []
+    for segment in segments:
+        matches = [op_point for op_point in op_points if (op_point["vdd"], op_point["fmhz"]) == (segment["vdd"], segment["fmhz"])]
+        if len(matches) == 0:
+            matches = [{ "vdd" : segment["vdd"], "fmhz" : segment["fmhz"], "segments" : 0, "cycles" : 0, "time_us" : 0, "energy_pj" : 0 }]
+            op_points.append(matches[0])
+        for key in ["cycles", "time_us", "energy_pj"]:
+            matches[0][key] = matches[0][key] + segment[key]
+        matches[0]["segments"] = matches[0]["segments"] + 1
+    return op_points
+
+# Polynomial memory usage (see "--mem_usage")
+# A value is live in its slot from the instruction writing it to the last instruction reading it, so that the peak
+# number of live values is the number of slots needed by the program if values were allocated to slots optimally
+def mem_usage_reset():
+    global mem_state
+
+    mem_state = { "step" : 0, "ticks" : [], "live" : {}, "intervals" : [], "written" : set() }
+
+def mem_usage_close(slot, step):
+    (start, end) = mem_state["live"].pop(slot)
+    mem_state["intervals"].append((start, min(end, step) if end is not None else start + 1))
+
+def mem_usage_instr(decoded, start_ticks):
+    state = mem_state
+    step = state["step"]
+    state["step"] = step + 1
+    state["ticks"].append(start_ticks)
+    if decoded[0] is None:
+        return
+    # Polynomial memory is cleared by "config"
+    if decoded[0] == "config":
+        for slot in list(state["live"]):
+            mem_usage_close(slot, step)
+        return
+    operands = overlap_operands(*decoded)
+    if operands is None:
+        return
+    (reads, writes) = operands
+    for slot in reads:
+        if slot in state["live"]:
+            state["live"][slot][1] = step + 1
+    for slot in writes:
+        if slot.startswith("poly"):
+            if slot in state["live"]:
+                mem_usage_close(slot, step)
+            state["live"][slot] = [step, None]
+            state["written"].add(slot)
+
+def mem_usage_summary():
+    for slot in list(mem_state["live"]):
+        mem_usage_close(slot, mem_state["step"])
+    events = sorted([(start, 1) for (start, end) in mem_state["intervals"]] + [(end, -1) for (start, end) in mem_state["intervals"]], key=lambda event: (event[0], event[1]))
+    (live, peak, peak_step) = (0, 0, 0)
+    for (step, delta) in events:
+        live = live + delta
+        if live > peak:
+            (peak, peak_step) = (live, step)
+    return {
+        "size"              : mem_size,
+        "banks"             : mem_banks,
+        "n"                 : param_n,
+        "slots"             : poly_slots,
+        "slots_used"        : len(mem_state["written"]),
+        "peak_live_slots"   : peak,
+        "peak_cycle"        : mem_state["ticks"][peak_step] if peak_step < len(mem_state["ticks"]) else ticks,
+    }
+
+# Interface-bound cycles are those for which the core is busy transferring or stalled on a background transfer
+def interface_summary(fmhz):
+    bound_cycles = interface_stats["cycles"] + interface_stats["stall_cycles"]
+    return dict(interface_stats, model=interface_model, bound_cycles=bound_cycles, bound_time_us=bound_cycles/fmhz)
+
+def power_stats_summary(sketch):
+    return {
+        "min_power_uw"  : sketch["min"],
+        "p50_power_uw"  : sketch_quantile(sketch, 0.5),
+        "p90_power_uw"  : sketch_quantile(sketch, 0.9),
+        "p99_power_uw"  : sketch_quantile(sketch, 0.99),
+        "max_power_uw"  : sketch["max"],
+        "sketch"        : sketch,
+    }
+
+def print_power_stats(stats, indent):
+    for (name, key) in [("Min Power", "min_power_uw"), ("P50 Power", "p50_power_uw"), ("P90 Power", "p90_power_uw"), ("P99 Power", "p99_power_uw"), ("Peak Power", "max_power_uw")]:
+        if stats[key] < 1e3:
+            print("%s%-15s%0.2f uW" % (indent, name + ":", stats[key]))
+        else:
+            print("%s%-15s%0.2f mW" % (indent, name + ":", stats[key]/1e3))
+
+def print_summary(summary, vdd, fmhz):
     print("------------------------------------------------------")
     print("Program Execution Summary (at %0.2f V and %d MHz)" % (vdd, fmhz))
     print("------------------------------------------------------")
 
-    print("* Instructions:  %d" % instr_count)
+    print("* Instructions:  %d" % summary["instructions"])
 
-    print("* Total Cycles:  %s" % format(ticks, ',d'))
-    ticks_arr.append(ticks)
+    print("* Total Cycles:  %s" % format(summary["cycles"], ',d'))
 
-    time_us = ticks/fmhz
+    time_us = summary["time_us"]
     if time_us < 1e3:
         print("* Total Time:    %0.2f us" % (time_us))
     elif time_us < 1e6:
@@ -1758,53 +2178,1254 @@ for i in range(num_iters):
     elif time_us < 1e9:
         print("* Total Time:    %0.2f s" % (time_us/1e6))
 
-    avg_power_uw = sum(power)/ticks
+    avg_power_uw = summary["avg_power_uw"]
     if avg_power_uw < 1e3:
         print("* Average Power: %0.2f uW" % (avg_power_uw))
     elif avg_power_uw < 1e6:
         print("* Average Power: %0.2f mW" % (avg_power_uw/1e3))
-    power_arr.append(avg_power_uw)
 
-    energy_pj = sum(power)/fmhz
+    energy_pj = summary["energy_pj"]
     if energy_pj < 1e3:
         print("* Total Energy:  %0.2f pJ" % (energy_pj))
     elif energy_pj < 1e6:
         print("* Total Energy:  %0.2f nJ" % (energy_pj/1e3))
     elif energy_pj < 1e9:
         print("* Total Energy:  %0.2f uJ" % (energy_pj/1e6))
-    energy_arr.append(energy_pj)
+
+    if "power_stats" in summary:
+        print_power_stats(summary["power_stats"], "* ")
+
+    if "interface" in summary:
+        interface = summary["interface"]
+        print("* Interface:     %s cycles (%0.1f%%), %0.2f us [%s]" % (format(interface["bound_cycles"], ',d'), 100*interface["bound_cycles"]/summary["cycles"], interface["bound_time_us"], interface["model"]))
+        print("* Transfers:     %d (%s words)" % (interface["transfers"], format(interface["words"], ',d')))
+        if interface["model"] == "dma":
+            print("* DMA Overlap:   %s of %s cycles" % (format(interface["background_cycles"] - interface["stall_cycles"], ',d'), format(interface["background_cycles"], ',d')))
+
+    if "op_points" in summary:
+        print("* Operating Points:")
+        for op_point in summary["op_points"]:
+            print("    %0.2f V, %3d MHz: %s cycles in %d segment(s), %0.2f us, %0.2f nJ" % (op_point["vdd"], op_point["fmhz"], format(op_point["cycles"], ',d'), op_point["segments"], op_point["time_us"], op_point["energy_pj"]/1e3))
+
+    if "memory" in summary:
+        memory = summary["memory"]
+        print("* Poly Memory:   %d slots of n = %d (%d coefficients in %d banks)" % (memory["slots"], memory["n"], memory["size"], memory["banks"]))
+        print("* Slots Used:    %d (peak %d live at cycle %s)" % (memory["slots_used"], memory["peak_live_slots"], format(memory["peak_cycle"], ',d')))
 
     print("------------------------------------------------------")
     print("\n")
 
-# Print average cycles and energy, only in case of multiple iterations
-if num_iters > 1:
-    print("Over %d Iterations:" % (num_iters))
-    avg_ticks = math.ceil(sum(ticks_arr)/len(ticks_arr))
+# Print average cycles and energy over multiple iterations
+def print_average(summaries):
+    print("Over %d Iterations:" % (len(summaries)))
+    avg_ticks = math.ceil(sum([s["cycles"] for s in summaries])/len(summaries))
     print("    Average Cycles: %s" % (format(avg_ticks, ',d')))
-    avg_avg_power_uw = sum(power_arr)/len(power_arr)
+    avg_avg_power_uw = sum([s["avg_power_uw"] for s in summaries])/len(summaries)
     if avg_avg_power_uw < 1e3:
         print("    Average Power:  %0.2f uW" % (avg_avg_power_uw))
     elif avg_avg_power_uw < 1e6:
         print("    Average Power:  %0.2f mW" % (avg_avg_power_uw/1e3))
-    avg_energy_pj = sum(energy_arr)/len(energy_arr)
+    avg_energy_pj = sum([s["energy_pj"] for s in summaries])/len(summaries)
     if avg_energy_pj < 1e3:
         print("    Average Energy: %0.2f pJ" % (avg_energy_pj))
     elif avg_energy_pj < 1e6:
         print("    Average Energy: %0.2f nJ" % (avg_energy_pj/1e3))
     elif avg_energy_pj < 1e9:
         print("    Average Energy: %0.2f uJ" % (avg_energy_pj/1e6))
+    if "power_stats" in summaries[0]:
+        print_power_stats(power_stats_summary(sketch_merge([s["power_stats"]["sketch"] for s in summaries])), "    ")
+
+# Search all operating points (vdd in steps of 10 mV, integer fmhz up to fmax) for the one executed program,
+# using the same leakage and active current models as "convert_power" (without noise)
+# "stats" holds [cycles, sum of per-cycle currents] per hardware unit, as "unit_stats"
+def optimize_operating_point(stats, latency_us=None):
+    cycles = sum([unit_ticks for (unit_ticks, unit_idd) in stats.values()])
+    idd_sum = sum([unit_idd for (unit_ticks, unit_idd) in stats.values()])
+    points = []
+    for i in range(54):
+        vdd = round(0.68 + 0.01*i, 2)
+        for fmhz in range(1, max_frequency(vdd) + 1):
+            point_energy_pj = energy_pj(cycles, idd_sum, vdd, fmhz)
+            points.append({ "vdd" : vdd, "fmhz" : fmhz, "time_us" : cycles/fmhz, "energy_pj" : point_energy_pj, "edp" : point_energy_pj*cycles/fmhz })
+    optimal = {
+        "energy"    : min(points, key=lambda point: point["energy_pj"]),
+        "edp"       : min(points, key=lambda point: point["edp"]),
+    }
+    if latency_us is not None:
+        feasible = [point for point in points if point["time_us"] <= latency_us]
+        optimal["latency"] = min(feasible, key=lambda point: point["energy_pj"]) if len(feasible) > 0 else None
+    return optimal
+
+# Mean of "unit_stats" over the iterations in "summaries" (see "--optimize")
+def mean_unit_stats(summaries):
+    stats = {}
+    for summary in summaries:
+        for (unit, (unit_ticks, unit_idd)) in summary["unit_stats"].items():
+            if unit not in stats:
+                stats[unit] = [0, 0]
+            stats[unit][0] = stats[unit][0] + unit_ticks/len(summaries)
+            stats[unit][1] = stats[unit][1] + unit_idd/len(summaries)
+    return stats
+
+def print_optimal_points(optimal, latency_us=None):
+    print("------------------------------------------------------------------------------")
+    print("Optimal Operating Points")
+    print("------------------------------------------------------------------------------")
+    print("%-28s %8s %6s %12s %12s %14s" % ("Objective", "Vdd (V)", "MHz", "Time (us)", "Energy (nJ)", "EDP (nJ*us)"))
+    rows = [("Minimum energy", optimal["energy"]), ("Minimum energy-delay", optimal["edp"])]
+    if latency_us is not None:
+        rows.append(("Min. energy, <= %0.2f us" % latency_us, optimal["latency"]))
+    for (name, point) in rows:
+        if point is None:
+            print("%-28s %s" % (name, "not feasible (latency below minimum at 1.21 V)"))
+        else:
+            print("%-28s %8.2f %6d %12.2f %12.3f %14.3f" % (name, point["vdd"], point["fmhz"], point["time_us"], point["energy_pj"]/1e3, point["edp"]/1e3))
+    print("------------------------------------------------------------------------------")
+    print("\n")
 
-# Plot power profile, only in case of single iteration
-if "--plot_power" in sys.argv and num_iters == 1:
-    power = [i_leak] + power
+# Static estimation (see "--estimate")
+# Probability with which the tail bound of a data-dependent instruction may be exceeded
+TAIL_EPSILON = 1e-9
+
+def fixed_charge(unit, cycles):
+    return (unit, cycles, cycles, 0, cycles, cycles)
+
+# Cycles charged by an instruction, evaluated from operands and (n, q) without executing it, with the same costs
+# as "instr_exec" (see "instr_costs" and "sampler_costs")
+# Returns a list of (unit, minimum, mean, variance, maximum, tail bound) cycles, samplers are modeled by the number of draws
+def static_charges(opcode, args, n, q):
+    costs = instr_costs(opcode, args, n)
+    if costs is not None:
+        charges = [fixed_charge(unit, cycles) for (unit, cycles) in costs]
+        if opcode == "set_op":
+            charges.append(fixed_charge("dvfs", dvfs_cycles(int(args[1]))))
+        return charges
+    if "_sample" in opcode:
+        pseudo = opcode.endswith("_pseudo")
+        sampler = opcode[:-len("_pseudo")] if pseudo else opcode
+        (unit, extra) = sampler_costs(opcode)
+        mode = int(args[0])
+        params = [int(arg) for arg in args[4 if pseudo else 2:-1]]
+        if sampler == "bin_sample":
+            return [fixed_charge(unit, extra + sampler_cycles(sampler, n, mode, binomial_words(n, params[0])))]
+        if sampler == "cdt_sample":
+            if cdt_mem is None:
+                print("\nERROR: CDT not provided for \"%s\", please use \"--cdt\"\n" % opcode)
+                exit()
+            return [fixed_charge(unit, extra + sampler_cycles(sampler, n, mode, n, len(cdt_mem)))]
+        if sampler == "tri_sample_3":
+            return [fixed_charge(unit, extra + sampler_cycles(sampler, n, mode, n))]
+        if sampler == "rej_sample":
+            (draws, per_draw) = (rejection_draws(n, rej_fast_factors[q]*q), 1)
+        if sampler == "uni_sample":
+            (draws, per_draw) = (rejection_draws(n, 2*params[0]+1), 1)
+        if sampler in ["tri_sample_1", "tri_sample_2"]:
+            (draws, per_draw) = (distinct_draws(n, sum(params)), 2)
+        cycles = [extra + sampler_cycles(sampler, n, mode, count) for count in [draws[0], draws[1], draws[3], draws_tail_bound(draws, TAIL_EPSILON)]]
+        # Cycles per draw (sampling and SHAKE squeezing), for the variance
+        slope = per_draw + (29/42 if mode == 128 else 33/34)
+        return [(unit, cycles[0], cycles[1], draws[2]*slope**2, cycles[2], cycles[3])]
+    if free_rw:
+        return []
+    # Background transfers are assumed to be hidden behind compute (see "--interface dma")
+    if opcode in ["random_r", "load_r", "save_r", "random_poly", "load_poly", "save_poly"]:
+        (unit, words, write) = interface_transfer(opcode, n)
+        return [fixed_charge(unit, interface_cycles(words, write)[0])]
+    return []
+
+# Walk the loaded program from the first instruction to "end" without executing it, assuming that branches
+# are not taken, returns estimated cycles and energy (minimum, mean, standard deviation, maximum) per hardware unit
+# and the tail bound of the cycle count, exceeded with probability at most TAIL_EPSILON per data-dependent instruction
+def estimate_program(vdd, fmhz):
+    t_start = time.perf_counter()
+    n = 0
+    q = 0
+    units = {}
+    tail_cycles = 0
+    random_instrs = 0
+    branches = []
+    instr_count = 0
+    pc = 0
+    while pc < len(imem):
+        (opcode, args) = idecode[pc]
+        if opcode is None:
+            print("\n[Line %4d] %s\nERROR: Instruction not supported\n" % (lines[pc], imem[pc]))
+            exit()
+        if opcode == "config":
+            n = int(args[0])
+            q = int(args[1])
+            if n not in valid_n:
+                print("\n[Line %4d] %s\nERROR: Unsupported parameter \"n = %d\" (Valid \"n\": %s)\n" % (lines[pc], imem[pc], n, valid_n))
+                exit()
+            if not supported_modulus(n, q):
+                print("\n[Line %4d] %s\nERROR: Unsupported parameter \"q = %d\" (Valid prime \"q\": %s or any prime q < 2**24 with q = 1 mod %d)\n" % (lines[pc], imem[pc], q, valid_q, 2*n))
+                exit()
+        elif n == 0 and opcode not in ["nop", "end"] and not opcode.startswith("print") and not opcode.endswith("_r"):
+            print("\n[Line %4d] %s\nERROR: Parameters \"n\" and \"q\" must be configured before this instruction\n" % (lines[pc], imem[pc]))
+            exit()
+        for (unit, cycles_min, cycles_mean, cycles_var, cycles_max, cycles_tail) in static_charges(opcode, args, n, q):
+            if unit not in units:
+                units[unit] = [0, 0, 0, 0]
+            units[unit] = [units[unit][0] + cycles_min, units[unit][1] + cycles_mean, units[unit][2] + cycles_var, units[unit][3] + cycles_max]
+            tail_cycles = tail_cycles + cycles_tail
+            if cycles_var > 0:
+                random_instrs = random_instrs + 1
+        if opcode == "branch":
+            branches.append(lines[pc])
+        if opcode not in ["nop", "set_op", "encode_compare", "encode_print"] and not opcode.startswith("random") and not opcode.startswith("load") and not opcode.startswith("save") and not opcode.startswith("print"):
+            instr_count = instr_count + 1
+        if opcode == "end":
+            break
+        pc = pc + 1
+
+    # Energy is linear in cycles for each unit
+    estimate = { "instructions" : instr_count, "branches" : branches, "units" : {} }
+    for (unit, (cycles_min, cycles_mean, cycles_var, cycles_max)) in units.items():
+        idd = unit_idd(unit, q)
+        cycle_pj = energy_pj(1, idd, vdd, fmhz)
+        estimate["units"][unit] = {
+            "cycles"    : [cycles_min, cycles_mean, math.sqrt(cycles_var), cycles_max],
+            "energy_pj" : [cycle_pj*cycles_min, cycle_pj*cycles_mean, cycle_pj*math.sqrt(cycles_var), cycle_pj*cycles_max],
+        }
+    for key in ["cycles", "energy_pj"]:
+        estimate[key] = [sum([stats[key][i] for stats in estimate["units"].values()]) for i in [0, 1, 3]]
+        # Draws of different samplers are independent
+        estimate[key].insert(2, math.sqrt(sum([stats[key][2]**2 for stats in estimate["units"].values()])))
+    estimate["time_us"] = [cycles/fmhz for cycles in estimate["cycles"]]
+    # Union bound over data-dependent instructions
+    estimate["tail_cycles"] = tail_cycles
+    estimate["tail_probability"] = random_instrs*TAIL_EPSILON
+    estimate["estimate_ms"] = 1e3*(time.perf_counter() - t_start)
+    return estimate
+
+def print_estimate(estimate, vdd, fmhz):
+    print("------------------------------------------------------------------------------")
+    print("Static Estimate (at %0.2f V and %d MHz, computed in %0.2f ms)" % (vdd, fmhz, estimate["estimate_ms"]))
+    print("------------------------------------------------------------------------------")
+    print("Instructions: %s" % (format(estimate["instructions"], ',d')))
+    for (name, key, scale, fmt) in [("Cycles", "cycles", 1, "%0.0f"), ("Time (us)", "time_us", 1, "%0.2f"), ("Energy (nJ)", "energy_pj", 1e3, "%0.3f")]:
+        (val_min, val_mean, val_std, val_max) = [val/scale for val in estimate[key]]
+        # Range of +/- 3 standard deviations around the mean, within the bounds
+        print(("%-14s%12s  (+/- 3 sd: " + fmt + " - " + fmt + ", bounds: " + fmt + " - " + fmt + ")") % (name, fmt % val_mean, max(val_min, val_mean - 3*val_std), min(val_max, val_mean + 3*val_std), val_min, val_max))
+    print("%-14s%12d  (%0.2f us, exceeded with probability < %0.0e)" % ("Tail Bound", estimate["tail_cycles"], estimate["tail_cycles"]/fmhz, max(estimate["tail_probability"], TAIL_EPSILON)))
+    print("------------------------------------------------------------------------------")
+    print("%-20s %14s %14s %14s %14s" % ("Hardware Unit", "Min Cycles", "Mean Cycles", "Max Cycles", "Energy (nJ)"))
+    for (unit, stats) in sorted(estimate["units"].items(), key=lambda item: -item[1]["cycles"][1]):
+        print("%-20s %14d %14.0f %14d %14.3f" % (unit, stats["cycles"][0], stats["cycles"][1], stats["cycles"][3], stats["energy_pj"][1]/1e3))
+    if len(estimate["branches"]) > 0:
+        print("------------------------------------------------------------------------------")
+        print("Branches assumed not taken (line): %s" % (", ".join([str(line) for line in estimate["branches"]])))
+    print("------------------------------------------------------------------------------")
+    print("\n")
+
+# Nearest-rank quantile of a list of values
+def quantile(values, q):
+    values = sorted(values)
+    return values[max(0, math.ceil(q*len(values)) - 1)]
+
+def cycle_histogram(values, bins=20):
+    (counts, edges) = np.histogram(values, bins=min(bins, max(values) - min(values) + 1))
+    return { "edges" : [float(edge) for edge in edges], "counts" : [int(count) for count in counts] }
+
+# Tail latency of the whole program (cycles per iteration) and of every instruction whose cycle count (per execution)
+# is data-dependent, with the analytic tail bound from the sampler models (see "estimate_program")
+def tail_latency_report(summaries, vdd, fmhz):
+    def stats(values, bound):
+        return {
+            "count"         : len(values),
+            "mean"          : sum(values)/len(values),
+            "p50"           : quantile(values, 0.5),
+            "p99"           : quantile(values, 0.99),
+            "p99.9"         : quantile(values, 0.999),
+            "max"           : max(values),
+            "bound"         : bound,
+            "histogram"     : cycle_histogram(values),
+        }
+    estimate = estimate_program(vdd, fmhz)
+    report = {
+        "program"           : stats([summary["cycles"] for summary in summaries], estimate["tail_cycles"]),
+        "tail_probability"  : estimate["tail_probability"],
+        "branches"          : estimate["branches"],
+        "instructions"      : [],
+    }
+    for (instr_pc, values) in sorted(tail_cycles.items()):
+        (opcode, args) = idecode[instr_pc]
+        charges = static_charges(opcode, args, param_n, param_q)
+        if min(values) == max(values) and sum([charge_var for (unit, charge_min, charge_mean, charge_var, charge_max, charge_tail) in charges]) == 0:
+            continue
+        instr_stats = stats(values, sum([charge_tail for (unit, charge_min, charge_mean, charge_var, charge_max, charge_tail) in charges]))
+        instr_stats["line"] = lines[instr_pc]
+        instr_stats["instr"] = imem[instr_pc]
+        report["instructions"].append(instr_stats)
+    return report
+
+def print_tail_latency(report):
+    print("------------------------------------------------------------------------------------------------")
+    print("Tail Latency (cycles)")
+    print("------------------------------------------------------------------------------------------------")
+    print("%-6s %-32s %8s %10s %10s %10s %10s %10s" % ("Line", "Instruction", "Count", "P50", "P99", "P99.9", "Max", "Bound"))
+    rows = [("", "Program (per iteration)", report["program"])] + [(str(stats["line"]), stats["instr"].replace(" ", ""), stats) for stats in report["instructions"]]
+    for (line, instr, stats) in rows:
+        print("%-6s %-32s %8d %10d %10d %10d %10d %10d" % (line, instr[:32], stats["count"], stats["p50"], stats["p99"], stats["p99.9"], stats["max"], stats["bound"]))
+    print("------------------------------------------------------------------------------------------------")
+    histogram = report["program"]["histogram"]
+    peak = max(histogram["counts"])
+    for (i, count) in enumerate(histogram["counts"]):
+        upper = math.floor(histogram["edges"][i+1]) if i == len(histogram["counts"]) - 1 else math.ceil(histogram["edges"][i+1]) - 1
+        print("%10d - %-10d %8d %s" % (math.ceil(histogram["edges"][i]), upper, count, "#"*int(round(50*count/peak))))
+    print("------------------------------------------------------------------------------------------------")
+    print("Bounds are exceeded with probability < %0.0e per instruction (%0.0e per iteration)" % (TAIL_EPSILON, max(report["tail_probability"], TAIL_EPSILON)))
+    if len(report["branches"]) > 0:
+        print("Program bound assumes branches are not taken (line): %s" % (", ".join([str(line) for line in report["branches"]])))
+    print("------------------------------------------------------------------------------------------------")
+    print("\n")
+
+# Print cycle and energy breakdown per hardware unit and per program section, averaged over iterations
+# Percentages are relative to the total cycles and the total energy without noise
+def print_breakdown(summaries):
+    for (kind, title) in [("units", "Hardware Unit"), ("sections", "Program Section")]:
+        rows = {}
+        for summary in summaries:
+            for (name, stats) in summary[kind].items():
+                if name not in rows:
+                    rows[name] = [0, 0]
+                rows[name][0] = rows[name][0] + stats["cycles"]/len(summaries)
+                rows[name][1] = rows[name][1] + stats["energy_pj"]/len(summaries)
+        total_ticks = sum([row[0] for row in rows.values()])
+        total_energy_pj = sum([row[1] for row in rows.values()])
+        print("------------------------------------------------------------------------------")
+        print("Breakdown per %s" % title)
+        print("------------------------------------------------------------------------------")
+        print("%-32s %12s %8s %14s %8s" % (title, "Cycles", "Cycles %", "Energy (nJ)", "Energy %"))
+        for (name, (row_ticks, row_energy_pj)) in sorted(rows.items(), key=lambda item: item[1][1], reverse=True):
+            print("%-32s %12s %7.2f%% %14.3f %7.2f%%" % (name, format(int(round(row_ticks)), ',d'), 100*row_ticks/total_ticks, row_energy_pj/1e3, 100*row_energy_pj/total_energy_pj))
+        print("------------------------------------------------------------------------------")
+        print("\n")
+
+# Export breakdown per hardware unit and per program section for every iteration, as CSV or JSON
+def write_breakdown(summaries, out_file):
+    out_f = open(out_file, "w", newline="")
+    if out_file.endswith(".csv"):
+        writer = csv.writer(out_f)
+        writer.writerow(["iteration", "kind", "name", "cycles", "cycles_pct", "energy_pj", "energy_pct"])
+        for (i, summary) in enumerate(summaries):
+            for kind in ["units", "sections"]:
+                total_energy_pj = sum([stats["energy_pj"] for stats in summary[kind].values()])
+                for (name, stats) in summary[kind].items():
+                    writer.writerow([i+1, kind[:-1], name, stats["cycles"], 100*stats["cycles"]/summary["cycles"], stats["energy_pj"], 100*stats["energy_pj"]/total_energy_pj])
+    else:
+        json.dump([{ "iteration" : i+1, "units" : summary["units"], "sections" : summary["sections"] } for (i, summary) in enumerate(summaries)], out_f, indent=2)
+    out_f.close()
+
+# Overlapped execution what-if (see "--overlap")
+# The simulated instruction stream is rescheduled as if the core issued instructions in order but let them
+# execute concurrently on separate hardware units, with one instance of each unit and no register renaming:
+# an instruction starts when its operands (registers, polynomials, Keccak state) are ready, earlier readers of
+# the operands it writes have completed, and the units it uses are free
+# Branches, "config" and "end" drain the pipeline (no speculation)
+OVERLAP_UNITS = {
+"ctrl"              : ["ctrl"],
+"reg_alu"           : ["ctrl"],
+"reg_poly"          : ["ctrl"],
+"sha3"              : ["keccak"],
+"poly_hash"         : ["keccak"],
+"poly_read_write"   : ["io"],
+"interface_wait"    : ["io"],
+"dvfs"              : [],
+}
+
+def overlap_units(unit):
+    if unit in OVERLAP_UNITS:
+        return OVERLAP_UNITS[unit]
+    # Samplers squeeze their randomness from the Keccak core
+    if unit.startswith("sample_"):
+        return ["sampler", "keccak"]
+    return ["poly"]
+
+# Returns the operands read and written by an instruction, or None if it drains the pipeline
+def overlap_operands(opcode, args):
+    if opcode in ["config", "set_op", "branch", "end"]:
+        return None
+    polys = ["poly%s" % arg for arg in args if arg.isdigit()]
+    if opcode == "c_set":
+        return ([], ["c" + args[0]])
+    if opcode == "c_addsub":
+        return (["c" + args[1]], ["c" + args[0]])
+    if opcode in ["reg_set", "tmp_set"]:
+        return ([], [opcode[:3]])
+    if opcode == "reg_tmp":
+        return (["tmp"], ["reg"])
+    if opcode == "tmp_alu":
+        return (["tmp", "reg"], ["tmp"])
+    if opcode in ["reg_read_poly", "poly_max", "poly_sum"]:
+        return (["poly" + args[0]], ["reg"])
+    if opcode == "reg_read_poly_c":
+        return (["poly" + args[0], "c" + args[1]], ["reg"])
+    if opcode == "reg_write_poly":
+        return (["reg"], ["poly" + args[0]])
+    if opcode == "reg_write_poly_c":
+        return (["reg", "c" + args[1]], ["poly" + args[0]])
+    if opcode == "transform":
+        return (["poly" + args[2]], ["poly" + args[1], "poly" + args[2]])
+    if opcode in ["mult_psi", "mult_psi_inv"]:
+        return (polys, polys + ["tmp"])
+    if "_sample" in opcode:
+        writes = ["poly" + args[-1]] + (["c0", "c1"] if opcode.endswith("_pseudo") else [])
+        if opcode.startswith("uni") or opcode.startswith("tri_sample_2"):
+            writes.append("reg")
+        return (["r" + args[1], "c0", "c1"], writes)
+    if opcode == "init":
+        return ([], polys)
+    if opcode == "poly_copy":
+        return (["poly" + args[1]], ["poly" + args[0], "tmp"])
+    if opcode == "poly_op":
+        reads = ["poly" + args[2]] + (["reg"] if args[0].startswith("CONST") else ["poly" + args[1]])
+        return (reads, ["poly" + args[1]] + (["tmp"] if args[0] in ["ADD", "SUB", "MUL"] else []))
+    if opcode == "shift_poly":
+        return (["poly" + args[2]], ["poly" + args[1], "tmp"])
+    if opcode == "eq_check":
+        return (polys, ["flag", "tmp"])
+    if opcode == "inf_norm_check":
+        return (polys[:1], ["flag", "reg"])
+    if opcode.startswith("compare"):
+        return ([opcode[8:] if opcode != "compare_c" else "c" + args[0]], ["flag"])
+    if opcode == "sha3_init":
+        return ([], ["keccak"])
+    if opcode == "sha3_absorb_poly":
+        return (["keccak", "poly" + args[1]], ["keccak"])
+    if opcode == "sha3_absorb_r":
+        return (["keccak", "r" + args[1]], ["keccak"])
+    if opcode == "sha3_256_digest":
+        return (["keccak"], ["keccak", "r" + args[0]])
+    if opcode == "sha3_512_digest":
+        return (["keccak"], ["keccak", "r0", "r1"])
+    if opcode in ["random_r", "load_r"]:
+        return ([], ["r" + args[0]])
+    if opcode == "save_r":
+        return (["r" + args[0]], [])
+    if opcode in ["random_poly", "load_poly"]:
+        return ([], ["poly" + args[0]])
+    if opcode in ["save_poly", "encode_print", "print_poly"]:
+        return (["poly" + args[0]], [])
+    return ([], [])
+
+def overlap_reset():
+    global overlap_state
+
+    overlap_state = { "issue" : 0, "end" : 0, "ready" : {}, "read" : {}, "free" : {}, "busy" : {}, "serial" : [], "overlapped" : [] }
+
+# Schedule the charges of the last executed instruction, charges of one instruction are sequential
+def overlap_instr(instr_pc, start_ticks):
+    state = overlap_state
+    charges = [(unit, cycles, idd_sum/cycles) for (unit, cycles, idd_sum) in trace_charges if cycles > 0]
+    cycles = sum([charge_cycles for (unit, charge_cycles, idd) in charges])
+    operands = overlap_operands(*idecode[instr_pc])
+    units = set()
+    for (unit, charge_cycles, idd) in charges:
+        units.update(overlap_units(unit))
+    if operands is None:
+        start = state["end"]
+    else:
+        (reads, writes) = operands
+        start = max([state["issue"]] + [state["ready"].get(operand, 0) for operand in reads + writes] + [state["read"].get(operand, 0) for operand in writes] + [state["free"].get(unit, 0) for unit in units])
+    end = start + cycles
+    if operands is None:
+        state["issue"] = end
+    else:
+        state["issue"] = start
+        for operand in reads:
+            state["read"][operand] = max(state["read"].get(operand, 0), end)
+        for operand in writes:
+            state["ready"][operand] = end
+    for unit in units:
+        state["free"][unit] = end
+        state["busy"][unit] = state["busy"].get(unit, 0) + cycles
+    state["end"] = max(state["end"], end)
+    # Current intervals (start, cycles, idd) of the serial and overlapped schedules
+    offset = 0
+    for (unit, charge_cycles, idd) in charges:
+        state["serial"].append((start_ticks + offset, charge_cycles, idd))
+        state["overlapped"].append((start + offset, charge_cycles, idd))
+        offset = offset + charge_cycles
+
+# Per-cycle power (without noise) of a schedule, idle cycles only draw leakage current
+# Currents of concurrent instructions add up above the leakage current at the reference operating point
+def overlap_power(intervals, length, vdd, fmhz):
+    delta = np.zeros(length + 1)
+    for (start, cycles, idd) in intervals:
+        delta[start] += idd - i_leak_ref
+        delta[start + cycles] -= idd - i_leak_ref
+    i_leak = leakage_current(vdd)
+    return vdd*(i_leak + np.cumsum(delta[:-1])*freq_scale(fmhz)*volt_scale(vdd))
+
+def overlap_summary(vdd, fmhz):
+    makespan = overlap_state["end"]
+    serial_power = overlap_power(overlap_state["serial"], ticks, vdd, fmhz)
+    overlapped_power = overlap_power(overlap_state["overlapped"], makespan, vdd, fmhz)
+    return {
+        "serial_cycles"         : ticks,
+        "overlapped_cycles"     : makespan,
+        "speedup"               : ticks/makespan,
+        "serial_energy_pj"      : float(np.sum(serial_power))/fmhz,
+        "overlapped_energy_pj"  : float(np.sum(overlapped_power))/fmhz,
+        "serial_avg_power_uw"   : float(np.mean(serial_power)),
+        "overlapped_avg_power_uw" : float(np.mean(overlapped_power)),
+        "serial_peak_power_uw"  : float(np.max(serial_power)),
+        "overlapped_peak_power_uw" : float(np.max(overlapped_power)),
+        "utilization"           : dict([(unit, busy/makespan) for (unit, busy) in sorted(overlap_state["busy"].items())]),
+        "power_profiles"        : (serial_power, overlapped_power),
+    }
+
+# Averaged over iterations, the power profiles of the last iteration are written to a CSV file, if provided
+def print_overlap(summaries, out_file=None):
+    overlaps = [summary["overlap"] for summary in summaries]
+    def average(key):
+        return sum([overlap[key] for overlap in overlaps])/len(overlaps)
+    print("------------------------------------------------------")
+    print("Overlapped Execution (what-if, %d iteration%s)" % (len(overlaps), "s" if len(overlaps) > 1 else ""))
+    print("------------------------------------------------------")
+    print("%-16s %16s %16s" % ("", "Serial", "Overlapped"))
+    print("%-16s %16s %16s" % ("Cycles", format(int(round(average("serial_cycles"))), ',d'), format(int(round(average("overlapped_cycles"))), ',d')))
+    print("%-16s %16.3f %16.3f" % ("Energy (nJ)", average("serial_energy_pj")/1e3, average("overlapped_energy_pj")/1e3))
+    print("%-16s %16.3f %16.3f" % ("Avg. Power (mW)", average("serial_avg_power_uw")/1e3, average("overlapped_avg_power_uw")/1e3))
+    print("%-16s %16.3f %16.3f" % ("Peak Power (mW)", average("serial_peak_power_uw")/1e3, average("overlapped_peak_power_uw")/1e3))
+    print("* Speedup:       %0.3fx" % average("speedup"))
+    print("* Utilization:   %s" % (", ".join(["%s %0.1f%%" % (unit, 100*utilization) for (unit, utilization) in overlaps[-1]["utilization"].items()])))
+    print("------------------------------------------------------")
+    print("\n")
+    if out_file is not None:
+        (serial_power, overlapped_power) = overlaps[-1]["power_profiles"]
+        serial_env = decimate_power(serial_power, plot_bins)
+        overlapped_env = decimate_power(overlapped_power, plot_bins)
+        out_f = open(out_file, "w", newline="")
+        writer = csv.writer(out_f)
+        writer.writerow(["schedule", "cycle", "min_power_uw", "max_power_uw"])
+        for (name, env) in [("serial", serial_env), ("overlapped", overlapped_env)]:
+            for (cycle, min_power, max_power) in zip(*env):
+                writer.writerow([name, cycle, min_power, max_power])
+        out_f.close()
+
+# Clock and power gating what-if (see "--gating")
+# Hardware blocks (as in "overlap_units") are busy while any of their units is charged, and clock-gated whenever idle,
+# saving the current of their clock tree; a block idle for more than "threshold" cycles is also power-gated, saving its
+# share of the leakage current until it is used again, when it takes "wake" cycles (stalling the core, which draws
+# leakage current only) and "wake_pj" picojoules to wake up
+# Shares of the leakage current and idle clock currents (in uA at the reference operating point) are estimated, since the test chip
+# gates neither, the control block and the polynomial memory (which holds data) are never gated
+GATING_BLOCKS = {
+"keccak"            : { "leakage" : 0.15, "clock" : 120 },
+"sampler"           : { "leakage" : 0.10, "clock" : 80 },
+"poly"              : { "leakage" : 0.30, "clock" : 250 },
+"io"                : { "leakage" : 0.05, "clock" : 40 },
+}
+GATING_PARAMS = { "threshold" : 100, "wake" : 10, "wake_pj" : 2.0 }
+
+# Set gating parameters, e.g. "threshold=200,wake=5" (parameters that are not provided keep their default values)
+def set_gating(spec):
+    global gating_params
+
+    gating_params = dict(GATING_PARAMS)
+    for param in spec.split(",") if spec != "" else []:
+        (key, sep, value) = param.partition("=")
+        if key not in gating_params:
+            print("\nERROR: Unsupported gating parameter \"%s\" (Valid parameters: %s)" % (key, list(gating_params)))
+            exit()
+        try:
+            gating_params[key] = type(GATING_PARAMS[key])(value)
+        except ValueError:
+            print("\nERROR: Invalid value \"%s\" for gating parameter \"%s\"" % (value, key))
+            exit()
+        if gating_params[key] < 0:
+            print("\nERROR: Gating parameter \"%s\" must be non-negative" % key)
+            exit()
+
+# Evaluated at the operating point of the start of the iteration (see "set_op")
+def gating_summary(vdd, fmhz):
+    busy = dict([(block, []) for block in GATING_BLOCKS])
+    for (start, cycles, unit) in gating_log:
+        for block in overlap_units(unit):
+            if block not in busy:
+                continue
+            # Charges are logged in order, so that busy intervals of a block can be merged on the fly
+            if len(busy[block]) > 0 and busy[block][-1][1] >= start:
+                busy[block][-1][1] = max(busy[block][-1][1], start + cycles)
+            else:
+                busy[block].append([start, start + cycles])
+    leak_pj = vdd*leakage_current(vdd)/fmhz
+    threshold = gating_params["threshold"]
+    blocks = {}
+    for (block, model) in GATING_BLOCKS.items():
+        # Idle intervals, the block is not woken up after the last one
+        idle = []
+        last = 0
+        for (start, end) in busy[block]:
+            idle.append((start - last, True))
+            last = end
+        idle.append((ticks - last, False))
+        gated_cycles = sum([cycles - threshold for (cycles, wake) in idle if cycles > threshold])
+        idle_cycles = sum([cycles for (cycles, wake) in idle])
+        blocks[block] = {
+            "active_cycles"     : ticks - idle_cycles,
+            "idle_cycles"       : idle_cycles,
+            "gated_cycles"      : gated_cycles,
+            "wakeups"           : len([cycles for (cycles, wake) in idle if cycles > threshold and wake]),
+            "clock_saved_pj"    : idle_cycles*vdd*(model["clock"]*freq_scale(fmhz)*volt_scale(vdd))/fmhz,
+            "leakage_saved_pj"  : gated_cycles*leak_pj*model["leakage"],
+        }
+    wakeups = sum([stats["wakeups"] for stats in blocks.values()])
+    wake_cycles = wakeups*gating_params["wake"]
+    clock_saved_pj = sum([stats["clock_saved_pj"] for stats in blocks.values()])
+    leakage_saved_pj = sum([stats["leakage_saved_pj"] for stats in blocks.values()])
+    wake_pj = wakeups*gating_params["wake_pj"] + wake_cycles*leak_pj
+    return {
+        "blocks"            : blocks,
+        "clock_saved_pj"    : clock_saved_pj,
+        "leakage_saved_pj"  : leakage_saved_pj,
+        "wake_pj"           : wake_pj,
+        "saved_pj"          : clock_saved_pj + leakage_saved_pj - wake_pj,
+        "wake_cycles"       : wake_cycles,
+        "cycles"            : ticks + wake_cycles,
+    }
+
+# Averaged over iterations
+def print_gating(summaries):
+    gatings = [summary["gating"] for summary in summaries]
+    def average(key, block=None):
+        return sum([gating[key] if block is None else gating["blocks"][block][key] for gating in gatings])/len(gatings)
+    energy_pj = sum([summary["energy_pj"] for summary in summaries])/len(summaries)
+    cycles = sum([summary["cycles"] for summary in summaries])/len(summaries)
+    print("------------------------------------------------------------------------------")
+    print("Clock and Power Gating (what-if, %d iteration%s)" % (len(gatings), "s" if len(gatings) > 1 else ""))
+    print("Threshold %d cycles, wake-up %d cycles and %0.2f pJ" % (gating_params["threshold"], gating_params["wake"], gating_params["wake_pj"]))
+    print("------------------------------------------------------------------------------")
+    print("%-12s %14s %14s %14s %9s %11s" % ("Block", "Active Cycles", "Idle Cycles", "Gated Cycles", "Wake-Ups", "Saved (nJ)"))
+    for block in GATING_BLOCKS:
+        saved_pj = average("clock_saved_pj", block) + average("leakage_saved_pj", block)
+        print("%-12s %14s %14s %14s %9.1f %11.3f" % (block, format(int(round(average("active_cycles", block))), ',d'), format(int(round(average("idle_cycles", block))), ',d'),
+                                                    format(int(round(average("gated_cycles", block))), ',d'), average("wakeups", block), saved_pj/1e3))
+    print("------------------------------------------------------------------------------")
+    print("* Clock Gating:  %0.3f nJ saved" % (average("clock_saved_pj")/1e3))
+    print("* Power Gating:  %0.3f nJ saved, %0.3f nJ to wake up" % (average("leakage_saved_pj")/1e3, average("wake_pj")/1e3))
+    print("* Net Saving:    %0.3f nJ (%0.2f%% of %0.3f nJ)" % (average("saved_pj")/1e3, 100*average("saved_pj")/energy_pj, energy_pj/1e3))
+    print("* Cycles:        %s (+%0.2f%% to wake up)" % (format(int(round(average("cycles"))), ',d'), 100*average("wake_cycles")/cycles))
+    print("------------------------------------------------------------------------------")
+    print("\n")
+
+# Timeline trace in Trace Event format (see "--trace"), events are written to disk as they are generated
+# Each instruction is a complete event on the track of its iteration, timestamps are in us at the operating frequency
+def trace_open(trace_file, vdd, fmhz):
+    global trace_f
+    global trace_op_point
+    global trace_events
+
+    trace_f = open(trace_file, "w")
+    trace_op_point = (vdd, fmhz)
+    trace_events = 0
+    trace_f.write("[\n")
+    trace_event({ "name" : "process_name", "ph" : "M", "pid" : 0, "args" : { "name" : "Sapphire (%0.2f V, %d MHz)" % (vdd, fmhz) } })
+
+def trace_event(event):
+    global trace_events
+
+    if trace_events > 0:
+        trace_f.write(",\n")
+    trace_f.write(json.dumps(event))
+    trace_events = trace_events + 1
+
+def trace_instr(iter_count, instr_pc, start_ticks):
+    (vdd, fmhz) = trace_op_point
+    units = {}
+    for (unit, cycles, idd_sum) in trace_charges:
+        if unit not in units:
+            units[unit] = [0, 0]
+        units[unit][0] = units[unit][0] + cycles
+        units[unit][1] = units[unit][1] + idd_sum
+    # Label of the instruction is the closest preceding label
+    label = None
+    for (label_name, label_pc) in labels.items():
+        if label_pc <= instr_pc and (label is None or label_pc > labels[label]):
+            label = label_name
+    trace_event({
+        "name"  : idecode[instr_pc][0],
+        "cat"   : max(units, key=lambda unit: units[unit][0]) if len(units) > 0 else "none",
+        "ph"    : "X",
+        "ts"    : start_ticks/fmhz,
+        "dur"   : (ticks - start_ticks)/fmhz,
+        "pid"   : 0,
+        "tid"   : iter_count,
+        "args"  : {
+            "line"          : lines[instr_pc],
+            "instr"         : imem[instr_pc],
+            "label"         : label,
+            "start_cycle"   : start_ticks,
+            "cycles"        : ticks - start_ticks,
+            "units"         : dict([(unit, units[unit][0]) for unit in units]),
+            "energy_pj"     : sum([energy_pj(units[unit][0], units[unit][1], vdd, fmhz) for unit in units]),
+        },
+    })
+
+def trace_close():
+    global trace_f
+
+    trace_f.write("\n]\n")
+    trace_f.close()
+    trace_f = None
+
+# Collect host profile per source line and per opcode (sorted by total host time)
+# Decode time is spent once per static instruction when the program is loaded (zero if loaded from cache),
+# execute and accounting times are summed over all dynamic executions
+def host_profile_report():
+    line_rows = []
+    for (instr_pc, (count, cycles, execute_ns, accounting_ns)) in host_profile.items():
+        line_rows.append({
+            "line"          : lines[instr_pc],
+            "instr"         : imem[instr_pc],
+            "opcode"        : idecode[instr_pc][0],
+            "count"         : count,
+            "cycles"        : cycles,
+            "decode_ns"     : decode_ns[instr_pc] if decode_ns is not None else 0,
+            "execute_ns"    : execute_ns,
+            "accounting_ns" : accounting_ns,
+        })
+    opcode_rows = {}
+    for row in line_rows:
+        if row["opcode"] not in opcode_rows:
+            opcode_rows[row["opcode"]] = { "opcode" : row["opcode"], "count" : 0, "cycles" : 0, "decode_ns" : 0, "execute_ns" : 0, "accounting_ns" : 0 }
+        for key in ["count", "cycles", "decode_ns", "execute_ns", "accounting_ns"]:
+            opcode_rows[row["opcode"]][key] = opcode_rows[row["opcode"]][key] + row[key]
+    opcode_rows = list(opcode_rows.values())
+    host_ns = lambda row: row["decode_ns"] + row["execute_ns"] + row["accounting_ns"]
+    line_rows.sort(key=host_ns, reverse=True)
+    opcode_rows.sort(key=host_ns, reverse=True)
+    return {
+        "iterations"            : num_iters,
+        "decoded_from_cache"    : decode_ns is None,
+        "power_conversion_ns"   : convert_ns,
+        "opcodes"               : opcode_rows,
+        "lines"                 : line_rows,
+    }
+
+def print_host_profile(report, max_lines=20):
+    total_ns = report["power_conversion_ns"] + sum([row["decode_ns"] + row["execute_ns"] + row["accounting_ns"] for row in report["opcodes"]])
+    print("------------------------------------------------------------------------------------------------")
+    print("Host Profile per Opcode (over %d iterations, times in us)" % report["iterations"])
+    print("------------------------------------------------------------------------------------------------")
+    print("%-20s %10s %12s %10s %12s %12s %8s" % ("Opcode", "Count", "Cycles", "Decode", "Execute", "Accounting", "Host %"))
+    for row in report["opcodes"]:
+        row_ns = row["decode_ns"] + row["execute_ns"] + row["accounting_ns"]
+        print("%-20s %10d %12s %10.1f %12.1f %12.1f %7.2f%%" % (row["opcode"], row["count"], format(row["cycles"], ',d'), row["decode_ns"]/1e3, row["execute_ns"]/1e3, row["accounting_ns"]/1e3, 100*row_ns/total_ns))
+    print("%-20s %10s %12s %10s %12s %12.1f %7.2f%%" % ("(power conversion)", "-", "-", "-", "-", report["power_conversion_ns"]/1e3, 100*report["power_conversion_ns"]/total_ns))
+    if report["decoded_from_cache"]:
+        print("* Program loaded from cache, decode time not measured (use --no_cache)")
+    print("------------------------------------------------------------------------------------------------")
+    print("Host Profile per Source Line (top %d, times in us)" % max_lines)
+    print("------------------------------------------------------------------------------------------------")
+    print("%-6s %-20s %10s %12s %10s %12s %12s %8s" % ("Line", "Opcode", "Count", "Cycles", "Decode", "Execute", "Accounting", "Host %"))
+    for row in report["lines"][:max_lines]:
+        row_ns = row["decode_ns"] + row["execute_ns"] + row["accounting_ns"]
+        print("%-6d %-20s %10d %12s %10.1f %12.1f %12.1f %7.2f%%" % (row["line"], row["opcode"], row["count"], format(row["cycles"], ',d'), row["decode_ns"]/1e3, row["execute_ns"]/1e3, row["accounting_ns"]/1e3, 100*row_ns/total_ns))
+    print("------------------------------------------------------------------------------------------------")
+    print("\n")
+
+# Min/max-preserving decimation of a power trace into at most "bins" bins
+# Returns the first cycle, minimum and maximum power of each bin
+def decimate_power(trace, bins):
+    trace = np.asarray(trace, dtype=float)
+    if len(trace) <= bins:
+        return (np.arange(len(trace)), trace, trace)
+    chunk = math.ceil(len(trace)/bins)
+    padded = np.pad(trace, (0, (-len(trace)) % chunk), mode="edge").reshape(-1, chunk)
+    return (np.arange(0, len(trace), chunk), padded.min(axis=1), padded.max(axis=1))
+
+# Keep the decimated power trace of each iteration (with leakage-only power at cycle 0),
+# and accumulate the per-cycle power for averaging over iterations
+def collect_power_trace():
+    global power_sum
+    global power_count
+
+    trace = np.asarray([i_leak] + power, dtype=float)
+    power_envelopes.append(decimate_power(trace, plot_bins))
+    if len(trace) > len(power_sum):
+        power_sum = np.pad(power_sum, (0, len(trace) - len(power_sum)))
+        power_count = np.pad(power_count, (0, len(trace) - len(power_count)))
+    power_sum[:len(trace)] += trace
+    power_count[:len(trace)] += 1
+
+# Plot power traces of all iterations (overlaid, or averaged per cycle if "average" is set)
+# The plot is shown if no output file is given, saved as an image (e.g., PNG / SVG) otherwise,
+# or the decimated traces are written as CSV if the output file ends with ".csv"
+def plot_power_traces(out_file=None, average=False):
+    if average:
+        envelopes = [decimate_power(power_sum/power_count, plot_bins)]
+        names = ["average"]
+    else:
+        envelopes = power_envelopes
+        names = [str(i+1) for i in range(len(envelopes))]
+
+    if out_file is not None and out_file.endswith(".csv"):
+        out_f = open(out_file, "w", newline="")
+        writer = csv.writer(out_f)
+        writer.writerow(["iteration", "cycle", "min_power_uw", "max_power_uw"])
+        for (name, (x, lo, hi)) in zip(names, envelopes):
+            for j in range(len(x)):
+                writer.writerow([name, x[j], lo[j], hi[j]])
+        out_f.close()
+        return
+
+    if out_file is not None:
+        plt.switch_backend("Agg")
     mpl.rcParams['xtick.major.pad'] = 5
     mpl.rcParams['ytick.major.pad'] = 5
     plt.figure(figsize=(15,5))
-    plt.plot(power, linewidth=1.5)
+    for (name, (x, lo, hi)) in zip(names, envelopes):
+        label = "iter = %s" % name if len(envelopes) > 1 else None
+        lines = plt.plot(x, hi, linewidth=1.5, drawstyle="steps-post", label=label)
+        plt.fill_between(x, lo, hi, step="post", color=lines[0].get_color(), alpha=0.5 if len(envelopes) == 1 else 0.2, linewidth=0)
+    if 1 < len(envelopes) <= 10:
+        plt.legend(fontsize=12)
     plt.xticks(fontsize=14)
     plt.yticks(fontsize=14)
     plt.xlabel("Cycles", fontsize=16, fontweight='bold')
     plt.ylabel("Power (uW)", fontsize=16, fontweight='bold')
     plt.tight_layout()
-    plt.show()
+    if out_file is not None:
+        plt.savefig(out_file)
+        plt.close()
+    else:
+        plt.show()
+
+# Simulate the loaded program for "iters" iterations, returns the summary of each iteration
+def simulate_start(vdd, fmhz, iters):
+    global num_iters
+    global host_profile
+    global convert_ns
+    global power_envelopes
+    global power_sum
+    global power_count
+    global sim_op_point
+    global tail_cycles
+
+    num_iters = iters
+    host_profile = {}
+    tail_cycles = {}
+    convert_ns = 0
+    power_envelopes = []
+    power_sum = np.zeros(0)
+    power_count = np.zeros(0)
+    sim_op_point = (vdd, fmhz)
+
+def simulate_iteration(i, vdd, fmhz):
+    global i_leak
+    global convert_ns
+
+    instr_count = run_iteration(i)
+    t_start = time.perf_counter_ns()
+    i_leak = convert_power(vdd, fmhz)
+    convert_ns = convert_ns + (time.perf_counter_ns() - t_start)
+    summary = summarize(instr_count, vdd, fmhz)
+    if plot_power:
+        collect_power_trace()
+    return summary
+
+def simulate(vdd, fmhz, iters=1, report=True):
+    simulate_start(vdd, fmhz, iters)
+    summaries = []
+    for i in range(num_iters):
+        summary = simulate_iteration(i, vdd, fmhz)
+        summaries.append(summary)
+        if report:
+            if num_iters > 1:
+                print("\n[iter = %d]" % (i+1))
+            else:
+                print("\n")
+            print_summary(summary, vdd, fmhz)
+    return summaries
+
+# Adaptive Monte Carlo (see "--iter auto")
+# Iterations are run until the confidence intervals on the mean cycle count and energy are within "ci" (relative
+# half-width) of the means, in rounds of "jobs" iterations that are simulated in parallel when "jobs" > 1
+AUTO_CONFIDENCE_Z = 1.959964 # 95% confidence
+AUTO_MIN_ITERS = 10
+
+# Half-width of the confidence interval on the mean (Student's t quantile from the Cornish-Fisher expansion)
+def confidence_half_width(values):
+    num = len(values)
+    mean = sum(values)/num
+    std = math.sqrt(sum([(val - mean)**2 for val in values])/(num - 1))
+    (z, df) = (AUTO_CONFIDENCE_Z, num - 1)
+    t = z + (z**3 + z)/(4*df) + (5*z**5 + 16*z**3 + 3*z)/(96*df**2)
+    return t*std/math.sqrt(num)
+
+def auto_converged(summaries, ci):
+    if len(summaries) < AUTO_MIN_ITERS:
+        return False
+    for key in ["cycles", "energy_pj"]:
+        values = [summary[key] for summary in summaries]
+        if confidence_half_width(values) > ci*abs(sum(values)/len(values)):
+            return False
+    return True
+
+# Runs in a forked process, with its own random seed so that iterations are independent
+def auto_worker(job):
+    (i, seed, vdd, fmhz) = job
+    seed_rng(seed)
+    return simulate_iteration(i, vdd, fmhz)
+
+def simulate_auto(vdd, fmhz, ci, jobs=1, max_iters=10000, report=True):
+    global num_iters
+
+    # Iterations are numbered (and files named) as for "--iter" with more than one iteration
+    simulate_start(vdd, fmhz, max_iters)
+    summaries = []
+    pool = None
+    if jobs > 1:
+        pool = multiprocessing.get_context("fork").Pool(jobs)
+    try:
+        while len(summaries) < max_iters and not auto_converged(summaries, ci):
+            first = len(summaries)
+            if pool is None:
+                summaries.append(simulate_iteration(first, vdd, fmhz))
+            else:
+                batch = range(first, min(max_iters, first + jobs))
+                summaries = summaries + pool.map(auto_worker, [(i, func_rng.getrandbits(64), vdd, fmhz) for i in batch])
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    num_iters = len(summaries)
+    if report:
+        print_auto_summary(summaries, ci)
+    return summaries
+
+def print_auto_summary(summaries, ci):
+    print("\n------------------------------------------------------")
+    if auto_converged(summaries, ci):
+        print("Converged after %d iterations (95%% CI within +/-%g%%)" % (len(summaries), 100*ci))
+    else:
+        print("WARNING: Not converged after %d iterations (95%% CI within +/-%g%%)" % (len(summaries), 100*ci))
+    print("------------------------------------------------------")
+    for (name, key, scale, fmt) in [("Cycles", "cycles", 1, "%0.1f"), ("Energy (nJ)", "energy_pj", 1e3, "%0.3f")]:
+        values = [summary[key]/scale for summary in summaries]
+        mean = sum(values)/len(values)
+        half_width = confidence_half_width(values) if len(values) > 1 else float("inf")
+        print(("* %-12s " + fmt + " +/- " + fmt + " (+/-%0.3f%%)") % (name + ":", mean, half_width, 100*half_width/mean))
+    print("------------------------------------------------------")
+    print("\n")
+
+keccak_buf = ""
+proc_regs = {
+"r0"    : 0,
+"r1"    : 0,
+"reg"   : 0,
+"tmp"   : 0,
+"c0"    : 0,
+"c1"    : 0,
+"flag"  : 0,
+}
+poly_mem = []
+poly_tmp = []
+param_n = 0
+param_q = 0
+ticks = 0
+pc = 0
+imem = []
+lines = []
+labels = {}
+idecode = []
+decode_ns = []
+sections = []
+
+power = []
+unit_stats = {}
+section_stats = {}
+current_section = None
+i_leak = 0
+
+# Streaming power statistics (see "--stream_power")
+power_stats = sketch_new()
+stream_op_point = None
+
+# Operating point at the start of each iteration and operating point segments (see "set_op")
+sim_op_point = (1.1, 72)
+op_segments = []
+dvfs_latency_us = DVFS_LATENCY_US
+dvfs_energy_pj = DVFS_ENERGY_PJ
+
+
+# Tail latency (see "--tail")
+tail_cycles = {}
+
+# Overlapped execution (see "--overlap")
+overlap_state = {}
+
+# Host interface transfers (start cycle, cycles) of the current iteration, recorded if not None (see multicore.py)
+interface_log = None
+
+# Host interface model (see "--interface") and transfer statistics of the current iteration
+interface_model = "word"
+interface_params = dict(INTERFACE_MODELS["word"])
+interface_stats = {}
+interface_report = False
+
+# Polynomial memory configuration (see "--mem_size" and "--mem_banks") and usage (see "--mem_usage")
+mem_size = POLY_MEM_SIZE
+mem_banks = POLY_MEM_BANKS
+mem_idd_scale = 1
+mem_leak_scale = 1
+poly_slots = 0
+mem_state = {}
+
+# Background transfer in progress: completion cycle, current above leakage and transferred operand
+dma_until = 0
+dma_idd = 0
+dma_operand = None
+
+# Random number generators (see "--seed")
+func_rng = random.Random()
+noise_rng = np.random.default_rng()
+
+# Decimated power traces for plotting (see "--plot_power")
+power_envelopes = []
+power_sum = np.zeros(0)
+power_count = np.zeros(0)
+
+# Clock and power gating (see "--gating")
+gating_log = []
+gating_params = dict(GATING_PARAMS)
+
+# Timeline trace (see "--trace")
+trace_f = None
+trace_op_point = None
+trace_events = 0
+trace_charges = []
+
+# Host profile (see "--profile_host")
+host_profile = {}
+charge_ns = 0
+convert_ns = 0
+
+# Power model calibration (see "--calibration") and operating temperature in Celsius (see "--temp", None for the
+# reference temperature of the calibration)
+calibration = {}
+calibration_cache = {}
+idd_dict = {}
+idd_interpolated = {}
+i_leak_ref = 0
+temp_c = None
+load_calibration(CALIBRATION_FILE)
+
+# Simulation options
+verbose = False
+free_rw = False
+cdt_mem = None
+use_cache = True
+profile_host = False
+plot_power = False
+plot_bins = 2000
+stream_power = False
+tail_latency = False
+overlap = False
+mem_usage = False
+gating = False
+optimize = False
+num_iters = 1
+
+if __name__ == "__main__":
+    # Check arguments ("--verify" only needs the program and its define flags)
+    verify_only = "--verify" in sys.argv
+    if ("--prog" not in sys.argv) or (not verify_only and (len(sys.argv) < 7 or ("--vdd" not in sys.argv) or ("--fmhz" not in sys.argv))):
+        print("\nERROR: Incorrect arguments provided for simulator script")
+        print("Usage: python sim.py --prog <program_file_path> --verify [ -D <define_flag> ... ]")
+        print("   or: python sim.py --prog <program_file_path>")
+        print("                     --vdd <voltage>")
+        print("                     --fmhz <frequency_mhz>")
+        print("                     [ --verbose ]")
+        print("                     [ --free_rw ]")
+        print("                     [ --interface <word|burst|dma>[:<param>=<value>,...] ]")
+        print("                     [ --mem_size <coefficients> ] [ --mem_banks <banks> ] [ --mem_usage ]")
+        print("                     [ --dvfs_latency <us> ] [ --dvfs_energy <pj> ]")
+        print("                     [ --plot_power [ <png_svg_or_csv_file_path> ] ]")
+        print("                     [ --plot_average ]")
+        print("                     [ --plot_bins <num_bins> ]")
+        print("                     [ --stream_power ]")
+        print("                     [ --optimize [ <latency_us> ] ]")
+        print("                     [ --estimate ]")
+        print("                     [ --tail [ <json_file_path> ] ]")
+        print("                     [ --overlap [ <csv_file_path> ] ]")
+        print("                     [ --gating [ <param>=<value>,... ] ]")
+        print("                     [ --cdt <cdt_file_path> ]")
+        print("                     [ --calibration <json_or_csv_file_path> ] [ --temp <celsius> (needs a calibration with a leakage temp_coefficient) ]")
+        print("                     [ --iter <num_iterations> | --iter auto [ --ci <relative_half_width> ] [ --jobs <num_processes> ] [ --max_iter <num_iterations> ] ]")
+        print("                     [ --seed <seed> ]")
+        print("                     [ -D <define_flag> ... ]")
+        print("                     [ --no_cache ]")
+        print("                     [ --profile_host [ <json_file_path> ] ]")
+        print("                     [ --trace <json_file_path> ]")
+        print("                     [ --breakdown [ <csv_or_json_file_path> ] ]")
+        exit()
+
+    # Load power model calibration, if provided
+    if "--calibration" in sys.argv:
+        load_calibration(sys.argv[sys.argv.index("--calibration") + 1])
+    if "--temp" in sys.argv:
+        set_temperature(float(sys.argv[sys.argv.index("--temp") + 1]))
+
+    # Check supply voltage and operating frequency, if simulating
+    if not verify_only:
+        vdd = float(sys.argv[sys.argv.index("--vdd") + 1])
+        fmhz = int(sys.argv[sys.argv.index("--fmhz") + 1])
+        check_operating_point(vdd, fmhz)
+
+    verbose = "--verbose" in sys.argv
+    free_rw = "--free_rw" in sys.argv
+    if "--interface" in sys.argv:
+        set_interface(sys.argv[sys.argv.index("--interface") + 1])
+        interface_report = True
+    if "--mem_size" in sys.argv or "--mem_banks" in sys.argv:
+        set_memory(int(sys.argv[sys.argv.index("--mem_size") + 1]) if "--mem_size" in sys.argv else POLY_MEM_SIZE,
+                   int(sys.argv[sys.argv.index("--mem_banks") + 1]) if "--mem_banks" in sys.argv else POLY_MEM_BANKS)
+    mem_usage = "--mem_usage" in sys.argv
+    if "--dvfs_latency" in sys.argv:
+        dvfs_latency_us = float(sys.argv[sys.argv.index("--dvfs_latency") + 1])
+    if "--dvfs_energy" in sys.argv:
+        dvfs_energy_pj = float(sys.argv[sys.argv.index("--dvfs_energy") + 1])
+    use_cache = "--no_cache" not in sys.argv
+    profile_host = "--profile_host" in sys.argv
+    plot_power = "--plot_power" in sys.argv
+    if "--plot_bins" in sys.argv:
+        plot_bins = int(sys.argv[sys.argv.index("--plot_bins") + 1])
+    stream_power = "--stream_power" in sys.argv
+    tail_latency = "--tail" in sys.argv
+    overlap = "--overlap" in sys.argv
+    gating = "--gating" in sys.argv
+    optimize = "--optimize" in sys.argv
+    if gating:
+        i = sys.argv.index("--gating")
+        set_gating(sys.argv[i + 1] if i + 1 < len(sys.argv) and not sys.argv[i + 1].startswith("-") else "")
+    if stream_power and plot_power:
+        print("\nERROR: \"--plot_power\" requires the power trace, it cannot be used with \"--stream_power\"")
+        exit()
+
+    # Seed the random number generators, if provided
+    if "--seed" in sys.argv:
+        seed_rng(int(sys.argv[sys.argv.index("--seed") + 1]))
+
+    # Read define flags, if provided ("-D <flag>" or "-D<flag>")
+    prog_defines = []
+    for (i, arg) in enumerate(sys.argv):
+        if arg == "-D":
+            prog_defines.append(sys.argv[i + 1])
+        elif arg.startswith("-D"):
+            prog_defines.append(arg[2:])
+
+    # Read program file
+    load_program(sys.argv[sys.argv.index("--prog") + 1], prog_defines)
+
+    # Only check the program, which is verified when loaded, without simulating it
+    if verify_only:
+        print("\nNo errors found in program %s (%d instructions)\n" % (sys.argv[sys.argv.index("--prog") + 1], len(imem)))
+        exit()
+
+    # Read CDT file, if provided
+    if "--cdt" in sys.argv:
+        cdt_mem = load_cdt(sys.argv[sys.argv.index("--cdt") + 1])
+
+    # Estimate cycles and energy statically, without simulating the program
+    if "--estimate" in sys.argv:
+        print_estimate(estimate_program(vdd, fmhz), vdd, fmhz)
+        exit()
+
+    # Read number of iterations, if provided ("auto" runs until the confidence intervals reach "--ci", e.g. 0.1% or 0.001)
+    auto_iters = False
+    if "--iter" in sys.argv:
+        if sys.argv[sys.argv.index("--iter") + 1] == "auto":
+            auto_iters = True
+        else:
+            num_iters = int(sys.argv[sys.argv.index("--iter") + 1])
+    ci = 0.01
+    if "--ci" in sys.argv:
+        ci_arg = sys.argv[sys.argv.index("--ci") + 1]
+        ci = float(ci_arg[:-1])/100 if ci_arg.endswith("%") else float(ci_arg)
+    jobs = 1
+    if "--jobs" in sys.argv:
+        jobs = int(sys.argv[sys.argv.index("--jobs") + 1])
+    max_iters = 10000
+    if "--max_iter" in sys.argv:
+        max_iters = int(sys.argv[sys.argv.index("--max_iter") + 1])
+    if auto_iters and max_iters < AUTO_MIN_ITERS:
+        print("\nERROR: \"--max_iter\" must be at least %d" % AUTO_MIN_ITERS)
+        exit()
+    if jobs > 1:
+        # Per-instruction state is not collected from parallel iterations
+        for flag in ["--plot_power", "--tail", "--overlap", "--trace", "--profile_host", "--optimize"]:
+            if flag in sys.argv:
+                print("\nERROR: \"%s\" cannot be used with \"--jobs\"" % flag)
+                exit()
+
+    # Open timeline trace file, if provided
+    if "--trace" in sys.argv:
+        trace_open(sys.argv[sys.argv.index("--trace") + 1], vdd, fmhz)
+
+    if auto_iters:
+        summaries = simulate_auto(vdd, fmhz, ci, jobs, max_iters)
+    else:
+        summaries = simulate(vdd, fmhz, num_iters)
+
+    if trace_f is not None:
+        trace_close()
+
+    # Print average cycles and energy, only in case of multiple iterations
+    if num_iters > 1:
+        print_average(summaries)
+
+    # Print cycle and energy breakdown and export it to CSV / JSON file, if provided
+    if "--breakdown" in sys.argv:
+        print_breakdown(summaries)
+        i = sys.argv.index("--breakdown")
+        if i + 1 < len(sys.argv) and not sys.argv[i + 1].startswith("-"):
+            write_breakdown(summaries, sys.argv[i + 1])
+
+    # Print tail latency report and export it to JSON file, if provided
+    if tail_latency:
+        report = tail_latency_report(summaries, vdd, fmhz)
+        print_tail_latency(report)
+        i = sys.argv.index("--tail")
+        if i + 1 < len(sys.argv) and not sys.argv[i + 1].startswith("-"):
+            tail_f = open(sys.argv[i + 1], "w")
+            json.dump(report, tail_f, indent=2)
+            tail_f.close()
+
+    # Print overlapped execution report and export the power profiles to CSV file, if provided
+    if overlap:
+        i = sys.argv.index("--overlap")
+        print_overlap(summaries, sys.argv[i + 1] if i + 1 < len(sys.argv) and not sys.argv[i + 1].startswith("-") else None)
+
+    # Print clock and power gating report
+    if gating:
+        print_gating(summaries)
+
+    # Search for optimal operating points (for the mean cycles and currents over all iterations), with latency constraint if provided
+    if optimize:
+        i = sys.argv.index("--optimize")
+        latency_us = None
+        if i + 1 < len(sys.argv) and not sys.argv[i + 1].startswith("-"):
+            latency_us = float(sys.argv[i + 1])
+        print_optimal_points(optimize_operating_point(mean_unit_stats(summaries), latency_us), latency_us)
+
+    # Print host profile and export it to JSON file, if provided
+    if profile_host:
+        report = host_profile_report()
+        print_host_profile(report)
+        i = sys.argv.index("--profile_host")
+        if i + 1 < len(sys.argv) and not sys.argv[i + 1].startswith("-"):
+            profile_f = open(sys.argv[i + 1], "w")
+            json.dump(report, profile_f, indent=2)
+            profile_f.close()
+
+    # Plot power profile, or save it to image / CSV file, if provided
+    if plot_power:
+        i = sys.argv.index("--plot_power")
+        if i + 1 < len(sys.argv) and not sys.argv[i + 1].startswith("-"):
+            plot_power_traces(sys.argv[i + 1], "--plot_average" in sys.argv)
+        else:
+            plot_power_traces(None, "--plot_average" in sys.argv)